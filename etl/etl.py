@@ -1,4 +1,7 @@
-from src.main import main
-
-if __name__ == '__main__':
-    main()
+import multiprocessing
+from src.main import main
+
+if __name__ == '__main__':
+    # Needed for --workers under the PyInstaller executable
+    multiprocessing.freeze_support()
+    main()
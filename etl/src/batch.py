@@ -0,0 +1,109 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.io_utils import COMPRESSION_EXTENSIONS, split_compression_ext
+
+# Outputs of earlier runs that must not be picked up as inputs
+OUTPUT_SUFFIXES = ('_errors.csv', '_valid.csv')
+
+# Files picked up from a directory: plain and compressed CSVs
+INPUT_PATTERNS = ['*.csv'] + [f'*.csv{ext}' for ext in COMPRESSION_EXTENSIONS]
+
+
+def resolve_inputs(patterns):
+    """Expand files, directories (their plain and compressed CSVs) and glob patterns into an ordered file list."""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(p for name in INPUT_PATTERNS for p in glob.glob(os.path.join(pattern, name)))
+        elif any(c in pattern for c in '*?['):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if split_compression_ext(path)[0].endswith(OUTPUT_SUFFIXES) and path not in patterns:
+                continue
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+def _run_file(csv_file, config, plan, pool, key_index, options):
+    from src.main import ETLProcess
+    from src.validator.thresholds import ValidationAborted
+    start = time.perf_counter()
+    result = {'file': csv_file, 'status': 'ok', 'valid': 0, 'errors': 0, 'seconds': 0.0, 'error': None}
+    etl = ETLProcess(csv_file, config, plan=plan, pool=pool, key_index=key_index, **options)
+    result['metrics'] = etl.metrics
+    try:
+        etl.run()
+        if etl.skipped:
+            result['status'] = 'skipped'
+        elif etl.rejected:
+            result['status'] = 'rejected'
+            result['error'] = etl.rejected
+        elif etl.failed_partitions:
+            result['status'] = 'failed'
+            result['error'] = f'load failed for partitions {etl.failed_partitions}'
+    except ValidationAborted as e:
+        result['status'] = 'aborted'
+        result['error'] = str(e)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['valid'] = etl.valid_count
+    result['errors'] = len(etl.error_rows)
+    result['outputs'] = [sink['path'] for sink in etl.sink_results]
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(csv_files, config, jobs=4, **options):
+    """
+    Run ETLProcess over many files in one process with at most `jobs` files
+    in flight. The config, compiled validation plan, a connection pool
+    sized for every concurrent load and the key index (if enabled) are
+    shared by all files.
+    Returns one result dict per file, in input order, each with the file's
+    RunMetrics under 'metrics'. With jobs=1 files run on the calling thread.
+    """
+    from src.validator.csv_validator import compile_schema
+    from src.validator.key_index import open_key_index
+    from src.utils.db_utils import get_pool, close_pools
+    if config.get('load_mode') == 'reload' and len(csv_files) > 1:
+        raise ValueError('load_mode reload replaces the whole table, so it takes a single input file')
+    jobs = max(1, min(jobs, len(csv_files)))
+    plan = compile_schema(config['schema'])
+    connections = options.get('connections') or (config.get('parallel_load') or {}).get('connections') or 1
+    pool = get_pool(config['db_config'], jobs * connections)
+    key_index = open_key_index(config)
+    try:
+        if jobs == 1:
+            return [_run_file(f, config, plan, pool, key_index, options) for f in csv_files]
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(lambda f: _run_file(f, config, plan, pool, key_index, options), csv_files))
+    finally:
+        if key_index is not None:
+            key_index.close()
+        close_pools()
+
+
+def print_summary(results):
+    width = max(len('File'), *(len(r['file']) for r in results))
+    print()
+    print(f"{'File':<{width}}  {'Status':<8}  {'Valid':>10}  {'Errors':>8}  {'Seconds':>8}")
+    for r in results:
+        print(f"{r['file']:<{width}}  {r['status']:<8}  {r['valid']:>10}  {r['errors']:>8}  {r['seconds']:>8.2f}")
+        if r['error']:
+            print(f"  {r['error']}")
+    total_valid = sum(r['valid'] for r in results)
+    total_errors = sum(r['errors'] for r in results)
+    failed = sum(1 for r in results if r['status'] == 'failed')
+    stopped = sum(1 for r in results if r['status'] in ('aborted', 'rejected'))
+    print(f'{len(results)} files, {total_valid} valid rows, {total_errors} error rows, {failed} failed, '
+          f'{stopped} aborted or rejected')
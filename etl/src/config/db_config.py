@@ -1 +1 @@
-raise ImportError('db_config.py is deprecated. Use src/config/schema_config.yml and load via src.config.schema_config.load_config')
+raise ImportError('db_config.py is deprecated. Use src/config/schema_config.yml and load via src.config.schema_config.load_config')
@@ -1,21 +1,50 @@
-
-# Load schema config from YAML
-import os
-import yaml
-
-def load_config(config_path=None):
-    if config_path is None:
-        config_path = os.path.join(os.path.dirname(__file__), 'schema_config.yml')
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    # Convert type strings to actual Python types
-    type_map = {'int': int, 'str': str, 'float': float}
-    for col, rules in config['schema'].items():
-        rules['type'] = type_map.get(rules['type'], str)
-    return config
-
-_CONFIG = load_config()
-SCHEMA = _CONFIG['schema']
-UNIQUE_FIELDS = _CONFIG['unique_fields']
-TABLE_NAME = _CONFIG['table_name']
-DB_CONFIG = _CONFIG['db_config']
+# Load schema config from YAML
+import copy
+import os
+import threading
+from datetime import date
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'schema_config.yml')
+
+# Parsed, type-mapped configs keyed on (path, mtime, size)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+# Module constants kept for backwards compatibility, resolved on first access
+_LAZY_CONSTANTS = {
+    'SCHEMA': 'schema',
+    'UNIQUE_FIELDS': 'unique_fields',
+    'TABLE_NAME': 'table_name',
+    'DB_CONFIG': 'db_config',
+}
+
+def _parse_config(config_path):
+    import yaml
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    # Convert type strings to actual Python types
+    type_map = {'int': int, 'str': str, 'float': float, 'date': date}
+    for col, rules in config['schema'].items():
+        rules['type'] = type_map.get(rules['type'], str)
+    return config
+
+def load_config(config_path=None):
+    if config_path is None:
+        config_path = DEFAULT_CONFIG_PATH
+    stat = os.stat(config_path)
+    key = (os.path.abspath(config_path), stat.st_mtime_ns, stat.st_size)
+    with _CACHE_LOCK:
+        config = _CACHE.get(key)
+        if config is None:
+            config = _parse_config(config_path)
+            # Drop stale entries for this path so edits are picked up
+            for stale in [k for k in _CACHE if k[0] == key[0]]:
+                del _CACHE[stale]
+            _CACHE[key] = config
+    # Callers may adjust their config, so never hand out the cached object
+    return copy.deepcopy(config)
+
+def __getattr__(name):
+    if name in _LAZY_CONSTANTS:
+        return load_config()[_LAZY_CONSTANTS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,25 @@
--- SQL script to create the table for the provided CSV structure in PostgreSQL
-
-CREATE TABLE etl.enterprise_survey (
-    Year INT NOT NULL,
-    Industry_aggregation_NZSIOC VARCHAR(50),
-    Industry_code_NZSIOC VARCHAR(10),
-    Industry_name_NZSIOC VARCHAR(255),
-    Units VARCHAR(50),
-    Variable_code VARCHAR(10),
-    Variable_name VARCHAR(100),
-    Variable_category VARCHAR(100),
-    Value NUMERIC,
-    Industry_code_ANZSIC06 VARCHAR(255)
-);
-
--- Add any additional constraints or indexes as needed
\ No newline at end of file
+-- Generated from schema_config.yml for etl.enterprise_survey; regenerate with: python etl.py --ddl
+
+CREATE SCHEMA IF NOT EXISTS etl;
+
+CREATE TABLE IF NOT EXISTS etl.enterprise_survey (
+    Year INT NOT NULL,
+    Industry_aggregation_NZSIOC VARCHAR(50),
+    Industry_code_NZSIOC VARCHAR(10),
+    Industry_name_NZSIOC VARCHAR(255),
+    Units VARCHAR(50),
+    Variable_code VARCHAR(10),
+    Variable_name VARCHAR(100),
+    Variable_category VARCHAR(100),
+    Value NUMERIC,
+    Industry_code_ANZSIC06 VARCHAR(255)
+);
+
+-- Unique key used by load_mode: upsert (NULLS NOT DISTINCT needs PostgreSQL 15+);
+-- load_mode: append fails on rows that are already loaded
+CREATE UNIQUE INDEX IF NOT EXISTS enterprise_survey_unique_key
+    ON etl.enterprise_survey (Year, Industry_code_NZSIOC, Variable_code) NULLS NOT DISTINCT;
+
+-- Staging table that load_mode: upsert truncates, loads and merges from; UNLOGGED
+-- skips the WAL, so its contents do not survive a crash
+CREATE UNLOGGED TABLE IF NOT EXISTS etl.enterprise_survey_staging (LIKE etl.enterprise_survey INCLUDING DEFAULTS);
@@ -0,0 +1,132 @@
+import contextvars
+import queue
+import threading
+import time
+
+from src.loader.postgres_loader import BISECT_BATCH_SIZE, load_chunks_to_postgres, upsert_chunks_to_postgres
+from src.utils.db_utils import get_pool
+from src.utils.rows import RowBatch, key_getter
+
+_DONE = object()
+_ABORT = object()
+
+
+class _AbortLoad(Exception):
+    pass
+
+
+def _partition_worker(index, chunk_queue, result, load_fn, on_progress):
+    # Set once the queue's end marker is taken: nothing more will be put
+    ended = False
+
+    def chunks():
+        nonlocal ended
+        while True:
+            item = chunk_queue.get()
+            if item is _DONE or item is _ABORT:
+                ended = True
+            if item is _DONE:
+                return
+            if item is _ABORT:
+                raise _AbortLoad()
+            yield item
+            # Resumed by the loader asking for the next chunk, so item is written
+            result['rows'] += len(item)
+            if on_progress is not None:
+                on_progress(index, result['rows'])
+
+    start = time.perf_counter()
+    try:
+        outcome = load_fn(chunks())
+        if isinstance(outcome, dict):
+            result['counts'] = outcome
+        result['status'] = 'committed'
+    except _AbortLoad:
+        result['status'] = 'aborted'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+        # Keep draining so the producer never blocks on this partition; a
+        # load that failed after reading the end marker (e.g. in its commit)
+        # has nothing left to drain
+        while not ended and chunk_queue.get() not in (_DONE, _ABORT):
+            pass
+    result['seconds'] = time.perf_counter() - start
+
+
+def partition_fields(partition_by, unique_fields):
+    """Columns whose values pick a row's partition: partition_by, else unique_fields."""
+    if isinstance(partition_by, str):
+        return [partition_by]
+    return list(partition_by or unique_fields or [])
+
+
+def load_partitioned(chunks, db_config, table, connections, partition_by=None, unique_fields=None,
+                     loader='insert', load_mode='append', on_progress=None, queue_size=4, on_reject=None,
+                     batch_size=BISECT_BATCH_SIZE):
+    """
+    Split a stream of row chunks into `connections` partitions and load them
+    concurrently, each over its own pooled connection and transaction.
+
+    Rows are assigned to partitions by hashing partition_by (a column name or
+    list of columns, default unique_fields), so one key always lands in the
+    same partition. A failing partition rolls back only its own rows; the
+    others still commit. Returns one result dict per partition with rows,
+    status (committed/failed/aborted), error, seconds and, for upserts, counts.
+    If the chunk stream itself raises, every partition is rolled back.
+    on_reject (see postgres_loader.bisecting_writer) is called from the partition threads.
+    """
+    fields = partition_fields(partition_by, unique_fields)
+    pool = get_pool(db_config, connections)
+
+    def load_fn(partition_chunks):
+        if load_mode == 'upsert':
+            return upsert_chunks_to_postgres(partition_chunks, db_config, table, unique_fields, loader, pool=pool,
+                                             on_reject=on_reject, batch_size=batch_size)
+        return load_chunks_to_postgres(partition_chunks, db_config, table, loader, pool=pool,
+                                       on_reject=on_reject, batch_size=batch_size)
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(connections)]
+    results = [
+        {'partition': i, 'rows': 0, 'status': 'pending', 'error': None, 'seconds': 0.0, 'counts': None}
+        for i in range(connections)
+    ]
+    # Each worker runs in a copy of the caller's context so run metrics see its round trips
+    threads = [
+        threading.Thread(target=contextvars.copy_context().run,
+                         args=(_partition_worker, i, queues[i], results[i], load_fn, on_progress),
+                         name=f'etl-load-{i}', daemon=True)
+        for i in range(connections)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for rows in chunks:
+            if isinstance(rows, RowBatch):
+                parts = [RowBatch(rows.columns) for _ in range(connections)]
+            else:
+                parts = [[] for _ in range(connections)]
+            if fields and isinstance(rows, RowBatch):
+                key_of = key_getter(rows.columns, fields)
+                for row in rows:
+                    parts[hash(key_of(row)) % connections].append(row)
+            elif fields:
+                for row in rows:
+                    parts[hash(tuple(row.get(f) for f in fields)) % connections].append(row)
+            else:
+                for i, row in enumerate(rows):
+                    parts[i % connections].append(row)
+            for chunk_queue, part in zip(queues, parts):
+                if part:
+                    chunk_queue.put(part)
+    except BaseException:
+        for chunk_queue in queues:
+            chunk_queue.put(_ABORT)
+        for t in threads:
+            t.join()
+        raise
+    for chunk_queue in queues:
+        chunk_queue.put(_DONE)
+    for t in threads:
+        t.join()
+    return results
@@ -1,9 +1,270 @@
-from src.utils.db_utils import get_connection, insert_rows
-
-
-def load_to_postgres(rows, db_config, table):
-    conn = get_connection(db_config)
-    try:
-        insert_rows(conn, table, rows)
-    finally:
-        conn.close()
+import time
+
+from src.utils.db_utils import (
+    get_connection, open_connection, release_connection, insert_rows, copy_rows, create_staging_table, prepare_staging_table, merge_staging,
+    commit, rollback, truncate_table, drop_indexes, create_indexes, savepoint, release_savepoint,
+    rollback_to_savepoint,
+)
+from src.utils.metrics import count_round_trip
+from src.utils.rows import row_columns
+
+LOADERS = {
+    'insert': insert_rows,
+    'copy': copy_rows,
+}
+
+# Rows written under one savepoint when rejected rows are isolated
+BISECT_BATCH_SIZE = 5000
+
+_SAVEPOINT = 'etl_batch'
+
+
+def get_row_writer(loader, on_reject=None, batch_size=BISECT_BATCH_SIZE):
+    """Return the row writer for loader; with on_reject, one that isolates rejected rows (see bisecting_writer)."""
+    try:
+        write_rows = LOADERS[loader or 'insert']
+    except KeyError:
+        raise ValueError(f"Unknown loader '{loader}', expected one of: {', '.join(LOADERS)}")
+    if on_reject is not None:
+        return bisecting_writer(write_rows, on_reject, batch_size)
+    return write_rows
+
+
+def _db_error_message(error):
+    lines = str(error).strip().splitlines()
+    return lines[0] if lines else type(error).__name__
+
+
+def bisecting_writer(write_rows, on_reject, batch_size=BISECT_BATCH_SIZE):
+    """
+    Wrap a row writer so a row the database rejects (a data error such as
+    a numeric overflow or an over-long value, or a constraint violation)
+    costs only that row. Rows are written in batches of batch_size, each
+    under a savepoint. A rejected batch is rolled back to its savepoint and
+    split in halves, each retried under its own savepoint, until the bad
+    rows are isolated; on_reject(row, message) is called for each of them
+    and every other row is written. Other errors propagate.
+    """
+    from psycopg2 import DataError, IntegrityError
+
+    def write_batch(conn, table, rows):
+        savepoint(conn, _SAVEPOINT)
+        try:
+            write_rows(conn, table, rows, commit=False)
+        except (DataError, IntegrityError) as e:
+            rollback_to_savepoint(conn, _SAVEPOINT)
+            # ROLLBACK TO keeps the savepoint open; release it so each split does not leave a subtransaction
+            release_savepoint(conn, _SAVEPOINT)
+            if len(rows) == 1:
+                on_reject(rows[0], _db_error_message(e))
+                return
+            middle = len(rows) // 2
+            write_batch(conn, table, rows[:middle])
+            write_batch(conn, table, rows[middle:])
+            return
+        release_savepoint(conn, _SAVEPOINT)
+
+    def write(conn, table, rows, commit=False):
+        for start in range(0, len(rows), batch_size):
+            write_batch(conn, table, rows[start:start + batch_size])
+        if commit:
+            conn.commit()
+            count_round_trip('commit')
+    return write
+
+
+def _rollback(conn):
+    """Roll back the current transaction; False if the connection is unusable."""
+    try:
+        rollback(conn)
+        return True
+    except Exception:
+        return False
+
+
+def load_to_postgres(rows, db_config, table, loader='insert'):
+    write_rows = get_row_writer(loader)
+    conn = get_connection(db_config)
+    try:
+        write_rows(conn, table, rows)
+    finally:
+        conn.close()
+
+
+def load_chunks_to_postgres(chunks, db_config, table, loader='insert', pool=None, on_reject=None,
+                            batch_size=BISECT_BATCH_SIZE):
+    """Load an iterable of row chunks over one connection in one transaction.
+
+    The connection is opened (or taken from pool) on the first non-empty
+    chunk. Nothing is committed unless every chunk is inserted. Returns the
+    number of rows loaded. With on_reject, rows the database rejects are
+    passed to it instead of failing the load (see bisecting_writer); they
+    are still counted.
+    """
+    write_rows = get_row_writer(loader, on_reject, batch_size)
+    conn = None
+    loaded = 0
+    try:
+        for rows in chunks:
+            if not rows:
+                continue
+            if conn is None:
+                conn = open_connection(db_config, pool)
+            write_rows(conn, table, rows, commit=False)
+            loaded += len(rows)
+        if conn is not None:
+            commit(conn)
+    except Exception:
+        if conn is not None:
+            release_connection(conn, pool, broken=not _rollback(conn))
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            release_connection(conn, pool)
+    return loaded
+
+
+def upsert_chunks_to_postgres(chunks, db_config, table, unique_fields, loader='insert', pool=None, on_reject=None,
+                              batch_size=BISECT_BATCH_SIZE, staging_table=None):
+    """Bulk-load chunks into a staging table, then merge into table.
+
+    staging_table names an UNLOGGED table (see db_utils.staging_table_name)
+    that is truncated and loaded, and created if missing; loads sharing it
+    wait on each other's TRUNCATE until they commit. Without it each load
+    stages into its own temp table. Re-running a file only writes rows that
+    are new or changed. Everything happens in one transaction. Returns a
+    dict of staged, inserted, updated and unchanged row counts. on_reject
+    isolates rows rejected while staging; a failing merge still fails the
+    load.
+    """
+    write_rows = get_row_writer(loader, on_reject, batch_size)
+    conn = None
+    staging = None
+    columns = None
+    counts = {'staged': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    try:
+        for rows in chunks:
+            if not rows:
+                continue
+            if conn is None:
+                conn = open_connection(db_config, pool)
+                if staging_table:
+                    staging = prepare_staging_table(conn, table, staging_table)
+                else:
+                    staging = create_staging_table(conn, table)
+                columns = row_columns(rows)
+            write_rows(conn, staging, rows, commit=False)
+            counts['staged'] += len(rows)
+        if conn is not None:
+            inserted, updated = merge_staging(conn, staging, table, columns, unique_fields)
+            commit(conn)
+            counts['inserted'] = inserted
+            counts['updated'] = updated
+            counts['unchanged'] = counts['staged'] - inserted - updated
+    except Exception:
+        if conn is not None:
+            release_connection(conn, pool, broken=not _rollback(conn))
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            release_connection(conn, pool)
+    return counts
+
+
+def reload_chunks_to_postgres(chunks, db_config, table, loader='insert', pool=None, on_reject=None,
+                              batch_size=BISECT_BATCH_SIZE):
+    """Replace the contents of table with the rows of chunks, in one transaction.
+
+    The table is truncated and its indexes (other than constraint indexes)
+    dropped before the bulk load, then rebuilt once over the loaded rows,
+    which is much cheaper than maintaining them row by row. If anything
+    fails, including an index rebuild, the table is left as it was. Nothing
+    happens if chunks holds no rows. Returns a dict of rows, the number of
+    indexes rebuilt and the seconds spent rebuilding them.
+    """
+    write_rows = get_row_writer(loader, on_reject, batch_size)
+    conn = None
+    indexes = []
+    result = {'rows': 0, 'indexes': 0, 'index_seconds': 0.0}
+    try:
+        for rows in chunks:
+            if not rows:
+                continue
+            if conn is None:
+                conn = open_connection(db_config, pool)
+                truncate_table(conn, table)
+                indexes = drop_indexes(conn, table)
+            write_rows(conn, table, rows, commit=False)
+            result['rows'] += len(rows)
+        if conn is not None:
+            start = time.perf_counter()
+            create_indexes(conn, indexes)
+            result['indexes'] = len(indexes)
+            result['index_seconds'] = time.perf_counter() - start
+            commit(conn)
+    except Exception:
+        if conn is not None:
+            release_connection(conn, pool, broken=not _rollback(conn))
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            release_connection(conn, pool)
+    return result
+
+
+def _commit_checkpoint(conn, total_rows, before_commit, on_commit):
+    if before_commit is not None:
+        before_commit(conn, total_rows)
+    commit(conn)
+    if on_commit is not None:
+        on_commit(total_rows)
+
+
+def load_chunks_checkpointed(chunks, db_config, table, loader='insert', commit_every=100000,
+                             skip_rows=0, on_commit=None, pool=None, on_reject=None,
+                             batch_size=BISECT_BATCH_SIZE, before_commit=None):
+    """Load row chunks over one connection, committing every commit_every rows.
+
+    The first skip_rows rows were committed by an earlier run and are not
+    written again. before_commit(conn, total_rows) runs inside each
+    transaction just before it commits, so a checkpoint written there commits
+    with the rows. After each commit on_commit(total_rows) is called with
+    the number of rows now committed.
+    A failure rolls back only the rows since the last commit. Returns the
+    number of rows written by this call, counting any passed to on_reject.
+    """
+    write_rows = get_row_writer(loader, on_reject, batch_size)
+    conn = None
+    skipped = 0
+    written = 0
+    pending = 0
+    try:
+        for rows in chunks:
+            if skipped < skip_rows:
+                take = min(len(rows), skip_rows - skipped)
+                skipped += take
+                rows = rows[take:]
+            if not rows:
+                continue
+            if conn is None:
+                conn = open_connection(db_config, pool)
+            write_rows(conn, table, rows, commit=False)
+            written += len(rows)
+            pending += len(rows)
+            if pending >= commit_every:
+                _commit_checkpoint(conn, skip_rows + written, before_commit, on_commit)
+                pending = 0
+        if conn is not None and pending:
+            _commit_checkpoint(conn, skip_rows + written, before_commit, on_commit)
+    except Exception:
+        if conn is not None:
+            release_connection(conn, pool, broken=not _rollback(conn))
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            release_connection(conn, pool)
+    return written
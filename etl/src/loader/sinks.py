@@ -0,0 +1,207 @@
+import os
+from datetime import date
+
+from src.utils.io_utils import split_compression_ext
+from src.utils.rows import row_columns, row_values
+
+# Rows per Parquet row group, unless configured otherwise
+ROW_GROUP_SIZE = 100000
+
+
+class RowSink:
+    """
+    An output fed the validated rows of a file from the same pass as the
+    PostgreSQL load. write() receives each chunk as it streams (a RowBatch,
+    or a list of dict rows); close() completes the output once the load has
+    committed and returns a summary dict; abort() discards it. drop, if
+    given to close(), is (fields, keys): keys counts, per tuple of values
+    for fields, how many rows already written to remove from the output.
+    """
+
+    name = None
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def close(self, drop=None):
+        return {'sink': self.name}
+
+    def abort(self):
+        pass
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The parquet sink needs the pyarrow package (pip install pyarrow)') from None
+    return pyarrow
+
+
+def arrow_schema(schema):
+    """
+    Arrow schema of the validated columns: int -> int64, float -> float64,
+    date -> date32 and str -> string, dictionary-encoded for columns marked
+    cardinality: low. Required columns are not nullable.
+    """
+    pa = _import_pyarrow()
+    fields = []
+    for col, rules in schema.items():
+        col_type = rules.get('type', str)
+        if col_type is int:
+            arrow_type = pa.int64()
+        elif col_type is float:
+            arrow_type = pa.float64()
+        elif col_type is date:
+            arrow_type = pa.date32()
+        elif rules.get('cardinality') == 'low':
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col, arrow_type, nullable=not rules.get('required')))
+    return pa.schema(fields)
+
+
+def output_path(csv_file, ext, directory=None):
+    """<name><ext> next to csv_file, or in directory if given."""
+    base, _ = split_compression_ext(csv_file)
+    base, _ = os.path.splitext(base)
+    if directory:
+        base = os.path.join(directory, os.path.basename(base))
+    return base + ext
+
+
+def _take(counts, key):
+    # Count off one row to drop for key; False once none are left
+    if not counts.get(key):
+        return False
+    counts[key] -= 1
+    return True
+
+
+class ParquetSink(RowSink):
+    """
+    Write validated rows to a Parquet file, one row group per row_group_size
+    rows as chunks stream in, so memory stays bounded by one row group. The
+    file is written as <path>.part and renamed to path by close(), after
+    rewriting it one row group at a time if rows are to be dropped.
+    """
+
+    name = 'parquet'
+
+    def __init__(self, path, schema, row_group_size=ROW_GROUP_SIZE, compression='zstd'):
+        pa = self._pa = _import_pyarrow()
+        self.path = path
+        self.row_group_size = max(1, row_group_size)
+        self.schema = arrow_schema(schema)
+        self.compression = compression
+        self._tmp_path = f'{path}.part'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = pa.parquet.ParquetWriter(self._tmp_path, self.schema, compression=compression)
+        self._pending = []
+        self._indexes = None
+        self.rows = 0
+        self.row_groups = 0
+
+    @classmethod
+    def from_config(cls, cfg, csv_file, schema):
+        return cls(output_path(csv_file, '.parquet', cfg.get('dir')), schema,
+                   row_group_size=cfg.get('row_group_size') or ROW_GROUP_SIZE,
+                   compression=cfg.get('compression') or 'zstd')
+
+    def write(self, rows):
+        if not rows:
+            return
+        columns = row_columns(rows)
+        if self._indexes is None:
+            self._indexes = [columns.index(name) for name in self.schema.names]
+        pending = self._pending
+        pending.extend(row_values(rows, columns))
+        size = self.row_group_size
+        while len(pending) >= size:
+            self._write_group(pending[:size])
+            del pending[:size]
+
+    def _write_group(self, rows):
+        pa = self._pa
+        columns = list(zip(*rows))
+        arrays = []
+        for field, index in zip(self.schema, self._indexes):
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(columns[index], pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(columns[index], field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema), row_group_size=len(rows))
+        self.rows += len(rows)
+        self.row_groups += 1
+
+    def _drop_rows(self, fields, keys):
+        pa = self._pa
+        source = pa.parquet.ParquetFile(self._tmp_path)
+        rewritten = f'{self._tmp_path}.drop'
+        writer = pa.parquet.ParquetWriter(rewritten, self.schema, compression=self.compression)
+        self.rows = self.row_groups = 0
+        try:
+            for i in range(source.num_row_groups):
+                table = source.read_row_group(i)
+                row_keys = zip(*(table.column(name).to_pylist() for name in fields))
+                table = table.filter(pa.array([not _take(keys, key) for key in row_keys], pa.bool_()))
+                if table.num_rows:
+                    writer.write_table(table, row_group_size=table.num_rows)
+                    self.rows += table.num_rows
+                    self.row_groups += 1
+        except BaseException:
+            writer.close()
+            os.remove(rewritten)
+            raise
+        finally:
+            source.close()
+        writer.close()
+        os.replace(rewritten, self._tmp_path)
+
+    def close(self, drop=None):
+        if self._pending:
+            self._write_group(self._pending)
+            self._pending = []
+        self._writer.close()
+        if drop is not None:
+            self._drop_rows(*drop)
+        os.replace(self._tmp_path, self.path)
+        return {'sink': self.name, 'path': self.path, 'rows': self.rows, 'row_groups': self.row_groups,
+                'bytes': os.path.getsize(self.path)}
+
+    def abort(self):
+        self._pending = []
+        try:
+            self._writer.close()
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+
+SINKS = {
+    'parquet': ParquetSink,
+}
+
+
+def make_sink(cfg, csv_file, schema):
+    """Build the sink described by one entry of the `sinks` config section for csv_file."""
+    kind = cfg.get('type')
+    if kind not in SINKS:
+        raise ValueError(f"Unknown sink type {kind!r}, expected one of: {', '.join(SINKS)}")
+    return SINKS[kind].from_config(cfg, csv_file, schema)
+
+
+def open_sinks(configs, csv_file, schema):
+    """Open every enabled sink in the `sinks` config section; [] if there are none."""
+    sinks = []
+    try:
+        for cfg in configs or []:
+            if cfg.get('enabled', True):
+                sinks.append(make_sink(cfg, csv_file, schema))
+    except Exception:
+        for sink in sinks:
+            sink.abort()
+        raise
+    return sinks
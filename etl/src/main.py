@@ -1,106 +1,943 @@
-
-
-import os
-import sys
-import csv
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.config.schema_config import load_config
-
-
-
-class ETLProcess:
-    def __init__(self, csv_file, config):
-        self.csv_file = csv_file
-        self.config = config
-        self.db_config = config['db_config']
-        self.valid_rows = []
-        self.error_rows = []
-
-    def validate(self):
-        from src.validator.csv_validator import validate_csv
-        self.valid_rows, self.error_rows = validate_csv(
-            self.csv_file,
-            schema=self.config['schema'],
-            unique_fields=self.config['unique_fields']
-        )
-
-    def write_errors(self):
-        if not self.error_rows:
-            return
-        error_file = self.csv_file.replace('.csv', '_errors.csv')
-        with open(self.csv_file, newline='', encoding='utf-8') as infile, \
-             open(error_file, 'w', newline='', encoding='utf-8') as errfile:
-            reader = list(csv.DictReader(infile))
-            fieldnames = reader[0].keys() if reader else []
-            writer = csv.DictWriter(errfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row_num, errors in self.error_rows:
-                writer.writerow(reader[row_num-2])
-        print(f'Invalid rows written to {error_file}')
-        # Remove invalid rows from the original file
-        valid_indices = set(range(len(reader))) - set([row_num-2 for row_num, _ in self.error_rows])
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as outfile:
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for idx in valid_indices:
-                writer.writerow(reader[idx])
-
-        # Send error file by email if configured
-        email_cfg = self.config.get('email')
-        if email_cfg and email_cfg.get('enabled'):
-            try:
-                from src.utils.email_utils import send_email
-                smtp_cfg = email_cfg.get('smtp', {})
-                from_addr = email_cfg.get('from')
-                to_addrs = email_cfg.get('to') or []
-                subject = email_cfg.get('subject') or f"ETL error report: {os.path.basename(error_file)}"
-                body = email_cfg.get('body') or f"Attached are the invalid rows extracted from {os.path.basename(self.csv_file)}."
-                send_email(smtp_cfg, from_addr, to_addrs, subject, body, attachments=[error_file])
-                print('Error file emailed to:', to_addrs)
-            except Exception as e:
-                print('Failed to send error email:', e)
-
-    def load(self):
-        from src.loader.postgres_loader import load_to_postgres
-        table = self.config.get('table_name') or self.config.get('table')
-        if self.valid_rows:
-            load_to_postgres(self.valid_rows, self.db_config, table)
-            print('Data loaded to PostgreSQL.')
-        else:
-            print('No valid rows to load.')
-
-    def run(self):
-        self.validate()
-        if self.error_rows:
-            print('Validation errors:')
-            self.write_errors()
-        print(f'Valid rows: {len(self.valid_rows)}')
-        self.load()
-
-def main():
-    import argparse
-    parser = argparse.ArgumentParser(description='ETL CSV to PostgreSQL')
-    parser.add_argument('--csv', dest='csv_file', required=False, help='Path to CSV file')
-    parser.add_argument('--config', dest='config_file', required=False, help='Path to YAML config file')
-    args = parser.parse_args()
-
-    # Allow config file from env var or CLI
-    config_path = args.config_file or os.environ.get('ETL_CONFIG')
-    if config_path:
-        config = load_config(config_path)
-    else:
-        config = load_config()
-
-    # Allow CSV file from CLI or default
-    if args.csv_file:
-        csv_file = args.csv_file
-    else:
-        csv_file = os.path.join(os.path.dirname(__file__), '..', 'data', 'enterprise-survey-2024.csv')
-    if not os.path.isfile(csv_file):
-        print(f'CSV file not found: {csv_file}')
-        sys.exit(1)
-    etl = ETLProcess(csv_file, config)
-    etl.run()
-
-if __name__ == '__main__':
-    main()
+
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config.schema_config import load_config
+
+# Error message prefix of rows the database rejected (load_batches.on_db_error: bisect)
+DB_REJECTED = 'Rejected by database: '
+
+
+
+class ETLProcess:
+    def __init__(self, csv_file, config, chunk_size=None, workers=1, sidecars=False, connections=None,
+                 plan=None, pool=None, checkpoint=None, key_index=None, preflight=None, pipeline=None):
+        self.csv_file = csv_file
+        self.config = config
+        self.db_config = config['db_config']
+        # chunk_size=None keeps the whole file in memory; an int streams
+        # validated rows to the loader chunk by chunk.
+        self.chunk_size = chunk_size
+        self.workers = workers
+        # sidecars=True writes <csv>_valid.csv instead of rewriting the input
+        self.sidecars = sidecars
+        self.error_file = None
+        # connections > 1 loads hash partitions concurrently over a connection pool
+        parallel_cfg = config.get('parallel_load') or {}
+        self.connections = connections or parallel_cfg.get('connections') or 1
+        self.load_results = []
+        self.partition_progress = {}
+        self.failed_partitions = []
+        # Shared by batch runs: a precompiled validation plan and connection pool
+        self.plan = plan
+        self.pool = pool
+        # Checkpoint mode commits periodically and records progress in a manifest
+        self.checkpoint_cfg = config.get('checkpoint') or {}
+        self.checkpoint = checkpoint if checkpoint is not None else bool(self.checkpoint_cfg.get('enabled'))
+        # Pipelined mode validates on a background thread while the loader works
+        self.pipeline_cfg = config.get('pipeline') or {}
+        self.pipeline = pipeline if pipeline is not None else bool(self.pipeline_cfg.get('enabled'))
+        # Rows the database rejected, isolated by savepoint bisection (load_batches.on_db_error: bisect),
+        # until they are written to the error file
+        self.batches_cfg = config.get('load_batches') or {}
+        self.db_rejected = []
+        self.db_rejected_count = 0
+        # Keys of rejected rows already written to the error file, left out of the key index
+        self._rejected_keys = set()
+        # Keys of rejected rows not yet left out of the sinks, with how many rows each (see _reject_key)
+        self._sink_rejected = Counter()
+        self._sink_lock = threading.Lock()
+        self._reject_key_of = None
+        self._carried_rejected = False
+        # The split writer of a streaming run, open while the loader runs
+        self._open_split_writer = None
+        # Summaries of the extra outputs (see src.loader.sinks) written from the same pass
+        self.sink_results = []
+        self.manifest = None
+        self.content_hash = None
+        self.resume_rows = 0
+        self.progress = {}
+        # Validator position after the chunk the loader is writing (behind self.progress when pipelined)
+        self._load_progress = None
+        self.skipped = False
+        # Preflight mode validates a sample of the file first and rejects it if too many rows fail
+        preflight_cfg = config.get('preflight') or {}
+        self.preflight = preflight if preflight is not None else bool(preflight_cfg.get('enabled'))
+        self.rejected = None
+        self.valid_rows = []
+        self.error_rows = []
+        self._fieldnames = None
+        self.valid_count = 0
+        from src.utils.metrics import RunMetrics
+        self.metrics = RunMetrics(csv_file)
+        # Cross-run duplicate index (shared by batch runs); keys of valid rows
+        # wait in _index_keys until their rows are committed. _index_flushed
+        # valid rows are already indexed and dropped from the buffers.
+        self.key_index = key_index
+        self._owns_key_index = False
+        self._index_keys = []
+        self._index_parts = []
+        self._index_flushed = 0
+
+    def _split_writer(self):
+        from src.utils.csv_utils import CsvSplitWriter
+        return CsvSplitWriter(self.csv_file, sidecars=self.sidecars)
+
+    def _schema(self):
+        # Worker processes need the picklable schema dict, not compiled checks
+        if self.plan is not None and self.workers <= 1:
+            return self.plan
+        return self.config['schema']
+
+    def _key_store(self):
+        from src.validator.key_store import make_key_store
+        return make_key_store(self.config.get('dedupe'))
+
+    def _thresholds(self):
+        from src.validator.thresholds import AbortThresholds
+        return AbortThresholds.from_config(self.config.get('abort'))
+
+    def _backend_options(self):
+        validation_cfg = self.config.get('validation') or {}
+        return {'backend': validation_cfg.get('backend'), 'batch_rows': validation_cfg.get('batch_rows')}
+
+    def _is_loaded(self):
+        # Only append loads reject rows loaded before; upserts are meant to rewrite them
+        if self.key_index is None or (self.config.get('load_mode') or 'append') != 'append':
+            return None
+        # A resumed file already committed some of its own rows; those are not duplicates
+        ignore_source = self._index_source() if self.resume_rows else None
+        key_index = self.key_index
+        return lambda key: key_index.contains(key, ignore_source)
+
+    def _index_source(self):
+        return os.path.abspath(self.csv_file)
+
+    def _stage_index_keys(self, rows):
+        if self.key_index is None or not rows:
+            return
+        from src.utils.rows import key_getter
+        key_of = key_getter(rows.columns, self.config['unique_fields'])
+        self._index_keys.extend(map(key_of, rows))
+        if self.connections > 1:
+            # Same partition assignment as load_partitioned, so failed partitions can be left out
+            from src.loader.partitioned_loader import partition_fields
+            parallel_cfg = self.config.get('parallel_load') or {}
+            part_of = key_getter(rows.columns, partition_fields(parallel_cfg.get('partition_by'),
+                                                               self.config['unique_fields']))
+            connections = self.connections
+            self._index_parts.extend(hash(part_of(row)) % connections for row in rows)
+
+    def _update_key_index(self, loaded=None):
+        """Add the keys of committed rows (the first `loaded` valid rows, default all) to the key index."""
+        if self.key_index is None:
+            return
+        # Buffers start at the first unflushed row; loaded counts from the start of the file
+        end = len(self._index_keys) if loaded is None else max(loaded - self._index_flushed, 0)
+        keys = self._index_keys[:end]
+        if self.load_results:
+            # Keys and partitions line up row for row; drop pairs before filtering keys further
+            committed = {r['partition'] for r in self.load_results if r['status'] == 'committed'}
+            keys = [key for key, part in zip(keys, self._index_parts[:end]) if part in committed]
+        rejected = self._rejected_keys | self._keys_of(self.db_rejected)
+        if rejected:
+            keys = [key for key in keys if key not in rejected]
+        self.key_index.add(keys, source=self._index_source())
+        del self._index_keys[:end]
+        del self._index_parts[:end]
+        self._index_flushed += end
+
+    def _reject_key(self):
+        """Key matching a rejected row to its valid row: its unique_fields, or the whole row without any."""
+        if self._reject_key_of is None:
+            from src.utils.rows import key_getter
+            from src.validator.csv_validator import plan_columns
+            unique_fields = self.config.get('unique_fields')
+            self._reject_key_of = key_getter(plan_columns(self._schema()), unique_fields) if unique_fields else tuple
+        return self._reject_key_of
+
+    def _keys_of(self, rejected):
+        if not rejected:
+            return set()
+        key_of = self._reject_key()
+        return {key_of(row) for row, _ in rejected}
+
+    def _finish_dedupe(self, key_store):
+        print(f'Duplicate key store ({key_store.name}): {len(key_store)} keys, '
+              f'{key_store.memory_bytes() / (1024 * 1024):.1f} MB')
+        key_store.close()
+
+    def _finish_split(self, split_writer):
+        self._open_split_writer = None
+        split_writer.close()
+        self._fieldnames = split_writer.fieldnames
+        self.error_file = split_writer.error_file if split_writer.error_count else None
+        if self.sidecars and split_writer.fieldnames is not None:
+            print(f'Valid rows written to {split_writer.valid_file}')
+
+    def validate(self):
+        from src.validator.csv_validator import validate_csv
+        split_writer = self._split_writer()
+        key_store = self._key_store()
+        try:
+            self.valid_rows, self.error_rows = validate_csv(
+                self.csv_file,
+                schema=self._schema(),
+                unique_fields=self.config['unique_fields'],
+                workers=self.workers,
+                sink=split_writer,
+                key_store=key_store,
+                metrics=self.metrics,
+                is_loaded=self._is_loaded(),
+                thresholds=self._thresholds(),
+                keep_raw=self._keep_raw(),
+                **self._backend_options(),
+            )
+        except Exception:
+            split_writer.abort()
+            key_store.close()
+            raise
+        self._finish_split(split_writer)
+        self._finish_dedupe(key_store)
+        self.valid_count = len(self.valid_rows)
+        self._stage_index_keys(self.valid_rows)
+        self._record_validation()
+
+    def _record_validation(self):
+        file_size = os.path.getsize(self.csv_file)
+        for name in ('parse', 'validate'):
+            if name in self.metrics.stages:
+                self.metrics.timer(name).bytes = file_size
+        self.metrics.count('valid', self.valid_count)
+        self.metrics.count('error', len(self.error_rows))
+
+    def write_errors(self):
+        # Error rows are split out during validation; report and email them
+        if not self.error_rows or not self.error_file:
+            return
+        with self.metrics.stage('write_errors'):
+            self._report_errors()
+
+    def _report_errors(self):
+        error_file = self.error_file
+        print(f'Invalid rows written to {error_file}')
+
+        # Queue the error file for background email delivery if configured
+        email_cfg = self.config.get('email')
+        if email_cfg and email_cfg.get('enabled'):
+            try:
+                from src.utils.email_utils import get_delivery
+                smtp_cfg = email_cfg.get('smtp', {})
+                from_addr = email_cfg.get('from')
+                to_addrs = email_cfg.get('to') or []
+                subject = email_cfg.get('subject') or f"ETL error report: {os.path.basename(error_file)}"
+                body = email_cfg.get('body') or f"Attached are the invalid rows extracted from {os.path.basename(self.csv_file)}."
+                max_mb = email_cfg.get('max_attachment_mb')
+                error_bytes = os.path.getsize(error_file)
+
+                def on_done(seconds, sent):
+                    # Called from the delivery thread once the report is out
+                    self.metrics.add('email', seconds, rows=len(self.error_rows) if sent else 0,
+                                     nbytes=error_bytes if sent else 0)
+                get_delivery(smtp_cfg).submit(
+                    from_addr, to_addrs, subject, body, attachments=[error_file],
+                    compress=email_cfg.get('compress') or 'gzip',
+                    max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+                    sample_rows=email_cfg.get('sample_rows') or 1000,
+                    row_count=len(self.error_rows),
+                    on_done=on_done,
+                )
+                print('Error file queued for email to:', to_addrs)
+            except Exception as e:
+                print('Failed to send error email:', e)
+
+    def load(self):
+        sinks = self._open_sinks()
+        try:
+            if self.valid_rows:
+                sent_bytes = self.metrics.round_trips.sent_bytes
+                with self.metrics.stage('load') as timer:
+                    timer.rows += self._load_chunks([self.valid_rows])
+                timer.bytes += self.metrics.round_trips.sent_bytes - sent_bytes
+                if sinks:
+                    self._write_sinks(sinks, self._unrejected(self.valid_rows))
+                self._update_key_index()
+                self._divert_rejected()
+                self._finish_rejected()
+                print('Data loaded to PostgreSQL.')
+            else:
+                print('No valid rows to load.')
+        except BaseException:
+            self._abort_sinks(sinks)
+            raise
+        self._close_sinks(sinks)
+
+    def _open_sinks(self):
+        if not self.config.get('sinks'):
+            return []
+        from src.loader.sinks import open_sinks
+        sinks = open_sinks(self.config['sinks'], self.csv_file, self.config['schema'])
+        # Rows carried over from the earlier run of a resumed load are in its committed part
+        key_of = self._reject_key()
+        self._sink_rejected.update(key_of(row) for row, _ in self.db_rejected)
+        return sinks
+
+    def _write_sinks(self, sinks, rows):
+        if not sinks:
+            return
+        with self.metrics.stage('sink') as timer:
+            for sink in sinks:
+                sink.write(rows)
+            timer.rows += len(rows)
+
+    def _feed_sinks(self, chunks, sinks):
+        # Each chunk reaches the sinks once the loader asks for the next one, so the rows the
+        # database rejected while writing it are known and left out
+        written = None
+        for chunk in chunks:
+            if written is not None:
+                self._write_sinks(sinks, self._unrejected(written))
+            written = chunk
+            yield chunk
+        if written is not None:
+            self._write_sinks(sinks, self._unrejected(written))
+
+    def _unrejected(self, rows):
+        if not self._sink_rejected:
+            return rows
+        from src.utils.rows import RowBatch
+        key_of = self._reject_key()
+        kept = RowBatch(rows.columns)
+        with self._sink_lock:
+            pending = self._sink_rejected
+            for row in rows:
+                key = key_of(row)
+                if key in pending:
+                    # Without unique_fields, identical rows share a key; leave out one per rejection
+                    pending[key] -= 1
+                    if not pending[key]:
+                        del pending[key]
+                else:
+                    kept.append(row)
+        return kept
+
+    def _sink_time(self):
+        timer = self.metrics.stages.get('sink')
+        return (timer.seconds, timer.cpu_seconds or 0.0) if timer is not None else (0.0, 0.0)
+
+    def _abort_sinks(self, sinks):
+        for sink in sinks:
+            sink.abort()
+
+    def _close_sinks(self, sinks):
+        """Complete the sink outputs after a successful load; discard them if partitions failed."""
+        if not sinks:
+            return
+        if self.failed_partitions:
+            self._abort_sinks(sinks)
+            print(f'Sink outputs discarded: load failed for partitions {self.failed_partitions}')
+            return
+        drop = None
+        if self._sink_rejected:
+            # Partitions write asynchronously, so some rows were rejected after they reached the sinks
+            from src.validator.csv_validator import plan_columns
+            fields = self.config.get('unique_fields') or plan_columns(self._schema())
+            drop = (fields, Counter(self._sink_rejected))
+        for sink in sinks:
+            with self.metrics.stage('sink'):
+                result = sink.close(drop)
+            self.sink_results.append(result)
+            print(f"Wrote {result['rows']} rows in {result['row_groups']} row groups to {result['path']}")
+
+    def _on_db_reject(self, row, message):
+        # Called by the loader (from partition threads too); list.append is atomic
+        self.db_rejected.append((row, message))
+        key = self._reject_key()(row)
+        with self._sink_lock:
+            self._sink_rejected[key] += 1
+
+    def _reject_options(self):
+        mode = self.batches_cfg.get('on_db_error') or 'fail'
+        if mode == 'fail':
+            return {}
+        if mode != 'bisect':
+            raise ValueError(f"Invalid load_batches.on_db_error {mode!r}, expected fail or bisect")
+        from src.loader.postgres_loader import BISECT_BATCH_SIZE
+        return {'on_reject': self._on_db_reject, 'batch_size': self.batches_cfg.get('batch_size') or BISECT_BATCH_SIZE}
+
+    def _keep_raw(self):
+        # Rejected rows are reported as read, so valid rows keep their raw record until loaded
+        return bool(self._reject_options())
+
+    def _divert_rejected(self):
+        """Write the rows the database rejected so far to the error file, counted as errors instead of valid."""
+        if not self.db_rejected:
+            return
+        rejected, self.db_rejected = self.db_rejected, []
+        self._rejected_keys |= self._keys_of(rejected)
+        rows = [(row.raw, [DB_REJECTED + message]) for row, message in rejected]
+        split_writer = self._open_split_writer
+        if split_writer is not None and split_writer.fieldnames is not None:
+            # Validation may still be writing its own errors to the same file
+            split_writer.write_rejected(rows)
+        elif self._fieldnames is not None:
+            from src.utils.csv_utils import append_error_rows, sidecar_path
+            # An error file of this name from an earlier run is replaced, not added to
+            start = self.error_file is None
+            self.error_file = self.error_file or sidecar_path(self.csv_file, '_errors')
+            append_error_rows(self.error_file, self._fieldnames, rows, start=start)
+        self.error_rows.extend((None, errors) for _, errors in rows)
+        # valid_count is settled by _finish_rejected; a pipelined run is still counting on another thread
+        self.db_rejected_count += len(rows)
+        self.metrics.count('rejected', len(rows))
+
+    def _finish_rejected(self):
+        if self.db_rejected_count:
+            self.valid_count -= self.db_rejected_count
+            print(f'{self.db_rejected_count} rows rejected by the database, written to {self.error_file}')
+
+    def _carry_rejected(self):
+        """
+        On resume, take over the rows the database rejected in the committed
+        part of the earlier run from its error file, which the new run's
+        error file replaces; they are written to it with the first chunk.
+        """
+        import csv
+        from src.utils.csv_utils import ERROR_COLUMN, sidecar_path
+        from src.utils.rows import source_row
+        from src.validator.csv_validator import compile_schema, validate_values
+        error_file = sidecar_path(self.csv_file, '_errors')
+        if not os.path.exists(error_file):
+            return
+        plan = compile_schema(self._schema())
+        with open(error_file, newline='', encoding='utf-8') as f:
+            for record in csv.DictReader(f):
+                error = record.pop(ERROR_COLUMN, None) or ''
+                if error.startswith(DB_REJECTED):
+                    values, _ = validate_values(record, plan)
+                    self.db_rejected.append((source_row(values, record), error[len(DB_REJECTED):]))
+        self._carried_rejected = bool(self.db_rejected)
+
+    def _load_chunks(self, chunks):
+        from src.loader.postgres_loader import load_chunks_to_postgres, upsert_chunks_to_postgres
+        loader = self.config.get('loader')
+        load_mode = self.config.get('load_mode') or 'append'
+        if load_mode == 'reload':
+            # One transaction replaces the table, so it is never split over connections
+            return self._load_reload(chunks)
+        if self.connections > 1:
+            return self._load_partitioned(chunks)
+        upsert = load_mode == 'upsert'
+        if (self.manifest is not None or self.batches_cfg.get('commit_every')) and not upsert:
+            return self._load_checkpointed(chunks)
+        if upsert:
+            counts = upsert_chunks_to_postgres(chunks, self.db_config, self._table(),
+                                               self.config['unique_fields'], loader=loader, pool=self.pool,
+                                               staging_table=self._staging_table(), **self._reject_options())
+            if counts['staged']:
+                print(f"Merged into PostgreSQL: {counts['inserted']} inserted, "
+                      f"{counts['updated']} updated, {counts['unchanged']} unchanged.")
+            return counts['staged']
+        return load_chunks_to_postgres(chunks, self.db_config, self._table(), loader=loader, pool=self.pool,
+                                       **self._reject_options())
+
+    def _staging_table(self):
+        # Partitioned upserts keep per-connection temp tables: a shared table's TRUNCATE would serialise them
+        if not (self.config.get('ddl') or {}).get('staging_table', True):
+            return None
+        from src.utils.db_utils import staging_table_name
+        return staging_table_name(self._table())
+
+    def _load_reload(self, chunks):
+        from src.loader.postgres_loader import reload_chunks_to_postgres
+        result = reload_chunks_to_postgres(chunks, self.db_config, self._table(),
+                                           loader=self.config.get('loader'), pool=self.pool,
+                                           **self._reject_options())
+        if result['rows']:
+            print(f"Reloaded {self._table()}: {result['rows']} rows, "
+                  f"{result['indexes']} indexes rebuilt in {result['index_seconds']:.1f}s.")
+            if self.key_index is not None:
+                # The old rows are gone, so are their keys
+                self.key_index.clear()
+        return result['rows']
+
+    def _load_partitioned(self, chunks):
+        from src.loader.partitioned_loader import load_partitioned
+        parallel_cfg = self.config.get('parallel_load') or {}
+        self.load_results = load_partitioned(
+            chunks,
+            self.db_config,
+            self._table(),
+            self.connections,
+            partition_by=parallel_cfg.get('partition_by'),
+            unique_fields=self.config['unique_fields'],
+            loader=self.config.get('loader'),
+            load_mode=self.config.get('load_mode') or 'append',
+            on_progress=self._partition_progress,
+            **self._reject_options(),
+        )
+        loaded = 0
+        for result in self.load_results:
+            line = f"Partition {result['partition']}: {result['status']}, {result['rows']} rows in {result['seconds']:.1f}s"
+            if result['counts']:
+                counts = result['counts']
+                line += f" ({counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged)"
+            if result['error']:
+                line += f" - {result['error']}"
+            print(line)
+            if result['status'] == 'committed':
+                loaded += result['rows']
+        self.failed_partitions = [r['partition'] for r in self.load_results if r['status'] != 'committed']
+        return loaded
+
+    def _load_checkpointed(self, chunks):
+        from src.loader.postgres_loader import load_chunks_checkpointed
+        if self.manifest is not None:
+            commit_every = self.checkpoint_cfg.get('commit_every') or 100000
+        else:
+            # Commit intervals without a manifest: nothing to resume, but committed rows are still recorded
+            commit_every = self.batches_cfg['commit_every']
+        written = load_chunks_checkpointed(
+            chunks,
+            self.db_config,
+            self._table(),
+            loader=self.config.get('loader'),
+            commit_every=commit_every,
+            skip_rows=self.resume_rows,
+            on_commit=self._record_checkpoint,
+            pool=self.pool,
+            before_commit=self._write_checkpoint if self.manifest is not None else None,
+            **self._reject_options(),
+        )
+        return self.resume_rows + written
+
+    def _control_table(self):
+        from src.utils.db_utils import CHECKPOINT_TABLE
+        schema = self._table().rpartition('.')[0]
+        return self.checkpoint_cfg.get('control_table') or (f'{schema}.' if schema else '') + CHECKPOINT_TABLE
+
+    def _write_checkpoint(self, conn, loaded):
+        # Committed with the rows, so a crash before the manifest update cannot lose the count
+        from src.utils.db_utils import write_checkpoint
+        write_checkpoint(conn, self._control_table(), self.csv_file, self.content_hash, loaded)
+
+    def _committed_rows(self):
+        """Rows of this file's content committed by earlier runs, per the control table."""
+        from src.utils.db_utils import open_connection, read_checkpoint, release_connection
+        conn = open_connection(self.db_config, self.pool)
+        try:
+            return read_checkpoint(conn, self._control_table(), self.csv_file, self.content_hash)
+        finally:
+            conn.rollback()
+            release_connection(conn, self.pool)
+
+    def _record_checkpoint(self, loaded):
+        self._update_key_index(loaded)
+        # Reported before the manifest moves past them: a resume skips these rows
+        self._divert_rejected()
+        if self.manifest is None:
+            return
+        self.manifest.update(
+            self.csv_file,
+            content_hash=self.content_hash,
+            status='in_progress',
+            row=(self._load_progress or self.progress).get('row'),
+            offset=(self._load_progress or self.progress).get('offset'),
+            loaded=loaded,
+            errors=len(self.error_rows),
+        )
+
+    def _start_checkpoint(self):
+        """Open the manifest; return False if this file's content is already loaded."""
+        from src.utils.manifest import LoadManifest, MANIFEST_NAME, file_hash
+        manifest_path = self.checkpoint_cfg.get('manifest') or os.path.join(
+            os.path.dirname(os.path.abspath(self.csv_file)), MANIFEST_NAME)
+        self.manifest = LoadManifest(manifest_path)
+        self.content_hash = file_hash(self.csv_file)
+        if self.manifest.is_complete(self.content_hash):
+            print(f'Skipping {self.csv_file}: content already loaded (manifest {manifest_path})')
+            return False
+        entry = self.manifest.get(self.csv_file)
+        if entry and entry.get('status') == 'in_progress' and entry.get('content_hash') == self.content_hash:
+            # The control table is written in the load transaction; the manifest may lag one commit behind
+            committed = self._committed_rows()
+            self.resume_rows = committed if committed is not None else entry.get('loaded') or 0
+            self._carry_rejected()
+            print(f"Resuming from checkpoint: row {entry.get('row')}, {self.resume_rows} rows already committed")
+        else:
+            self.manifest.update(self.csv_file, content_hash=self.content_hash, status='in_progress',
+                                 row=1, offset=0, loaded=0, errors=0)
+        return True
+
+    def _finish_checkpoint(self, loaded):
+        from src.utils.manifest import file_hash
+        fields = dict(status='complete', content_hash=self.content_hash, loaded=loaded,
+                      errors=len(self.error_rows), row=self.progress.get('row'), offset=self.progress.get('offset'))
+        if self.error_file and not self.sidecars:
+            # The input was rewritten without its invalid rows; remember that content too
+            fields['output_hash'] = file_hash(self.csv_file)
+        self.manifest.update(self.csv_file, **fields)
+
+    def _partition_progress(self, partition, rows):
+        self.partition_progress[partition] = rows
+
+    def _table(self):
+        return self.config.get('table_name') or self.config.get('table')
+
+    def validate_and_load(self):
+        from src.validator.csv_validator import validate_csv_chunks
+
+        split_writer = self._open_split_writer = self._split_writer()
+        key_store = self._key_store()
+        # Wall and CPU seconds spent producing chunks; the rest of the load call is load time
+        produced = [0.0, 0.0]
+
+        def valid_chunks():
+            chunks = validate_csv_chunks(
+                self.csv_file,
+                schema=self._schema(),
+                unique_fields=self.config['unique_fields'],
+                chunk_size=self.chunk_size,
+                workers=self.workers,
+                sink=split_writer,
+                key_store=key_store,
+                progress=self.progress if self.manifest is not None else None,
+                metrics=self.metrics,
+                is_loaded=self._is_loaded(),
+                thresholds=self._thresholds(),
+                keep_raw=self._keep_raw(),
+                **self._backend_options(),
+            )
+            while True:
+                wall, cpu = time.perf_counter(), time.process_time()
+                chunk = next(chunks, None)
+                produced[0] += time.perf_counter() - wall
+                produced[1] += time.process_time() - cpu
+                if chunk is None:
+                    return
+                valid_chunk, error_chunk = chunk
+                if self._carried_rejected:
+                    # The error file is open now; loading has not started, so nothing else writes to it
+                    self._carried_rejected = False
+                    self._divert_rejected()
+                self.error_rows.extend(error_chunk)
+                self.valid_count += len(valid_chunk)
+                self._stage_index_keys(valid_chunk)
+                yield valid_chunk, dict(self.progress) if self.manifest is not None else None
+
+        def load_side(chunks):
+            for valid_chunk, progress in chunks:
+                self._load_progress = progress
+                yield valid_chunk
+
+        chunks = valid_chunks()
+        pipeline = None
+        if self.pipeline:
+            from src.utils.pipeline import ChunkPipeline, PIPELINE_QUEUE_SIZE
+            pipeline = chunks = ChunkPipeline(chunks, self.pipeline_cfg.get('queue_size') or PIPELINE_QUEUE_SIZE)
+        sinks = []
+        sink_before = self._sink_time()
+        sent_bytes = self.metrics.round_trips.sent_bytes
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            sinks = self._open_sinks()
+            loaded = self._load_chunks(self._feed_sinks(load_side(chunks), sinks) if sinks else load_side(chunks))
+        except BaseException:
+            if pipeline is not None:
+                pipeline.close()
+            self._abort_sinks(sinks)
+            split_writer.abort()
+            key_store.close()
+            raise
+        # Time spent writing the sinks is their own stage, not the loader's
+        sink_wall, sink_cpu = (after - before for after, before in zip(self._sink_time(), sink_before))
+        if pipeline is not None:
+            # Validation ran on its own thread; the loader was busy whenever it was not waiting for chunks
+            pipeline.close()
+            self.metrics.add('load', time.perf_counter() - wall - pipeline.consumer_wait - sink_wall,
+                             rows=loaded, nbytes=self.metrics.round_trips.sent_bytes - sent_bytes)
+            self._report_pipeline(pipeline.stats())
+        else:
+            self.metrics.add('load', time.perf_counter() - wall - produced[0] - sink_wall,
+                             time.process_time() - cpu - produced[1] - sink_cpu,
+                             rows=loaded, nbytes=self.metrics.round_trips.sent_bytes - sent_bytes)
+        self._update_key_index()
+        self._divert_rejected()
+        self._finish_split(split_writer)
+        self._finish_rejected()
+        self._finish_dedupe(key_store)
+        self._record_validation()
+        self._close_sinks(sinks)
+        if self.manifest is not None and not self.failed_partitions:
+            self._finish_checkpoint(loaded)
+        if loaded:
+            print('Data loaded to PostgreSQL.')
+        else:
+            print('No valid rows to load.')
+
+    def _report_pipeline(self, stats):
+        self.metrics.pipeline = stats
+        busy = stats['utilization']
+        print(f"Pipeline: validate busy {busy['validate']:.0%} (blocked {stats['validate_blocked']:.0%}), "
+              f"load busy {busy['load']:.0%}; queue mean {stats['queue_mean']:.1f} of {stats['queue_size']}, "
+              f"full {stats['queue_full']:.0%} / empty {stats['queue_empty']:.0%} of hand-offs")
+        if stats['chunks'] > 1:
+            bottleneck = 'load' if stats['queue_full'] > stats['queue_empty'] else 'validate'
+            print(f'Pipeline bottleneck: {bottleneck}')
+
+    def run(self):
+        if self.key_index is None and (self.config.get('key_index') or {}).get('enabled'):
+            from src.validator.key_index import open_key_index
+            self.key_index = open_key_index(self.config)
+            self._owns_key_index = self.key_index is not None
+        try:
+            with self.metrics.track():
+                self._run()
+        finally:
+            if self._owns_key_index:
+                self.key_index.close()
+
+    def run_preflight(self):
+        """Validate a sample of the file; return False (and set self.rejected) if its error rate is too high."""
+        from src.validator.preflight import preflight_csv, PREFLIGHT_MAX_ERROR_RATE, PREFLIGHT_SAMPLES, ROWS_PER_SAMPLE
+        cfg = self.config.get('preflight') or {}
+        max_rate = cfg.get('max_error_rate')
+        if max_rate is None:
+            max_rate = (self.config.get('abort') or {}).get('max_error_rate')
+        if max_rate is None:
+            max_rate = PREFLIGHT_MAX_ERROR_RATE
+        with self.metrics.stage('preflight') as timer:
+            report = preflight_csv(
+                self.csv_file,
+                self._schema(),
+                samples=cfg.get('samples') or PREFLIGHT_SAMPLES,
+                rows_per_sample=cfg.get('rows_per_sample') or ROWS_PER_SAMPLE,
+                method=cfg.get('method') or 'stratified',
+                seed=cfg.get('seed'),
+            )
+            timer.rows += report['rows']
+            timer.bytes += report['bytes_read']
+        print(f"Preflight: {report['rows']} rows sampled ({report['method']}), {report['errors']} invalid "
+              f"({report['error_rate']:.1%}) in {report['seconds']:.2f}s")
+        for message, count in report['top_errors']:
+            print(f'  {count} x {message}')
+        if report['error_rate'] > max_rate:
+            self.rejected = f"preflight error rate {report['error_rate']:.1%} is above {max_rate:.1%}"
+            print(f'Rejected {self.csv_file}: {self.rejected}')
+            return False
+        return True
+
+    def _run(self):
+        if self.preflight and not self.run_preflight():
+            return
+        if self.checkpoint:
+            if not self._start_checkpoint():
+                self.skipped = True
+                return
+            # Checkpoints need the streaming path so commits happen mid-file
+            self.chunk_size = self.chunk_size or min(self.checkpoint_cfg.get('commit_every') or 100000, 10000)
+        if self.pipeline:
+            # The pipeline hands chunks from validation to loading
+            self.chunk_size = self.chunk_size or self.pipeline_cfg.get('chunk_size') or 10000
+        if self.chunk_size:
+            self.run_streaming()
+            return
+        self.validate()
+        print(f'Valid rows: {self.valid_count}')
+        try:
+            self.load()
+        finally:
+            # Reported after the load, which can add rows the database rejected
+            if self.error_rows:
+                print('Validation errors:')
+                self.write_errors()
+
+    def run_streaming(self):
+        self.validate_and_load()
+        print(f'Valid rows: {self.valid_count}')
+        if self.error_rows:
+            print('Validation errors:')
+            self.write_errors()
+
+def close_deliveries():
+    # Wait for queued error reports; smtplib is only imported if one was queued
+    email_utils = sys.modules.get('src.utils.email_utils')
+    if email_utils is not None:
+        email_utils.close_deliveries()
+
+def write_reports(runs, config, json_path=None, prometheus_path=None):
+    """Write run metrics to the JSON report and Prometheus textfile, if configured."""
+    metrics_cfg = config.get('metrics') or {}
+    json_path = json_path or metrics_cfg.get('json')
+    prometheus_path = prometheus_path or metrics_cfg.get('prometheus')
+    if not json_path and not prometheus_path:
+        return
+    from src.utils.metrics import write_json_report, write_prometheus
+    if json_path:
+        write_json_report(runs, json_path)
+        print(f'Run report written to {json_path}')
+    if prometheus_path:
+        write_prometheus(runs, prometheus_path)
+        print(f'Prometheus metrics written to {prometheus_path}')
+
+def run_worker(config_path, args):
+    """Serve jobs with a resident EtlWorker until interrupted or sent SIGTERM."""
+    import signal
+    from src.config.schema_config import DEFAULT_CONFIG_PATH
+    from src.worker import EtlWorker
+    worker = EtlWorker(
+        config_path or DEFAULT_CONFIG_PATH,
+        spool_dir=args.spool_dir,
+        socket_path=args.socket_path,
+        jobs=args.jobs,
+        http_port=args.stats_port,
+        options=dict(chunk_size=args.chunk_size, workers=args.workers, sidecars=args.sidecars,
+                     connections=args.connections, checkpoint=args.checkpoint, preflight=args.preflight,
+                     pipeline=args.pipeline),
+        metrics_json=args.metrics_json,
+        metrics_prometheus=args.metrics_prom,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        worker.run()
+    finally:
+        close_deliveries()
+    stats = worker.stats()
+    print(f"Worker stopped after {stats['completed']} jobs: {stats['statuses']}")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='ETL CSV to PostgreSQL')
+    parser.add_argument('--csv', dest='csv_files', nargs='+', required=False,
+                        help='CSV file(s), directories or glob patterns, plain or .gz/.bz2/.xz/.zst; several files run as one batch')
+    parser.add_argument('--config', dest='config_file', required=False, help='Path to YAML config file')
+    parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=None,
+                        help='Stream validated rows to the loader in chunks of this many rows (default: load whole file in memory)')
+    parser.add_argument('--workers', dest='workers', type=int, default=1,
+                        help='Validate the CSV with this many worker processes (default: 1)')
+    parser.add_argument('--sidecars', dest='sidecars', action='store_true',
+                        help='Write <csv>_valid.csv and <csv>_errors.csv instead of rewriting the input CSV')
+    parser.add_argument('--connections', dest='connections', type=int, default=None,
+                        help='Load partitions concurrently over this many pooled connections (default: parallel_load.connections or 1)')
+    parser.add_argument('--checkpoint', dest='checkpoint', action='store_true', default=None,
+                        help='Commit periodically, resume interrupted loads and skip files already loaded')
+    parser.add_argument('--jobs', dest='jobs', type=int, default=None,
+                        help='Files processed concurrently in batch and worker mode (default: 4, or worker.jobs)')
+    parser.add_argument('--metrics-json', dest='metrics_json', default=None,
+                        help='Write a JSON run report with per-stage timings (default: metrics.json in the config)')
+    parser.add_argument('--metrics-prom', dest='metrics_prom', default=None,
+                        help='Write per-stage metrics in Prometheus textfile format (default: metrics.prometheus in the config)')
+    parser.add_argument('--profile', dest='profile', default=None,
+                        help='Profile the run with cProfile and dump pstats to this file (use --jobs 1 for batches)')
+    parser.add_argument('--preflight', action='store_true', default=None,
+                        help='Validate a sample of each file first and reject files whose error rate is too high')
+    parser.add_argument('--pipeline', action='store_true', default=None,
+                        help='Validate on a background thread while loading, handing chunks over a bounded queue')
+    parser.add_argument('--ddl', action='store_true',
+                        help='Print the table DDL generated from the schema config and exit')
+    parser.add_argument('--create-table', dest='create_table', action='store_true',
+                        help='Create the table, its indexes and UNLOGGED staging table from the schema config and exit')
+    parser.add_argument('--rebuild-key-index', dest='rebuild_key_index', action='store_true',
+                        help='Rebuild the cross-run key index (key_index.path) from the table and exit')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run as a resident worker taking jobs from a spool directory and/or a UNIX socket')
+    parser.add_argument('--spool', dest='spool_dir', default=None,
+                        help='Worker spool directory to watch for CSV files (default: worker.spool_dir)')
+    parser.add_argument('--socket', dest='socket_path', default=None,
+                        help='Worker UNIX socket accepting JSON job requests (default: worker.socket)')
+    parser.add_argument('--stats-port', dest='stats_port', type=int, default=None,
+                        help='Serve worker /health and /stats over HTTP on this port (default: worker.http_port)')
+    args = parser.parse_args()
+
+    # Allow config file from env var or CLI
+    config_path = args.config_file or os.environ.get('ETL_CONFIG')
+    if config_path:
+        config = load_config(config_path)
+    else:
+        config = load_config()
+
+    if args.ddl or args.create_table:
+        from src.utils.ddl import generate_ddl, create_table
+        if args.ddl:
+            print(generate_ddl(config))
+        else:
+            create_table(config['db_config'], config)
+            print(f"Created {config.get('table_name') or config.get('table')}")
+        return
+
+    if args.rebuild_key_index:
+        from src.validator.key_index import DEFAULT_INDEX_PATH, rebuild_key_index
+        path = (config.get('key_index') or {}).get('path') or DEFAULT_INDEX_PATH
+        table = config.get('table_name') or config.get('table')
+        count = rebuild_key_index(path, config['db_config'], table, config['unique_fields'], config['schema'])
+        print(f'Key index {path} rebuilt from {table}: {count} keys')
+        return
+
+    if args.worker:
+        run_worker(config_path, args)
+        return
+
+    # Allow CSV files from CLI or default
+    if args.csv_files:
+        from src.batch import resolve_inputs
+        csv_files = resolve_inputs(args.csv_files)
+    else:
+        csv_files = [os.path.join(os.path.dirname(__file__), '..', 'data', 'enterprise-survey-2024.csv')]
+    missing = [f for f in csv_files if not os.path.isfile(f)]
+    if missing or not csv_files:
+        print(f"CSV file not found: {', '.join(missing or args.csv_files)}")
+        sys.exit(1)
+    options = dict(chunk_size=args.chunk_size, workers=args.workers,
+                   sidecars=args.sidecars, connections=args.connections, checkpoint=args.checkpoint,
+                   preflight=args.preflight, pipeline=args.pipeline)
+    profiler = None
+    aborted = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        if len(csv_files) > 1:
+            from src.batch import run_batch
+            try:
+                results = run_batch(csv_files, config, jobs=args.jobs or 4, **options)
+            finally:
+                # Wait for queued error reports before exiting
+                close_deliveries()
+        else:
+            from src.validator.thresholds import ValidationAborted
+            etl = ETLProcess(csv_files[0], config, **options)
+            try:
+                etl.run()
+            except ValidationAborted as e:
+                aborted = str(e)
+                print(f'{csv_files[0]}: {aborted}')
+            finally:
+                close_deliveries()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f'Profile written to {args.profile} (inspect with python -m pstats)')
+
+    if len(csv_files) > 1:
+        from src.batch import print_summary
+        print_summary(results)
+        write_reports([r['metrics'] for r in results], config, args.metrics_json, args.metrics_prom)
+        if any(r['status'] in ('failed', 'aborted', 'rejected') for r in results):
+            sys.exit(1)
+        return
+    write_reports([etl.metrics], config, args.metrics_json, args.metrics_prom)
+    if aborted or etl.rejected:
+        sys.exit(1)
+    if etl.failed_partitions:
+        print(f'Load failed for partitions: {etl.failed_partitions}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
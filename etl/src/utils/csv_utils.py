@@ -0,0 +1,112 @@
+import csv
+import os
+import threading
+
+from src.utils.io_utils import detect_compression, open_output, split_compression_ext
+
+# Extra column appended to error rows holding their validation messages
+ERROR_COLUMN = 'etl_errors'
+
+
+def sidecar_path(csv_file, suffix, keep_compression=False):
+    """<name><suffix>.csv next to csv_file; a compression extension is kept only if asked."""
+    base, compression_ext = split_compression_ext(csv_file)
+    base, ext = os.path.splitext(base)
+    return f'{base}{suffix}{ext or ".csv"}{compression_ext if keep_compression else ""}'
+
+
+class CsvSplitWriter:
+    """Route raw CSV records to a valid sink and an error sink in one pass.
+
+    By default valid records are written to a temporary file that replaces
+    the source CSV on close (only when there were errors), preserving the
+    original row order. With sidecars=True the source is left untouched and
+    valid records go to <name>_valid.csv instead. Error records always go to
+    <name>_errors.csv with an extra ERROR_COLUMN. Valid records of a
+    compressed input are written with the same compression; the error file
+    is plain CSV.
+    """
+
+    def __init__(self, csv_file, sidecars=False):
+        self.csv_file = csv_file
+        self.sidecars = sidecars
+        self.compression = detect_compression(csv_file)
+        self.error_file = sidecar_path(csv_file, '_errors')
+        if sidecars:
+            self.valid_file = sidecar_path(csv_file, '_valid', keep_compression=True)
+        else:
+            self.valid_file = self.csv_file + '.tmp'
+        self.fieldnames = None
+        self.valid_count = 0
+        self.error_count = 0
+        self._valid_out = None
+        self._valid_writer = None
+        self._error_out = None
+        self._error_writer = None
+        # The loader adds database-rejected rows from its own thread (see write_rejected)
+        self._error_lock = threading.Lock()
+
+    def start(self, fieldnames):
+        self.fieldnames = [f for f in fieldnames if f is not None]
+        self._valid_out = open_output(self.valid_file, self.compression)
+        self._valid_writer = csv.writer(self._valid_out)
+        self._valid_writer.writerow(self.fieldnames)
+
+    def _values(self, row):
+        return [row.get(f) for f in self.fieldnames]
+
+    def write_valid(self, row):
+        self._valid_writer.writerow(self._values(row))
+        self.valid_count += 1
+
+    def write_error(self, row, errors):
+        with self._error_lock:
+            if self._error_writer is None:
+                self._error_out = open(self.error_file, 'w', newline='', encoding='utf-8')
+                self._error_writer = csv.writer(self._error_out)
+                self._error_writer.writerow(self.fieldnames + [ERROR_COLUMN])
+            self._error_writer.writerow(self._values(row) + ['; '.join(errors)])
+            self.error_count += 1
+
+    def write_rejected(self, rows):
+        """Add (raw row, errors) pairs to the error file while validation runs, and flush them."""
+        for row, errors in rows:
+            self.write_error(row, errors)
+        with self._error_lock:
+            if self._error_out is not None:
+                self._error_out.flush()
+
+    def close(self):
+        for out in (self._valid_out, self._error_out):
+            if out is not None:
+                out.close()
+        self._valid_out = self._error_out = None
+        if self.sidecars or self.fieldnames is None:
+            return
+        if self.error_count:
+            # Remove invalid rows from the original file
+            os.replace(self.valid_file, self.csv_file)
+        else:
+            os.remove(self.valid_file)
+
+    def abort(self):
+        for out in (self._valid_out, self._error_out):
+            if out is not None:
+                out.close()
+        self._valid_out = self._error_out = None
+        if not self.sidecars and os.path.exists(self.valid_file):
+            os.remove(self.valid_file)
+
+
+def append_error_rows(error_file, fieldnames, rows, start=False):
+    """
+    Append (row dict, errors) pairs to an error file in CsvSplitWriter's
+    format, starting it if new; start=True replaces any existing file.
+    """
+    is_new = start or not os.path.exists(error_file)
+    with open(error_file, 'w' if start else 'a', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        if is_new:
+            writer.writerow(list(fieldnames) + [ERROR_COLUMN])
+        for row, errors in rows:
+            writer.writerow([row.get(f) for f in fieldnames] + ['; '.join(errors)])
@@ -1,15 +1,285 @@
-import psycopg2
-from psycopg2.extras import execute_values
-
-def get_connection(db_config):
-    return psycopg2.connect(**db_config)
-
-def insert_rows(conn, table, rows):
-    if not rows:
-        return
-    columns = rows[0].keys()
-    values = [[row[col] for col in columns] for row in rows]
-    with conn.cursor() as cur:
-        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
-        execute_values(cur, query, values)
-    conn.commit()
+import re
+import tempfile
+import threading
+
+from src.utils.metrics import count_round_trip
+from src.utils.rows import row_columns, row_values
+
+# psycopg2 is imported on first use so importing the loader stays cheap
+
+# Rows are spooled in memory up to this many bytes before spilling to disk
+COPY_SPOOL_SIZE = 64 * 1024 * 1024
+
+# Rows per INSERT statement sent by execute_values
+INSERT_PAGE_SIZE = 100
+
+# Control table holding committed row counts of checkpointed loads, in the target's schema
+CHECKPOINT_TABLE = 'etl_load_checkpoints'
+# Suffix of the UNLOGGED staging table that upserts load before merging
+STAGING_SUFFIX = '_staging'
+
+# pg_get_indexdef's ON clause for an index on a partitioned table itself
+_ONLY = re.compile(r' ON ONLY ')
+
+# Escapes for PostgreSQL COPY text format
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Connection pools shared by every load in this process, keyed on db_config
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_connection(db_config):
+    import psycopg2
+    conn = psycopg2.connect(**db_config)
+    count_round_trip('connect')
+    return conn
+
+def _blocking_pool(minconn, maxconn, db_config):
+    from psycopg2.pool import ThreadedConnectionPool
+
+    class BlockingConnectionPool(ThreadedConnectionPool):
+        """
+        A ThreadedConnectionPool whose getconn() waits for a connection to be
+        returned once all maxconn are in use, instead of raising PoolError,
+        and whose maxconn can grow while its connections are in use.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._returned = threading.Condition(self._lock)
+
+        def getconn(self, key=None):
+            with self._returned:
+                while not self.closed and len(self._used) >= self.maxconn and key not in self._used:
+                    self._returned.wait()
+                return self._getconn(key)
+
+        def putconn(self, conn=None, key=None, close=False):
+            with self._returned:
+                self._putconn(conn, key, close)
+                self._returned.notify()
+
+        def closeall(self):
+            with self._returned:
+                self._closeall()
+                self._returned.notify_all()
+
+        def grow(self, size):
+            with self._returned:
+                if size > self.maxconn:
+                    self.maxconn = size
+                    self._returned.notify_all()
+
+    return BlockingConnectionPool(minconn, maxconn, **db_config)
+
+
+def get_pool(db_config, size):
+    """
+    Return the thread-safe connection pool shared by every load of
+    db_config, allowing at least size connections at once. A larger size
+    grows the existing pool, so connections in use elsewhere stay valid;
+    once all are in use, taking one waits for another to be returned.
+    """
+    key = tuple(sorted(db_config.items()))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None or pool.closed:
+            pool = _POOLS[key] = _blocking_pool(1, size, db_config)
+        else:
+            pool.grow(size)
+    return pool
+
+def close_pools():
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            if not pool.closed:
+                pool.closeall()
+        _POOLS.clear()
+
+def open_connection(db_config, pool=None):
+    if pool is None:
+        return get_connection(db_config)
+    return pool.getconn()
+
+def release_connection(conn, pool=None, broken=False):
+    if pool is None:
+        conn.close()
+    else:
+        pool.putconn(conn, close=broken)
+
+def commit(conn):
+    conn.commit()
+    count_round_trip('commit')
+
+def rollback(conn):
+    conn.rollback()
+    count_round_trip('rollback')
+
+def savepoint(conn, name):
+    with conn.cursor() as cur:
+        cur.execute(f"SAVEPOINT {name}")
+    count_round_trip('execute')
+
+def release_savepoint(conn, name):
+    with conn.cursor() as cur:
+        cur.execute(f"RELEASE SAVEPOINT {name}")
+    count_round_trip('execute')
+
+def rollback_to_savepoint(conn, name):
+    with conn.cursor() as cur:
+        cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+    count_round_trip('execute')
+
+def insert_rows(conn, table, rows, commit=True):
+    from psycopg2.extras import execute_values
+    if not rows:
+        return
+    columns = row_columns(rows)
+    values = row_values(rows, columns)
+    with conn.cursor() as cur:
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+        execute_values(cur, query, values, page_size=INSERT_PAGE_SIZE)
+    count_round_trip('execute', -(-len(values) // INSERT_PAGE_SIZE))
+    if commit:
+        conn.commit()
+        count_round_trip('commit')
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).translate(_COPY_ESCAPES)
+
+def copy_rows(conn, table, rows, commit=True):
+    """Bulk load rows with COPY FROM STDIN using the text format.
+
+    rows is a RowBatch of tuples or a list of dicts. None values are
+    written as the COPY NULL marker (\\N).
+    """
+    if not rows:
+        return
+    columns = row_columns(rows)
+    with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_SIZE, mode='w+', encoding='utf-8', newline='') as buf:
+        for values in row_values(rows, columns):
+            buf.write('\t'.join([_copy_value(value) for value in values]))
+            buf.write('\n')
+        sent_bytes = buf.tell()
+        buf.seek(0)
+        with conn.cursor() as cur:
+            query = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+            cur.copy_expert(query, buf)
+    count_round_trip('copy', sent_bytes=sent_bytes)
+    if commit:
+        conn.commit()
+        count_round_trip('commit')
+
+def create_staging_table(conn, table, name='etl_staging'):
+    """Create a temporary staging table shaped like table, dropped at commit."""
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {name} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+    count_round_trip('execute')
+    return name
+
+def staging_table_name(table):
+    return table + STAGING_SUFFIX
+
+def prepare_staging_table(conn, table, staging):
+    """Empty the UNLOGGED staging table of table within the open transaction, creating it on first use."""
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS); "
+                    f"TRUNCATE {staging}")
+    count_round_trip('execute')
+    return staging
+
+def merge_staging(conn, staging, table, columns, unique_fields):
+    """Merge staged rows into table with INSERT ... ON CONFLICT on unique_fields.
+
+    Rows whose non-key columns already match are left alone. Returns
+    (inserted, updated); the remaining staged rows were unchanged.
+    """
+    cols = ', '.join(columns)
+    keys = ', '.join(unique_fields)
+    others = [c for c in columns if c not in unique_fields]
+    if others:
+        assignments = ', '.join(f"{c} = EXCLUDED.{c}" for c in others)
+        current = ', '.join(f"t.{c}" for c in others)
+        incoming = ', '.join(f"EXCLUDED.{c}" for c in others)
+        on_conflict = f"DO UPDATE SET {assignments} WHERE ROW({current}) IS DISTINCT FROM ROW({incoming})"
+    else:
+        on_conflict = "DO NOTHING"
+    query = (
+        f"WITH merged AS ("
+        f"INSERT INTO {table} AS t ({cols}) SELECT {cols} FROM {staging} "
+        f"ON CONFLICT ({keys}) {on_conflict} "
+        f"RETURNING (xmax = 0) AS inserted) "
+        f"SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged"
+    )
+    with conn.cursor() as cur:
+        cur.execute(query)
+        inserted, updated = cur.fetchone()
+    count_round_trip('execute')
+    return inserted, updated
+
+def truncate_table(conn, table):
+    with conn.cursor() as cur:
+        cur.execute(f"TRUNCATE {table}")
+    count_round_trip('execute')
+
+def drop_indexes(conn, table):
+    """Drop the indexes of table that no constraint depends on; return their definitions.
+
+    Primary key and constraint indexes are kept. Pass the result to
+    create_indexes to rebuild them. On a partitioned table the definitions
+    read ON ONLY the parent; that is dropped so the rebuilt index covers
+    every partition again, as dropping the parent's index removed theirs.
+    """
+    query = (
+        "SELECT n.nspname, i.relname, pg_get_indexdef(x.indexrelid) "
+        "FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+        "JOIN pg_namespace n ON n.oid = i.relnamespace "
+        "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)"
+    )
+    with conn.cursor() as cur:
+        cur.execute(query, (table,))
+        indexes = cur.fetchall()
+        for schema, name, _ in indexes:
+            cur.execute(f'DROP INDEX "{schema}"."{name}"')
+    count_round_trip('execute', 1 + len(indexes))
+    return [_ONLY.sub(' ON ', definition, count=1) for _, _, definition in indexes]
+
+def create_indexes(conn, definitions):
+    with conn.cursor() as cur:
+        for definition in definitions:
+            cur.execute(definition)
+    count_round_trip('execute', len(definitions))
+
+def write_checkpoint(conn, control_table, source, content_hash, loaded):
+    """Record loaded rows of source in control_table within the open transaction.
+
+    The row commits or rolls back together with the rows it counts.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {control_table} ("
+            f"source TEXT NOT NULL, content_hash TEXT NOT NULL, loaded BIGINT NOT NULL, "
+            f"updated_at TIMESTAMPTZ NOT NULL DEFAULT now(), PRIMARY KEY (source, content_hash))"
+        )
+        cur.execute(
+            f"INSERT INTO {control_table} (source, content_hash, loaded) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (source, content_hash) DO UPDATE SET loaded = EXCLUDED.loaded, updated_at = now()",
+            (source, content_hash, loaded),
+        )
+    count_round_trip('execute', 2)
+
+def read_checkpoint(conn, control_table, source, content_hash):
+    """Return the committed row count recorded for source, or None."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (control_table,))
+        if cur.fetchone()[0] is None:
+            count_round_trip('execute')
+            return None
+        cur.execute(f"SELECT loaded FROM {control_table} WHERE source = %s AND content_hash = %s",
+                    (source, content_hash))
+        row = cur.fetchone()
+    count_round_trip('execute', 2)
+    return row[0] if row else None
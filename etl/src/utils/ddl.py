@@ -0,0 +1,122 @@
+import re
+from datetime import date
+
+# Column types emitted for each schema type; a column's sql_type rule overrides them
+SQL_TYPES = {
+    int: 'INT',
+    float: 'NUMERIC',
+    date: 'DATE',
+}
+
+
+def sql_type(rules):
+    """PostgreSQL type for a schema column: sql_type if given, else from type and max_length."""
+    if rules.get('sql_type'):
+        return rules['sql_type']
+    col_type = rules.get('type', str)
+    if col_type in SQL_TYPES:
+        return SQL_TYPES[col_type]
+    if rules.get('max_length'):
+        return f"VARCHAR({rules['max_length']})"
+    return 'TEXT'
+
+
+def _split_table(table):
+    schema, _, name = table.rpartition('.')
+    return schema or None, name
+
+
+def _literal(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _index_name(table, columns, suffix='idx'):
+    _, name = _split_table(table)
+    return f"{name}_{'_'.join(c.lower() for c in columns)}_{suffix}"
+
+
+def generate_ddl(config):
+    """
+    Build the DDL for the configured table from its schema: the table
+    (LIST-partitioned on ddl.partition_by if set), the unique index on
+    unique_fields, any secondary indexes in ddl.indexes and, unless
+    ddl.staging_table is false, the UNLOGGED staging table upserts load.
+    Returns the SQL script as a string.
+    """
+    from src.utils.db_utils import staging_table_name
+    ddl_cfg = config.get('ddl') or {}
+    table = config.get('table_name') or config.get('table')
+    schema_name, name = _split_table(table)
+    unique_fields = list(config.get('unique_fields') or [])
+    partition_by = ddl_cfg.get('partition_by')
+    if partition_by and partition_by not in config['schema']:
+        raise ValueError(f"ddl.partition_by {partition_by!r} is not a schema column")
+    if partition_by and unique_fields and partition_by not in unique_fields:
+        # PostgreSQL only allows unique indexes that include the partition key
+        raise ValueError(f"ddl.partition_by {partition_by!r} must be one of unique_fields {unique_fields}")
+
+    lines = [f'-- Generated from schema_config.yml for {table}; regenerate with: python etl.py --ddl', '']
+    if schema_name:
+        lines += [f'CREATE SCHEMA IF NOT EXISTS {schema_name};', '']
+
+    columns = []
+    for col, rules in config['schema'].items():
+        column = f'    {col} {sql_type(rules)}'
+        if rules.get('required'):
+            column += ' NOT NULL'
+        columns.append(column)
+    create = f'CREATE TABLE IF NOT EXISTS {table} (\n' + ',\n'.join(columns) + '\n)'
+    if partition_by:
+        create += f' PARTITION BY LIST ({partition_by})'
+    lines += [create + ';', '']
+
+    if partition_by:
+        lines.append(f'-- One partition per {partition_by} value; other values land in the default partition')
+        for value in ddl_cfg.get('partitions') or []:
+            suffix = re.sub(r'\W', '_', str(value))
+            lines.append(f'CREATE TABLE IF NOT EXISTS {table}_{suffix} PARTITION OF {table} '
+                         f'FOR VALUES IN ({_literal(value)});')
+        lines += [f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;', '']
+
+    if unique_fields:
+        lines += [
+            '-- Unique key used by load_mode: upsert (NULLS NOT DISTINCT needs PostgreSQL 15+);',
+            '-- load_mode: append fails on rows that are already loaded',
+            f'CREATE UNIQUE INDEX IF NOT EXISTS {name}_unique_key',
+            f"    ON {table} ({', '.join(unique_fields)}) NULLS NOT DISTINCT;",
+            '',
+        ]
+
+    indexes = ddl_cfg.get('indexes') or []
+    if indexes:
+        lines.append('-- Secondary indexes; load_mode: reload drops and rebuilds them around the bulk load')
+        for index_columns in indexes:
+            index_columns = [index_columns] if isinstance(index_columns, str) else list(index_columns)
+            lines.append(f'CREATE INDEX IF NOT EXISTS {_index_name(table, index_columns)} '
+                         f"ON {table} ({', '.join(index_columns)});")
+        lines.append('')
+
+    if ddl_cfg.get('staging_table', True):
+        lines += [
+            '-- Staging table that load_mode: upsert truncates, loads and merges from; UNLOGGED',
+            '-- skips the WAL, so its contents do not survive a crash',
+            f'CREATE UNLOGGED TABLE IF NOT EXISTS {staging_table_name(table)} (LIKE {table} INCLUDING DEFAULTS);',
+            '',
+        ]
+    return '\n'.join(lines)
+
+
+def create_table(db_config, config):
+    """Run generate_ddl(config) against the database in one transaction."""
+    from src.utils.db_utils import get_connection, commit
+    from src.utils.metrics import count_round_trip
+    conn = get_connection(db_config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(generate_ddl(config))
+        count_round_trip('execute')
+        commit(conn)
+    finally:
+        conn.close()
@@ -1,48 +1,120 @@
-import smtplib
+import csv
+import gzip
+import io
 import mimetypes
+import queue
+import smtplib
+import tempfile
+import threading
+import time
+import zipfile
 from email.message import EmailMessage
 from pathlib import Path
 
+# Compressed attachments are spooled in memory up to this size, then on disk
+SPOOL_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024
+DEFAULT_SAMPLE_ROWS = 1000
+_BLOCK_SIZE = 1024 * 1024
+# Seconds an SMTP connection waits on the server, unless configured otherwise
+SMTP_TIMEOUT = 60
 
-def send_email(smtp_config, from_addr, to_addrs, subject, body, attachments=None):
-    """Send an email with optional attachments.
 
-    smtp_config: dict with keys host, port, username, password, use_tls, use_ssl
-    to_addrs: list of recipient emails
-    attachments: list of file paths
+def _compress_stream(src, name, method, limit):
+    """Compress src into a spooled buffer; return the bytes, or None if over limit."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as buf:
+        if method == 'zip':
+            archive = zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED)
+            dst = archive.open(name, 'w', force_zip64=True)
+        else:
+            archive = None
+            dst = gzip.GzipFile(filename=name, mode='wb', fileobj=buf)
+        try:
+            for block in iter(lambda: src.read(_BLOCK_SIZE), b''):
+                dst.write(block)
+                if limit and buf.tell() > limit:
+                    return None
+        finally:
+            dst.close()
+            if archive is not None:
+                archive.close()
+        if limit and buf.tell() > limit:
+            return None
+        buf.seek(0)
+        return buf.read()
+
+
+def _csv_sample(path, rows):
+    out = io.StringIO()
+    with open(path, newline='', encoding='utf-8') as f:
+        writer = csv.writer(out)
+        for i, record in enumerate(csv.reader(f)):
+            if i > rows:  # header plus `rows` records
+                break
+            writer.writerow(record)
+    return io.BytesIO(out.getvalue().encode('utf-8'))
+
+
+def prepare_attachment(path, compress='gzip', max_bytes=DEFAULT_MAX_ATTACHMENT_BYTES,
+                       sample_rows=DEFAULT_SAMPLE_ROWS):
+    """Read an attachment from disk, compressing it while streaming.
+
+    Returns (filename, maintype, subtype, data, truncated). If the compressed
+    file is larger than max_bytes, a compressed sample of the first
+    sample_rows CSV records is attached instead and truncated is True.
+    compress is 'gzip', 'zip' or 'none'.
     """
-    if attachments is None:
-        attachments = []
+    p = Path(path)
+    if compress in ('gzip', 'zip'):
+        name = f'{p.name}.gz' if compress == 'gzip' else f'{p.stem}.zip'
+        subtype = 'gzip' if compress == 'gzip' else 'zip'
+        with p.open('rb') as f:
+            data = _compress_stream(f, p.name, compress, max_bytes)
+        if data is not None:
+            return name, 'application', subtype, data, False
+        sample_name = f'{p.stem}_sample{p.suffix}'
+        data = _compress_stream(_csv_sample(p, sample_rows), sample_name, compress, None)
+        name = f'{sample_name}.gz' if compress == 'gzip' else f'{p.stem}_sample.zip'
+        return name, 'application', subtype, data, True
+
+    ctype, encoding = mimetypes.guess_type(str(p))
+    if ctype is None:
+        ctype = 'application/octet-stream'
+    maintype, subtype = ctype.split('/', 1)
+    if max_bytes and p.stat().st_size > max_bytes:
+        data = _csv_sample(p, sample_rows).read()
+        return f'{p.stem}_sample{p.suffix}', maintype, subtype, data, True
+    with p.open('rb') as f:
+        data = f.read()
+    return p.name, maintype, subtype, data, False
 
+
+def build_message(from_addr, to_addrs, subject, body, attachments=None):
+    """Build an EmailMessage. attachments: prepared (filename, maintype, subtype, data) tuples."""
     msg = EmailMessage()
     msg['Subject'] = subject
     msg['From'] = from_addr
     msg['To'] = ', '.join(to_addrs) if isinstance(to_addrs, (list, tuple)) else to_addrs
     msg.set_content(body)
+    for filename, maintype, subtype, data in attachments or []:
+        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+    return msg
 
-    for path in attachments:
-        p = Path(path)
-        if not p.exists():
-            continue
-        ctype, encoding = mimetypes.guess_type(str(p))
-        if ctype is None:
-            ctype = 'application/octet-stream'
-        maintype, subtype = ctype.split('/', 1)
-        with p.open('rb') as f:
-            data = f.read()
-        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=p.name)
 
+def open_smtp(smtp_config):
     host = smtp_config.get('host')
     port = smtp_config.get('port')
     username = smtp_config.get('username')
     password = smtp_config.get('password')
     use_tls = smtp_config.get('use_tls', False)
     use_ssl = smtp_config.get('use_ssl', False)
+    # A server that stops answering fails the send instead of stalling the delivery queue
+    timeout = smtp_config.get('timeout') or SMTP_TIMEOUT
 
     if use_ssl:
-        server = smtplib.SMTP_SSL(host, port)
+        server = smtplib.SMTP_SSL(host, port, timeout=timeout)
     else:
-        server = smtplib.SMTP(host, port)
+        server = smtplib.SMTP(host, port, timeout=timeout)
     try:
         server.ehlo()
         if use_tls and not use_ssl:
@@ -50,6 +122,180 @@ def send_email(smtp_config, from_addr, to_addrs, subject, body, attachments=None
             server.ehlo()
         if username:
             server.login(username, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _quit(server):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+def send_email(smtp_config, from_addr, to_addrs, subject, body, attachments=None):
+    """Send an email with optional attachments.
+
+    smtp_config: dict with keys host, port, username, password, use_tls, use_ssl
+    to_addrs: list of recipient emails
+    attachments: list of file paths
+    """
+    if attachments is None:
+        attachments = []
+
+    prepared = []
+    for path in attachments:
+        if not Path(path).exists():
+            continue
+        filename, maintype, subtype, data, _ = prepare_attachment(path, compress='none', max_bytes=None)
+        prepared.append((filename, maintype, subtype, data))
+    msg = build_message(from_addr, to_addrs, subject, body, prepared)
+
+    server = open_smtp(smtp_config)
+    try:
         server.send_message(msg)
     finally:
         server.quit()
+
+
+_STOP = object()
+
+
+class EmailDelivery:
+    """Background queue that sends error reports without blocking the ETL.
+
+    Messages are built (attachments compressed from disk) and sent on a
+    worker thread. One SMTP connection is reused while reports keep
+    arriving and closed after idle_timeout seconds without work.
+    """
+
+    def __init__(self, smtp_config, idle_timeout=5.0):
+        self.smtp_config = smtp_config
+        self.idle_timeout = idle_timeout
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='etl-email', daemon=True)
+        self._thread.start()
+
+    def submit(self, from_addr, to_addrs, subject, body, attachments=None, compress='gzip',
+               max_bytes=DEFAULT_MAX_ATTACHMENT_BYTES, sample_rows=DEFAULT_SAMPLE_ROWS, row_count=None,
+               on_done=None):
+        """Queue a report; attachments are file paths read when the report is sent.
+
+        on_done(seconds, sent) is called from the worker once the report has
+        been built and sent (or has failed).
+        """
+        self._queue.put(dict(from_addr=from_addr, to_addrs=to_addrs, subject=subject, body=body,
+                             attachments=attachments or [], compress=compress, max_bytes=max_bytes,
+                             sample_rows=sample_rows, row_count=row_count, on_done=on_done))
+
+    def _build(self, job):
+        body = job['body']
+        prepared = []
+        for path in job['attachments']:
+            if not Path(path).exists():
+                continue
+            filename, maintype, subtype, data, truncated = prepare_attachment(
+                path, job['compress'], job['max_bytes'], job['sample_rows'])
+            if truncated:
+                total = f"{job['row_count']} rows" if job['row_count'] is not None else 'the full file'
+                body += (f"\n\n{Path(path).name} is too large to attach; this is a sample of the first "
+                         f"{job['sample_rows']} rows out of {total}. The full file is at {path}.")
+            prepared.append((filename, maintype, subtype, data))
+        return build_message(job['from_addr'], job['to_addrs'], job['subject'], body, prepared)
+
+    def _send(self, server, msg):
+        if server is None:
+            server = open_smtp(self.smtp_config)
+            self.connections += 1
+            server.send_message(msg)
+            return server
+        try:
+            server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The relay dropped an idle connection; reconnect once
+            server = open_smtp(self.smtp_config)
+            self.connections += 1
+            server.send_message(msg)
+        return server
+
+    def _run(self):
+        server = None
+        while True:
+            try:
+                job = self._queue.get(timeout=self.idle_timeout if server is not None else None)
+            except queue.Empty:
+                _quit(server)
+                server = None
+                continue
+            if job is _STOP:
+                break
+            if isinstance(job, threading.Event):
+                job.set()  # a flush() marker: everything queued before it is done
+                continue
+            start = time.perf_counter()
+            sent = False
+            try:
+                server = self._send(server, self._build(job))
+                self.sent += 1
+                sent = True
+                print('Error file emailed to:', job['to_addrs'])
+            except Exception as e:
+                self.failed += 1
+                print('Failed to send error email:', e)
+                if server is not None:
+                    server.close()
+                    server = None
+            if job['on_done'] is not None:
+                job['on_done'](time.perf_counter() - start, sent)
+        if server is not None:
+            _quit(server)
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been sent (or has failed)."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Send everything queued so far, then stop the worker."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+_DELIVERIES = {}
+_DELIVERIES_LOCK = threading.Lock()
+
+
+def get_delivery(smtp_config):
+    """Shared EmailDelivery per SMTP server, so batch runs reuse one connection."""
+    key = tuple(sorted((k, str(v)) for k, v in smtp_config.items()))
+    with _DELIVERIES_LOCK:
+        delivery = _DELIVERIES.get(key)
+        if delivery is None:
+            delivery = _DELIVERIES[key] = EmailDelivery(smtp_config)
+        return delivery
+
+
+def close_deliveries(timeout=None):
+    with _DELIVERIES_LOCK:
+        deliveries = list(_DELIVERIES.values())
+        _DELIVERIES.clear()
+    for delivery in deliveries:
+        delivery.close(timeout)
+
+
+def flush_deliveries(timeout=None):
+    """Wait up to timeout seconds in all for the reports queued so far; False if some are still queued."""
+    with _DELIVERIES_LOCK:
+        deliveries = list(_DELIVERIES.values())
+    deadline = None if timeout is None else time.monotonic() + timeout
+    flushed = True
+    for delivery in deliveries:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        flushed = delivery.flush(remaining) and flushed
+    return flushed
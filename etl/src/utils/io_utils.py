@@ -0,0 +1,95 @@
+import io
+import os
+
+# Plain inputs are read through a buffer of this size
+READ_BUFFER_SIZE = 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+
+_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+
+def split_compression_ext(path):
+    """Split a compression extension off path: 'a.csv.gz' -> ('a.csv', '.gz')."""
+    base, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSION_EXTENSIONS:
+        return base, ext
+    return path, ''
+
+
+def detect_compression(path):
+    """Return 'gzip', 'bz2', 'xz', 'zstd' or None, from the extension or else the magic bytes."""
+    _, ext = split_compression_ext(path)
+    if ext:
+        return COMPRESSION_EXTENSIONS[ext.lower()]
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, compression in _MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _zstd_open(path, mode):
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(path, mode)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f'{path} is zstd-compressed; reading it needs Python 3.14+ or the zstandard package')
+    return zstandard.open(path, mode)
+
+
+def _open_compressed(path, compression, mode):
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, mode)
+    if compression == 'bz2':
+        import bz2
+        return bz2.open(path, mode)
+    if compression == 'xz':
+        import lzma
+        return lzma.open(path, mode)
+    if compression == 'zstd':
+        return _zstd_open(path, mode)
+    raise ValueError(f'Unknown compression {compression!r}')
+
+
+def open_input(path, compression=None):
+    """
+    Open an input file for binary reading, decompressing gzip, bz2, xz and
+    zstd transparently. compression defaults to detect_compression(path).
+    Plain files are read through a READ_BUFFER_SIZE buffer.
+    """
+    compression = compression or detect_compression(path)
+    if compression is None:
+        return open(path, 'rb', buffering=READ_BUFFER_SIZE)
+    return io.BufferedReader(_open_compressed(path, compression, 'rb'), READ_BUFFER_SIZE)
+
+
+def decoded_lines(binfile, encoding='utf-8'):
+    """Yield the lines of a binary file as text, for csv.reader."""
+    for line in binfile:
+        yield line.decode(encoding)
+
+
+def open_output(path, compression=None):
+    """Open path for writing CSV text, compressed with compression if given."""
+    if compression is None:
+        return open(path, 'w', newline='', encoding='utf-8')
+    return io.TextIOWrapper(_open_compressed(path, compression, 'wb'), encoding='utf-8', newline='')
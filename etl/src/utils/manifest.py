@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = '.etl_manifest.json'
+
+# One lock per manifest file so batch runs can share it safely
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def file_hash(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _lock_for(path):
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class LoadManifest:
+    """JSON manifest of checkpointed loads, keyed on the absolute CSV path.
+
+    Each entry records the file's content hash, status (in_progress or
+    complete), the last committed row number and byte offset, and counts.
+    Writes go through a temp file and os.replace so a crash never leaves a
+    truncated manifest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = _lock_for(path)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, entries):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def get(self, csv_file):
+        with self._lock:
+            return self._read().get(os.path.abspath(csv_file))
+
+    def is_complete(self, content_hash):
+        with self._lock:
+            for entry in self._read().values():
+                if entry.get('status') == 'complete' and content_hash in (
+                        entry.get('content_hash'), entry.get('output_hash')):
+                    return True
+        return False
+
+    def update(self, csv_file, **fields):
+        with self._lock:
+            entries = self._read()
+            entry = entries.setdefault(os.path.abspath(csv_file), {'file': os.path.abspath(csv_file)})
+            entry.update(fields)
+            entry['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            self._write(entries)
+            return entry
@@ -0,0 +1,284 @@
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Stages in report order. parse, validate, dedupe and split are timed with a
+# wall clock only; the other stages also record process CPU time.
+STAGES = ['preflight', 'parse', 'validate', 'dedupe', 'split', 'write_errors', 'email', 'sink', 'load']
+
+# Per-row stages time one call in this many and scale it up (see RunMetrics.timed)
+TIMING_SAMPLE = 16
+
+# Round-trip counter of the run executing in the current context (see RunMetrics.track)
+_ROUND_TRIPS = contextvars.ContextVar('etl_round_trips', default=None)
+
+
+def count_round_trip(kind, n=1, sent_bytes=0):
+    """Record n database round trips of kind for the current run, if one is tracked."""
+    counter = _ROUND_TRIPS.get()
+    if counter is not None:
+        counter.add(kind, n, sent_bytes)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if unavailable."""
+    if sys.platform == 'win32':
+        return _windows_peak_working_set()
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _windows_peak_working_set():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+class RoundTrips:
+    """Thread-safe count of database round trips by kind (connect, execute, copy, commit, rollback)."""
+
+    def __init__(self):
+        self.counts = {}
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, kind, n=1, sent_bytes=0):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + n
+            self.sent_bytes += sent_bytes
+
+    def total(self):
+        return sum(self.counts.values())
+
+
+class StageTimer:
+    """Accumulated wall time, CPU time, rows and bytes of one stage."""
+
+    __slots__ = ('seconds', 'cpu_seconds', 'rows', 'bytes', 'calls')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.cpu_seconds = None
+        self.rows = 0
+        self.bytes = 0
+        self.calls = 0
+
+    def as_dict(self):
+        seconds = self.seconds
+        return {
+            'seconds': round(seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6) if self.cpu_seconds is not None else None,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'calls': self.calls,
+            'rows_per_sec': round(self.rows / seconds, 1) if seconds and self.rows else None,
+            'bytes_per_sec': round(self.bytes / seconds, 1) if seconds and self.bytes else None,
+        }
+
+
+class RunMetrics:
+    """
+    Per-stage instrumentation for one ETL run: wall and CPU time, rows and
+    bytes per stage, peak memory and database round trips. report() returns
+    a JSON-serialisable dict; see write_json_report and write_prometheus.
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.stages = {}
+        self.round_trips = RoundTrips()
+        self.counters = {}
+        self.started_at = None
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss = None
+        # Set by pipelined runs: stage utilisation and queue occupancy (see src.utils.pipeline)
+        self.pipeline = None
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = self.stages[name] = StageTimer()
+        return timer
+
+    def add(self, name, seconds=0.0, cpu_seconds=None, rows=0, nbytes=0, calls=1):
+        with self._lock:
+            timer = self.timer(name)
+            timer.seconds += seconds
+            if cpu_seconds is not None:
+                timer.cpu_seconds = (timer.cpu_seconds or 0.0) + cpu_seconds
+            timer.rows += rows
+            timer.bytes += nbytes
+            timer.calls += calls
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as stage name; rows and bytes can be added to the yielded timer."""
+        timer = self.timer(name)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield timer
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, calls=1)
+
+    def timed(self, name, fn, every=TIMING_SAMPLE):
+        """Wrap fn so stage name gets the wall time of its calls, timing one call in every.
+
+        Timing each call of a per-row function costs more than many of the
+        calls themselves, so the sampled call's time, rows and calls are
+        counted every times; the totals are estimates within every calls.
+        """
+        timer = self.timer(name)
+        perf = time.perf_counter
+        calls = itertools.count(1)
+
+        def wrapper(*args):
+            if next(calls) % every:
+                return fn(*args)
+            start = perf()
+            try:
+                return fn(*args)
+            finally:
+                timer.seconds += (perf() - start) * every
+                timer.rows += every
+                timer.calls += every
+        return wrapper
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def track(self):
+        """Measure the whole run and attribute database round trips made in this context to it."""
+        token = _ROUND_TRIPS.set(self.round_trips)
+        self.started_at = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield self
+        finally:
+            self.seconds += time.perf_counter() - wall
+            self.cpu_seconds += time.process_time() - cpu
+            self.peak_rss = peak_rss_bytes()
+            _ROUND_TRIPS.reset(token)
+
+    def report(self):
+        stages = {name: self.stages[name].as_dict() for name in STAGES if name in self.stages}
+        stages.update((name, timer.as_dict()) for name, timer in self.stages.items() if name not in stages)
+        round_trips = dict(self.round_trips.counts)
+        round_trips['total'] = self.round_trips.total()
+        return {
+            'source': self.source,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at))
+            if self.started_at else None,
+            'seconds': round(self.seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'peak_rss_bytes': self.peak_rss,
+            'round_trips': round_trips,
+            'bytes_sent': self.round_trips.sent_bytes,
+            'counters': dict(self.counters),
+            'stages': stages,
+            'pipeline': self.pipeline,
+        }
+
+
+def _write_atomic(path, text):
+    # Write then rename so readers (e.g. the node_exporter textfile collector) never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_json_report(runs, path):
+    """Write the reports of one or more RunMetrics to path as JSON."""
+    reports = [run.report() for run in runs]
+    _write_atomic(path, json.dumps({'runs': reports}, indent=2) + '\n')
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_PROM_METRICS = [
+    ('etl_stage_seconds', 'Wall time spent in each ETL stage.', 'stage', 'seconds'),
+    ('etl_stage_cpu_seconds', 'Process CPU time spent in each ETL stage.', 'stage', 'cpu_seconds'),
+    ('etl_stage_rows', 'Rows handled by each ETL stage.', 'stage', 'rows'),
+    ('etl_stage_bytes', 'Bytes handled by each ETL stage.', 'stage', 'bytes'),
+    ('etl_run_seconds', 'Wall time of the ETL run.', None, 'seconds'),
+    ('etl_run_cpu_seconds', 'Process CPU time of the ETL run.', None, 'cpu_seconds'),
+    ('etl_run_peak_rss_bytes', 'Peak resident memory of the ETL process.', None, 'peak_rss_bytes'),
+    ('etl_run_bytes_sent', 'Bytes streamed to the database.', None, 'bytes_sent'),
+    ('etl_db_round_trips', 'Database round trips by kind.', 'kind', 'round_trips'),
+    ('etl_rows', 'Rows by outcome.', 'outcome', 'counters'),
+    ('etl_pipeline_utilization', 'Share of a pipelined run each side was busy.', 'stage', 'pipeline.utilization'),
+    ('etl_pipeline_queue_mean', 'Mean chunks waiting in the pipeline queue.', None, 'pipeline.queue_mean'),
+    ('etl_pipeline_queue_full', 'Share of pipeline hand-offs that found the queue full.', None, 'pipeline.queue_full'),
+    ('etl_pipeline_queue_empty', 'Share of pipeline hand-offs that found the queue empty.', None,
+     'pipeline.queue_empty'),
+]
+
+
+def _lookup(report, key):
+    # Dotted keys such as 'pipeline.utilization' reach into nested sections, which may be None
+    value = report
+    for part in key.split('.'):
+        value = value.get(part) if value else None
+    return value
+
+
+def write_prometheus(runs, path):
+    """Write the reports of one or more RunMetrics in Prometheus text format (textfile collector)."""
+    reports = [run.report() for run in runs]
+    lines = []
+    for metric, help_text, label, key in _PROM_METRICS:
+        samples = []
+        for report in reports:
+            source = _label(os.path.basename(report['source'] or ''))
+            value = _lookup(report, key)
+            if label == 'stage' and '.' not in key:
+                for stage, values in report['stages'].items():
+                    if values[key] is not None:
+                        samples.append((f'{{file="{source}",stage="{stage}"}}', values[key]))
+            elif label is not None:
+                for name, item in (value or {}).items():
+                    samples.append((f'{{file="{source}",{label}="{_label(name)}"}}', item))
+            elif value is not None:
+                samples.append((f'{{file="{source}"}}', value))
+        if samples:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            lines.extend(f'{metric}{labels} {value}' for labels, value in samples)
+    _write_atomic(path, '\n'.join(lines) + '\n')
@@ -0,0 +1,152 @@
+import contextvars
+import queue
+import threading
+import time
+
+# Chunks validated ahead of the loader, unless configured otherwise
+PIPELINE_QUEUE_SIZE = 4
+
+# How often a producer blocked on a full queue checks whether the consumer gave up
+_STOP_POLL = 0.1
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class ChunkPipeline:
+    """
+    Run a chunk producer (e.g. the validator) on a background thread and
+    hand its chunks to the consumer (the loader) over a bounded queue, so
+    parsing and validation overlap with database round trips. A full queue
+    blocks the producer, which keeps memory flat when loading is the
+    slower side.
+
+    Iterate the pipeline to receive the chunks. An exception raised by the
+    producer is re-raised in the consumer at the point it was produced, so
+    a loader holding an open transaction rolls it back. If the consumer
+    stops early, close() stops the producer and waits for it, closing the
+    producer generator on its own thread. stats() reports how busy each
+    side was and how full the queue ran.
+    """
+
+    def __init__(self, chunks, queue_size=PIPELINE_QUEUE_SIZE, name='etl-validate'):
+        self.queue_size = max(1, queue_size)
+        self._chunks = chunks
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._produce_seconds = 0.0
+        self._put_wait = 0.0
+        self._get_wait = 0.0
+        self._puts = 0
+        self._puts_blocked = 0
+        self._gets = 0
+        self._gets_blocked = 0
+        self._samples = 0
+        self._occupancy = 0
+        self._max_occupancy = 0
+        self._started = time.perf_counter()
+        self._finished = None
+        # The producer runs in a copy of the caller's context so run metrics still apply
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._produce,),
+                                        name=name, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        if self._queue.full():
+            self._puts_blocked += 1
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=_STOP_POLL)
+                break
+            except queue.Full:
+                continue
+        self._put_wait += time.perf_counter() - start
+
+    def _produce(self):
+        perf = time.perf_counter
+        chunks = self._chunks
+        try:
+            while not self._stop.is_set():
+                start = perf()
+                chunk = next(chunks, _DONE)
+                self._produce_seconds += perf() - start
+                if chunk is _DONE:
+                    break
+                self._puts += 1
+                self._put(chunk)
+            self._put(_DONE)
+        except BaseException as e:
+            self._put(_Failed(e))
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def __iter__(self):
+        perf = time.perf_counter
+        get = self._queue.get
+        while True:
+            occupancy = self._queue.qsize()
+            self._samples += 1
+            self._occupancy += occupancy
+            self._max_occupancy = max(self._max_occupancy, occupancy)
+            if not occupancy:
+                self._gets_blocked += 1
+            start = perf()
+            item = get()
+            self._get_wait += perf() - start
+            if item is _DONE:
+                self._finish()
+                return
+            if isinstance(item, _Failed):
+                self._finish()
+                raise item.error
+            self._gets += 1
+            yield item
+
+    def _finish(self):
+        self._thread.join()
+        if self._finished is None:
+            self._finished = time.perf_counter()
+
+    def close(self):
+        """Stop the producer (if still running) and wait for it to exit."""
+        self._stop.set()
+        # Unblock a producer waiting on a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=_STOP_POLL)
+            except queue.Empty:
+                pass
+        self._finish()
+
+    @property
+    def consumer_wait(self):
+        """Seconds the consumer spent waiting for chunks."""
+        return self._get_wait
+
+    def stats(self):
+        """Utilisation of each side and queue occupancy, as a JSON-serialisable dict."""
+        elapsed = ((self._finished or time.perf_counter()) - self._started) or 1e-9
+        return {
+            'queue_size': self.queue_size,
+            'chunks': self._gets,
+            'seconds': round(elapsed, 6),
+            'utilization': {
+                'validate': round(min(1.0, self._produce_seconds / elapsed), 4),
+                'load': round(max(0.0, 1.0 - self._get_wait / elapsed), 4),
+            },
+            # Share of the run the producer sat on a full queue
+            'validate_blocked': round(min(1.0, self._put_wait / elapsed), 4),
+            'queue_mean': round(self._occupancy / self._samples, 3) if self._samples else 0.0,
+            'queue_max': self._max_occupancy,
+            # Share of hand-offs where the producer found the queue full (load-bound)
+            # or the consumer found it empty (validate-bound)
+            'queue_full': round(self._puts_blocked / self._puts, 4) if self._puts else 0.0,
+            'queue_empty': round(self._gets_blocked / self._samples, 4) if self._samples else 0.0,
+        }
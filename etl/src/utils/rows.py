@@ -0,0 +1,62 @@
+from operator import itemgetter
+
+
+class RowBatch(list):
+    """
+    Validated rows stored compactly: a list of tuples in schema column order,
+    with the column names kept once on the batch instead of in every row.
+    Loaders write the tuples as they are; slicing keeps the column names.
+    """
+
+    __slots__ = ('columns',)
+
+    def __init__(self, columns, rows=()):
+        super().__init__(rows)
+        self.columns = tuple(columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RowBatch(self.columns, list.__getitem__(self, index))
+        return list.__getitem__(self, index)
+
+    def __reduce__(self):
+        return RowBatch, (self.columns, list(self))
+
+    def dicts(self):
+        """Yield the rows as dicts, for callers that want column names."""
+        columns = self.columns
+        for row in self:
+            yield dict(zip(columns, row))
+
+
+class SourceRow(tuple):
+    """A validated row tuple that also carries the raw CSV record it came from, as row.raw."""
+
+
+def source_row(values, raw):
+    row = SourceRow(values)
+    row.raw = raw
+    return row
+
+
+def row_columns(rows):
+    """Column names of a RowBatch, or of a list of dict rows."""
+    if isinstance(rows, RowBatch):
+        return list(rows.columns)
+    return list(rows[0].keys())
+
+
+def row_values(rows, columns):
+    """Rows as value sequences in columns order; a RowBatch is returned as is."""
+    if isinstance(rows, RowBatch):
+        return rows
+    return [[row[col] for col in columns] for row in rows]
+
+
+def key_getter(columns, fields):
+    """Return a function mapping a row tuple to the tuple of its values for fields."""
+    indexes = [list(columns).index(f) for f in fields]
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indexes)
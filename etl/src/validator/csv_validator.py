@@ -1,61 +1,393 @@
-
-import csv
-
-
-def validate_row(row, schema):
-    errors = []
-    validated = {}
-    for col, rules in schema.items():
-        col_type = rules['type']
-        required = rules['required']
-        max_length = rules.get('max_length')
-        value = row.get(col, '').strip()
-        if required and not value:
-            errors.append(f"Missing required field: {col}")
-            continue
-        if value:
-            # Length validation
-            if max_length and isinstance(value, str) and len(value) > max_length:
-                errors.append(f"Field {col} exceeds max length {max_length}")
-            # Type validation
-            try:
-                validated[col] = col_type(value)
-            except Exception:
-                errors.append(f"Invalid type for {col}: expected {col_type.__name__}")
-        else:
-            validated[col] = None
-    return validated, errors
-
-
-def validate_csv(file_path, schema=None, unique_fields=None):
-    """
-    Validate CSV rows against provided schema and unique fields.
-    If schema or unique_fields are None, load defaults from config.
-    """
-    if schema is None or unique_fields is None:
-        from src.config.schema_config import load_config
-        cfg = load_config()
-        if schema is None:
-            schema = cfg['schema']
-        if unique_fields is None:
-            unique_fields = cfg.get('unique_fields', [])
-
-    valid_rows = []
-    error_rows = []
-    seen_uniques = set()
-    with open(file_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for i, row in enumerate(reader, 2):  # start at 2 for header
-            validated, errors = validate_row(row, schema)
-            # Duplicate check
-            if not errors and unique_fields:
-                unique_key = tuple(validated.get(f) for f in unique_fields)
-                if unique_key in seen_uniques:
-                    errors.append(f"Duplicate row on fields {unique_fields}: {unique_key}")
-                else:
-                    seen_uniques.add(unique_key)
-            if errors:
-                error_rows.append((i, errors))
-            else:
-                valid_rows.append(validated)
-    return valid_rows, error_rows
+import csv
+import re
+import time
+from collections import namedtuple
+from datetime import date, datetime
+from itertools import islice
+
+from src.utils.io_utils import decoded_lines, open_input
+from src.utils.rows import RowBatch, key_getter, source_row
+
+
+ColumnPlan = namedtuple(
+    'ColumnPlan',
+    'column required max_length length_error raw_checks convert type_error value_checks cache cache_limit',
+)
+
+# Distinct raw values remembered per column. Columns marked `cardinality: low`
+# keep up to LOW_CARDINALITY_LIMIT; other non-float columns are detected
+# automatically and stop adding values once AUTO_CACHE_LIMIT is reached.
+LOW_CARDINALITY_LIMIT = 65536
+AUTO_CACHE_LIMIT = 1024
+_MISS = object()
+
+# python checks each row field by field; numpy checks batches of rows column
+# by column (see src.validator.numpy_validator) with the same results
+VALIDATION_BACKENDS = ('python', 'numpy')
+
+# Rows read, then validated, between two clock reads when a run is timed
+TIMED_BATCH_ROWS = 256
+
+
+def _pattern_check(col, pattern):
+    match = re.compile(pattern).fullmatch
+    message = f"Field {col} does not match pattern {pattern}"
+    return lambda value: None if match(value) else message
+
+
+def _min_check(col, minimum):
+    message = f"Field {col} is below minimum {minimum}"
+    return lambda value: message if value < minimum else None
+
+
+def _max_check(col, maximum):
+    message = f"Field {col} is above maximum {maximum}"
+    return lambda value: message if value > maximum else None
+
+
+def _coerce(value, convert):
+    # Bounds and enum members from YAML may still be strings (e.g. quoted dates)
+    if convert is not None and isinstance(value, str):
+        return convert(value)
+    return value
+
+
+def _enum_check(col, allowed, convert):
+    allowed_values = frozenset(_coerce(v, convert) for v in allowed)
+    message = f"Field {col} is not one of {list(allowed)}"
+    return lambda value: None if value in allowed_values else message
+
+
+def _date_converter(fmt):
+    strptime = datetime.strptime
+    return lambda value: strptime(value, fmt).date()
+
+
+def compile_schema(schema):
+    """
+    Compile schema rules into a validation plan: one ColumnPlan per column
+    holding only the checks that column actually declares.
+    Supported rules: type (int/float/str/date), required, max_length,
+    pattern, min, max, enum, format (for date columns) and cardinality.
+    Each column's valid values are cached per distinct raw value, so
+    repeated values are checked once and share one stored object. cardinality: low
+    caches a column up to LOW_CARDINALITY_LIMIT values, high disables the
+    cache, and by default it covers the first AUTO_CACHE_LIMIT values of
+    non-float columns.
+    """
+    if not isinstance(schema, dict):
+        return schema  # already compiled
+    plan = []
+    for col, rules in schema.items():
+        col_type = rules.get('type', str)
+        if col_type is date:
+            convert = _date_converter(rules.get('format') or '%Y-%m-%d')
+        elif col_type is str:
+            convert = None
+        else:
+            convert = col_type
+        max_length = rules.get('max_length') or None
+        raw_checks = []
+        if rules.get('pattern'):
+            raw_checks.append(_pattern_check(col, rules['pattern']))
+        value_checks = []
+        if rules.get('min') is not None:
+            value_checks.append(_min_check(col, _coerce(rules['min'], convert)))
+        if rules.get('max') is not None:
+            value_checks.append(_max_check(col, _coerce(rules['max'], convert)))
+        if rules.get('enum'):
+            value_checks.append(_enum_check(col, rules['enum'], convert))
+        cardinality = rules.get('cardinality')
+        if cardinality == 'low':
+            cache_limit = LOW_CARDINALITY_LIMIT
+        elif cardinality == 'high' or (cardinality is None and col_type is float):
+            cache_limit = 0
+        elif cardinality is None:
+            cache_limit = AUTO_CACHE_LIMIT
+        else:
+            raise ValueError(f"Invalid cardinality for {col}: {cardinality!r}, expected low or high")
+        plan.append(ColumnPlan(
+            col,
+            bool(rules.get('required')),
+            max_length,
+            f"Field {col} exceeds max length {max_length}",
+            tuple(raw_checks) or None,
+            convert,
+            f"Invalid type for {col}: expected {col_type.__name__}",
+            tuple(value_checks) or None,
+            {} if cache_limit else None,
+            cache_limit,
+        ))
+    return plan
+
+
+def plan_columns(schema):
+    """Column names of a schema or plan, in the order validated rows hold them."""
+    return tuple(column_plan.column for column_plan in compile_schema(schema))
+
+
+def validate_values(row, schema):
+    """
+    Validate a raw CSV row (dict of strings) and return (values, errors),
+    where values is a tuple of typed values in plan column order. Empty
+    and invalid fields are None.
+    """
+    plan = compile_schema(schema)
+    errors = []
+    values = []
+    append = values.append
+    get = row.get
+    for (col, required, max_length, length_error, raw_checks, convert, type_error, value_checks,
+         cache, cache_limit) in plan:
+        value = get(col)
+        if cache is not None:
+            hit = cache.get(value, _MISS)
+            if hit is not _MISS:
+                append(hit)
+                continue
+            raw = value
+            first_error = len(errors)
+        if value:
+            value = value.strip()
+        if not value:
+            if required:
+                errors.append(f"Missing required field: {col}")
+            value = None
+        else:
+            if max_length and len(value) > max_length:
+                errors.append(length_error)
+            if raw_checks:
+                for check in raw_checks:
+                    error = check(value)
+                    if error:
+                        errors.append(error)
+            if convert is not None:
+                try:
+                    value = convert(value)
+                except (TypeError, ValueError):
+                    errors.append(type_error)
+                    value = None
+            if value_checks and value is not None:
+                for check in value_checks:
+                    error = check(value)
+                    if error:
+                        errors.append(error)
+        append(value)
+        if cache is not None and len(errors) == first_error and len(cache) < cache_limit:
+            # Later rows with the same raw value reuse this value object unchecked
+            cache[raw] = value
+    return tuple(values), errors
+
+
+def validate_row(row, schema):
+    """Like validate_values, but return the validated row as a dict keyed by column."""
+    plan = compile_schema(schema)
+    values, errors = validate_values(row, plan)
+    return dict(zip(plan_columns(plan), values)), errors
+
+
+def _resolve_defaults(schema, unique_fields):
+    if schema is None or unique_fields is None:
+        from src.config.schema_config import load_config
+        cfg = load_config()
+        if schema is None:
+            schema = cfg['schema']
+        if unique_fields is None:
+            unique_fields = cfg.get('unique_fields', [])
+    return schema, unique_fields
+
+
+def _tracked_lines(binfile, progress):
+    # Feed csv a line at a time while recording the byte offset consumed
+    offset = 0
+    for line in binfile:
+        offset += len(line)
+        progress['offset'] = offset
+        yield line.decode('utf-8')
+
+
+def _timed_results(reader, plan, metrics, progress=None, batch_rows=TIMED_BATCH_ROWS):
+    # Split time between reading (parse) and checking (validate), a batch of rows at a time
+    parse = metrics.timer('parse')
+    check = metrics.timer('validate')
+    perf = time.perf_counter
+    rows = enumerate(reader, 2)  # start at 2 for header
+    if progress is not None:
+        # Reading a batch runs the byte offset ahead; each row's own is restored as it is yielded
+        rows = ((i, row, progress['offset']) for i, row in rows)
+    while True:
+        start = perf()
+        batch = list(islice(rows, batch_rows))
+        if not batch:
+            return
+        read = perf()
+        results = [(item, *validate_values(item[1], plan)) for item in batch]
+        parse.seconds += read - start
+        check.seconds += perf() - read
+        parse.rows += len(batch)
+        check.rows += len(batch)
+        for item, validated, errors in results:
+            if progress is not None:
+                progress['offset'] = item[2]
+            yield item[0], item[1], validated, errors
+
+
+def split_valid_errors(results, columns, unique_fields, chunk_size=None, sink=None, key_store=None, progress=None,
+                       metrics=None, is_loaded=None, thresholds=None, keep_raw=False):
+    """
+    Apply the duplicate check to (row_num, raw_row, values, errors) results
+    in file order and yield (valid_rows, error_rows) chunks. values are
+    tuples in columns order, and valid_rows is a RowBatch of them. The first
+    occurrence of a unique key wins; rows that already failed validation are
+    not counted. If a sink is given, each raw row is also routed to its
+    valid or error output as it is seen. key_store defaults to an in-memory
+    set (see src.validator.key_store for compact and disk-spilling stores).
+    If a progress dict is given, progress['row'] holds the number of the
+    last row read whenever a chunk is yielded. A RunMetrics (see
+    src.utils.metrics) given as metrics times the duplicate check and the
+    sink writes. is_loaded(key), if given, rejects keys loaded by earlier
+    runs (see src.validator.key_index). thresholds (an AbortThresholds, see
+    src.validator.thresholds) raises ValidationAborted once the file's
+    invalid rows exceed it, ending the pass early. With keep_raw each valid
+    row is a SourceRow carrying its raw record (results must include it).
+    """
+    if key_store is None:
+        from src.validator.key_store import ExactKeyStore
+        key_store = ExactKeyStore()
+    add_key = key_store.add
+    write_valid = sink.write_valid if sink is not None else None
+    write_error = sink.write_error if sink is not None else None
+    if metrics is not None:
+        add_key = metrics.timed('dedupe', add_key)
+        if is_loaded is not None:
+            is_loaded = metrics.timed('dedupe', is_loaded)
+        if sink is not None:
+            write_valid = metrics.timed('split', write_valid)
+            write_error = metrics.timed('write_errors', write_error)
+    unique_key_of = key_getter(columns, unique_fields) if unique_fields else None
+    record = thresholds.record if thresholds is not None else None
+    valid_rows = RowBatch(columns)
+    error_rows = []
+    for i, raw_row, validated, errors in results:
+        # Duplicate check
+        if not errors and unique_key_of is not None:
+            unique_key = unique_key_of(validated)
+            if not add_key(unique_key):
+                errors.append(f"Duplicate row on fields {unique_fields}: {unique_key}")
+            elif is_loaded is not None and is_loaded(unique_key):
+                errors.append(f"Row already loaded on fields {unique_fields}: {unique_key}")
+        if record is not None:
+            record(i, errors)
+        if errors:
+            error_rows.append((i, errors))
+            if write_error is not None:
+                write_error(raw_row, errors)
+        else:
+            valid_rows.append(source_row(validated, raw_row) if keep_raw else validated)
+            if write_valid is not None:
+                write_valid(raw_row)
+            if chunk_size and len(valid_rows) >= chunk_size:
+                if progress is not None:
+                    progress['row'] = i
+                yield valid_rows, error_rows
+                valid_rows = RowBatch(columns)
+                error_rows = []
+    if thresholds is not None:
+        thresholds.finish()
+    if valid_rows or error_rows:
+        if progress is not None:
+            progress['row'] = i
+        yield valid_rows, error_rows
+
+
+def check_backend(backend):
+    """Return backend (default python) if it is a known validation backend, else raise ValueError."""
+    backend = backend or 'python'
+    if backend not in VALIDATION_BACKENDS:
+        raise ValueError(f"Unknown validation backend {backend!r}, expected one of: {', '.join(VALIDATION_BACKENDS)}")
+    return backend
+
+
+def validate_csv_chunks(file_path, schema=None, unique_fields=None, chunk_size=10000, workers=1, sink=None,
+                        key_store=None, progress=None, metrics=None, is_loaded=None, thresholds=None,
+                        backend=None, batch_rows=None, keep_raw=False):
+    """
+    Stream validated CSV rows in chunks of at most chunk_size valid rows.
+    Yields (valid_rows, error_rows) tuples so callers can load each chunk
+    as it is produced; only the duplicate-key set grows with the file.
+    With workers > 1 the file is validated by a process pool.
+    An optional sink (see src.utils.csv_utils.CsvSplitWriter) receives
+    every raw record during the same pass, and key_store replaces the
+    default in-memory duplicate set. A progress dict receives the last row
+    number and, on the serial path, the byte offset after it at each chunk.
+    Compressed files (gzip, bz2, xz, zstd) are read directly; offsets then
+    count decompressed bytes.
+    metrics (a RunMetrics) receives per-stage timings: parse and validate
+    per batch of rows on the serial path, validate (workers) on the
+    parallel one.
+    is_loaded(key) flags keys that earlier runs already loaded, and
+    thresholds (an AbortThresholds) stops the pass once errors exceed it.
+    backend numpy checks batches of batch_rows rows with NumPy instead of
+    row by row; the chunks are the same. keep_raw has each valid row
+    carry its raw record (see split_valid_errors).
+    """
+    schema, unique_fields = _resolve_defaults(schema, unique_fields)
+    backend = check_backend(backend)
+    if workers and workers > 1:
+        from src.validator.parallel_validator import validate_csv_parallel_chunks
+        yield from validate_csv_parallel_chunks(
+            file_path, schema, unique_fields, chunk_size, workers, sink=sink, key_store=key_store, progress=progress,
+            metrics=metrics, is_loaded=is_loaded, thresholds=thresholds, backend=backend, batch_rows=batch_rows,
+            keep_raw=keep_raw,
+        )
+        return
+    plan = compile_schema(schema)
+
+    csvfile = open_input(file_path)
+    if progress is not None:
+        lines = _tracked_lines(csvfile, progress)
+    else:
+        lines = decoded_lines(csvfile)
+    with csvfile:
+        if backend == 'numpy':
+            from src.validator.numpy_validator import numpy_results
+            fieldnames, results = numpy_results(lines, plan, batch_rows, progress, metrics,
+                                                 keep_raw=sink is not None or keep_raw)
+            if sink is not None:
+                sink.start(fieldnames or [])
+            yield from split_valid_errors(results, plan_columns(plan), unique_fields, chunk_size, sink, key_store,
+                                          progress, metrics, is_loaded, thresholds, keep_raw)
+            return
+        reader = csv.DictReader(lines)
+        if sink is not None:
+            sink.start(reader.fieldnames or [])
+        if metrics is not None:
+            results = _timed_results(reader, plan, metrics, progress)
+        else:
+            results = (
+                (i, row, *validate_values(row, plan))
+                for i, row in enumerate(reader, 2)  # start at 2 for header
+            )
+        yield from split_valid_errors(results, plan_columns(plan), unique_fields, chunk_size, sink, key_store,
+                                      progress, metrics, is_loaded, thresholds, keep_raw)
+
+
+def validate_csv(file_path, schema=None, unique_fields=None, workers=1, sink=None, key_store=None, metrics=None,
+                 is_loaded=None, thresholds=None, backend=None, batch_rows=None, keep_raw=False):
+    """
+    Validate CSV rows against provided schema and unique fields.
+    If schema or unique_fields are None, load defaults from config.
+    Returns (valid_rows, error_rows); valid_rows is a RowBatch of tuples.
+    """
+    schema, unique_fields = _resolve_defaults(schema, unique_fields)
+    valid_rows = RowBatch(plan_columns(schema))
+    error_rows = []
+    chunks = validate_csv_chunks(
+        file_path, schema, unique_fields, chunk_size=None, workers=workers, sink=sink, key_store=key_store,
+        metrics=metrics, is_loaded=is_loaded, thresholds=thresholds, backend=backend, batch_rows=batch_rows,
+        keep_raw=keep_raw,
+    )
+    for valid_chunk, error_chunk in chunks:
+        valid_rows.extend(valid_chunk)
+        error_rows.extend(error_chunk)
+    return valid_rows, error_rows
@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from src.validator.key_store import DigestKeyStore, key_digest
+
+DEFAULT_INDEX_PATH = '.etl_key_index.sqlite'
+
+# Rows fetched per round trip when rebuilding the index from the table
+REBUILD_FETCH_SIZE = 50000
+
+_U64 = (1 << 64) - 1
+
+
+def _signed(digest):
+    # SQLite integers are signed 64-bit
+    return digest - (1 << 64) if digest >= 1 << 63 else digest
+
+
+class KeyIndex:
+    """
+    Persistent index of unique keys already loaded into the table, kept in
+    an SQLite file so duplicates are caught across files and runs.
+
+    On open, the 64-bit digest of every indexed key is read into a
+    DigestKeyStore, so checking a new key costs one in-memory probe. Only a
+    digest hit (a real duplicate or a rare collision) is confirmed against
+    the exact key on disk. Keys are added with the source file that loaded
+    them, after that file's rows are committed. Safe to share between threads.
+    """
+
+    def __init__(self, path, unique_fields, table=None):
+        self.path = path
+        self.unique_fields = list(unique_fields)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS keys '
+                         '(k TEXT PRIMARY KEY, digest INTEGER NOT NULL, source TEXT, loaded_at REAL) WITHOUT ROWID')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._check_meta(table)
+        count = self._db.execute('SELECT count(*) FROM keys').fetchone()[0]
+        self._digests = DigestKeyStore(capacity=max(count, 1 << 16))
+        for (digest,) in self._db.execute('SELECT digest FROM keys'):
+            self._digests.add_digest(digest & _U64)
+
+    def _check_meta(self, table):
+        meta = dict(self._db.execute('SELECT name, value FROM meta'))
+        fields = json.dumps(self.unique_fields)
+        if 'unique_fields' in meta and meta['unique_fields'] != fields:
+            self._db.close()
+            raise ValueError(f"Key index {self.path} was built for unique fields {meta['unique_fields']}, "
+                             f"not {fields}; rebuild it with --rebuild-key-index")
+        self._db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                             [('unique_fields', fields)] + ([('table', table)] if table else []))
+        self._db.commit()
+
+    def contains(self, key, ignore_source=None):
+        """True if key was loaded before, other than by ignore_source."""
+        digest = key_digest(key)
+        with self._lock:
+            if not self._digests.contains_digest(digest):
+                return False
+            row = self._db.execute('SELECT source FROM keys WHERE k = ?', (repr(key),)).fetchone()
+        if row is None:
+            return False  # digest collision
+        return ignore_source is None or row[0] != ignore_source
+
+    def add(self, keys, source=None):
+        """Record keys as loaded by source; call after the rows are committed."""
+        now = time.time()
+        rows = [(repr(key), _signed(key_digest(key)), source, now) for key in keys]
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?)', rows)
+            self._db.commit()
+            for _, digest, _, _ in rows:
+                self._digests.add_digest(digest & _U64)
+        return len(rows)
+
+    def clear(self):
+        """Forget every key, e.g. after the table was reloaded."""
+        with self._lock:
+            self._db.execute('DELETE FROM keys')
+            self._db.commit()
+            self._digests.close()
+            self._digests = DigestKeyStore(capacity=1 << 16)
+
+    def __len__(self):
+        return len(self._digests)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+            self._digests.close()
+
+
+def _normalize(value, col_type):
+    # Match the types the validator produces, so repr() keys agree
+    if value is None or col_type is None or isinstance(value, col_type):
+        return value
+    if col_type is date:
+        return value if isinstance(value, date) else date.fromisoformat(str(value))
+    return col_type(value)
+
+
+def rebuild_key_index(path, db_config, table, unique_fields, schema=None):
+    """
+    Rebuild the key index at path from the keys already in table, with one
+    streamed scan over a server-side cursor. The new index is written next
+    to path and swapped in when complete. Returns the number of keys.
+    """
+    from src.utils.db_utils import get_connection
+    types = [(schema or {}).get(f, {}).get('type') for f in unique_fields]
+    tmp_path = f'{path}.rebuild'
+    for stale in (tmp_path, f'{tmp_path}-wal', f'{tmp_path}-shm'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    index = KeyIndex(tmp_path, unique_fields, table)
+    conn = get_connection(db_config)
+    count = 0
+    try:
+        with conn.cursor(name='etl_key_index_rebuild') as cur:
+            cur.itersize = REBUILD_FETCH_SIZE
+            cur.execute(f"SELECT {', '.join(unique_fields)} FROM {table}")
+            while True:
+                rows = cur.fetchmany(REBUILD_FETCH_SIZE)
+                if not rows:
+                    break
+                count += index.add(
+                    (tuple(_normalize(v, t) for v, t in zip(row, types)) for row in rows), source=table)
+        conn.rollback()
+    finally:
+        conn.close()
+        index.close()
+    # A WAL left by the old index must not be replayed onto the new file
+    for stale in (f'{path}-wal', f'{path}-shm'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    os.replace(tmp_path, path)
+    return count
+
+
+def open_key_index(config):
+    """Open the key index described by the `key_index` config section, or None if disabled."""
+    cfg = config.get('key_index') or {}
+    if not cfg.get('enabled') or not config.get('unique_fields'):
+        return None
+    return KeyIndex(cfg.get('path') or DEFAULT_INDEX_PATH, config['unique_fields'],
+                    config.get('table_name') or config.get('table'))
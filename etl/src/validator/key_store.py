@@ -0,0 +1,273 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+from array import array
+
+# Bytes SpillingKeyStore holds in memory: its digest screen and key buffer
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# Bit positions set per key in DigestBloomFilter
+BLOOM_HASHES = 4
+
+
+def key_digest(key):
+    """Stable 64-bit digest of a unique key tuple (hash() is salted per process)."""
+    digest = int.from_bytes(hashlib.blake2b(repr(key).encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest or 1  # 0 marks an empty slot
+
+
+def _key_size(key):
+    return sys.getsizeof(key) + sum(sys.getsizeof(v) for v in key)
+
+
+class ExactKeyStore:
+    """Every unique key tuple in a Python set. Exact, fastest, largest."""
+
+    name = 'exact'
+
+    def __init__(self):
+        self._keys = set()
+
+    def add(self, key):
+        """Record key and return True if it had not been seen before."""
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def __len__(self):
+        return len(self._keys)
+
+    def memory_bytes(self):
+        return sys.getsizeof(self._keys) + sum(_key_size(k) for k in self._keys)
+
+    def close(self):
+        self._keys = set()
+
+
+class DigestKeyStore:
+    """
+    64-bit key digests in an open-addressing table backed by array('Q'),
+    about 16 bytes per key regardless of key width. Two different keys with
+    the same digest would be reported as a duplicate; at 100M keys the
+    chance of any such collision is roughly 3 in 10,000.
+    """
+
+    name = 'digest'
+
+    def __init__(self, capacity=1 << 16):
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self._slots = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def add_digest(self, digest):
+        slots = self._slots
+        mask = self._mask
+        i = digest & mask
+        while True:
+            slot = slots[i]
+            if slot == 0:
+                break
+            if slot == digest:
+                return False
+            i = (i + 1) & mask
+        slots[i] = digest
+        self._count += 1
+        if self._count * 10 > len(slots) * 6:
+            self._grow()
+        return True
+
+    def contains_digest(self, digest):
+        slots = self._slots
+        mask = self._mask
+        i = digest & mask
+        while True:
+            slot = slots[i]
+            if slot == 0:
+                return False
+            if slot == digest:
+                return True
+            i = (i + 1) & mask
+
+    def add(self, key):
+        return self.add_digest(key_digest(key))
+
+    def digests(self):
+        """The stored digests, in table order."""
+        return (digest for digest in self._slots if digest)
+
+    def _grow(self):
+        old = self.digests()
+        self._slots = array('Q', bytes(8 * len(self._slots) * 2))
+        self._mask = len(self._slots) - 1
+        self._count = 0
+        for digest in old:
+            self.add_digest(digest)
+
+    def __len__(self):
+        return self._count
+
+    def memory_bytes(self):
+        return sys.getsizeof(self._slots)
+
+    def close(self):
+        self._slots = array('Q', bytes(8))
+        self._mask = 0
+        self._count = 0
+
+
+class DigestBloomFilter:
+    """
+    Fixed-size Bloom filter over 64-bit key digests. add_digest() returns
+    True only for digests it has certainly not seen; a False may be a false
+    positive, which grows likelier as keys outnumber the size_bytes * 8 bits.
+    """
+
+    def __init__(self, size_bytes, hashes=BLOOM_HASHES):
+        nbits = 8
+        while nbits * 2 <= size_bytes * 8:
+            nbits <<= 1
+        self._bits = bytearray(nbits // 8)
+        self._mask = nbits - 1
+        self.hashes = hashes
+        self._count = 0
+
+    def add_digest(self, digest):
+        bits = self._bits
+        mask = self._mask
+        step = (digest >> 32) | 1
+        pos = digest
+        new = False
+        for _ in range(self.hashes):
+            bit = pos & mask
+            byte = bits[bit >> 3]
+            flag = 1 << (bit & 7)
+            if not byte & flag:
+                bits[bit >> 3] = byte | flag
+                new = True
+            pos += step
+        if new:
+            self._count += 1
+        return new
+
+    def add(self, key):
+        return self.add_digest(key_digest(key))
+
+    def __len__(self):
+        return self._count
+
+    def memory_bytes(self):
+        return sys.getsizeof(self._bits)
+
+    def close(self):
+        self._bits = bytearray(1)
+        self._mask = 7
+        self._count = 0
+
+
+class SpillingKeyStore:
+    """
+    Exact store for key sets larger than memory. A digest screen checks
+    every key; only keys it may have seen are confirmed against the exact
+    keys, which are buffered in memory and spilled to an indexed SQLite file
+    in spill_dir. memory_budget bytes covers both: the screen is a
+    DigestKeyStore until it would outgrow half the budget, then a
+    DigestBloomFilter of that half (false positives only cost an exact
+    lookup), and the buffer spills once it fills the rest.
+    """
+
+    name = 'spill'
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None):
+        self.memory_budget = memory_budget
+        self._screen_budget = memory_budget // 2
+        slots = 1
+        while slots * 16 <= self._screen_budget:
+            slots <<= 1
+        # Digests the table holds before growing past the screen budget
+        self._screen_limit = slots * 6 // 10
+        self._digests = DigestKeyStore()
+        self._buffer = set()
+        self._buffer_bytes = 0
+        self._spilled = 0
+        fd, self.spill_path = tempfile.mkstemp(prefix='etl_keys_', suffix='.sqlite', dir=spill_dir)
+        os.close(fd)
+        self._db = sqlite3.connect(self.spill_path)
+        self._db.execute('PRAGMA journal_mode=OFF')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute('CREATE TABLE keys (k TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def add(self, key):
+        if self._digests.add(key):
+            if len(self._digests) >= self._screen_limit and isinstance(self._digests, DigestKeyStore):
+                self._to_bloom_filter()
+            self._remember(key)
+            return True
+        # Digest maybe seen before: a real duplicate, a digest collision or a
+        # false positive of the filter
+        if key in self._buffer:
+            return False
+        if self._spilled and self._db.execute('SELECT 1 FROM keys WHERE k = ?', (repr(key),)).fetchone():
+            return False
+        self._remember(key)
+        return True
+
+    def _to_bloom_filter(self):
+        table = self._digests
+        screen = DigestBloomFilter(self._screen_budget)
+        for digest in table.digests():
+            screen.add_digest(digest)
+        table.close()
+        self._digests = screen
+
+    def _remember(self, key):
+        self._buffer.add(key)
+        self._buffer_bytes += _key_size(key)
+        if self._buffer_bytes > self.memory_budget - self._screen_budget:
+            self._spill()
+
+    def _spill(self):
+        self._db.executemany('INSERT OR IGNORE INTO keys VALUES (?)', ((repr(k),) for k in self._buffer))
+        self._db.commit()
+        self._spilled += len(self._buffer)
+        self._buffer = set()
+        self._buffer_bytes = 0
+
+    def __len__(self):
+        return self._spilled + len(self._buffer)
+
+    def memory_bytes(self):
+        return self._digests.memory_bytes() + sys.getsizeof(self._buffer) + self._buffer_bytes
+
+    def close(self):
+        self._db.close()
+        self._buffer = set()
+        self._digests.close()
+        if os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+KEY_STORES = {
+    'exact': ExactKeyStore,
+    'digest': DigestKeyStore,
+    'spill': SpillingKeyStore,
+}
+
+
+def make_key_store(dedupe_config=None):
+    """Build the duplicate-key store described by the `dedupe` config section."""
+    cfg = dedupe_config or {}
+    store = cfg.get('store') or 'exact'
+    if store not in KEY_STORES:
+        raise ValueError(f"Unknown dedupe store '{store}', expected one of: {', '.join(KEY_STORES)}")
+    if store == 'spill':
+        budget_mb = cfg.get('memory_budget_mb')
+        return SpillingKeyStore(
+            memory_budget=budget_mb * 1024 * 1024 if budget_mb else DEFAULT_MEMORY_BUDGET,
+            spill_dir=cfg.get('spill_dir'),
+        )
+    return KEY_STORES[store]()
@@ -0,0 +1,288 @@
+import csv
+import time
+from itertools import compress, islice
+
+from src.validator.csv_validator import validate_values
+
+# Records validated together, unless configured otherwise
+BATCH_ROWS = 4096
+# Number literals longer than this are checked cell by cell: the DFA below
+# takes one vectorised step per character of a batch's longest literal
+MAX_VECTOR_WIDTH = 64
+
+# ASCII code points str.strip() removes
+_SPACES = [c for c in range(128) if chr(c).isspace()]
+
+# Number grammar as a DFA over character classes, so only literals int() and
+# float() are known to accept take the vectorised path; any other value
+# (underscores, inf/nan, non-ASCII digits, errors) is checked cell by cell.
+# The end of a value (class end) moves each state to its finished copy
+# (state + _FINISHED), which nothing leaves.
+_DIGIT, _SIGN, _DOT, _EXP, _OTHER, _END = range(6)
+_DEAD = 9
+_FINISHED = 10
+# Non-ASCII code points all share one class
+_NON_ASCII = 128
+# state -> next state per class, for: digit, sign, dot, e/E, other
+_FLOAT_STATES = [
+    (2, 1, 4, _DEAD, _DEAD),          # 0 start
+    (2, _DEAD, 4, _DEAD, _DEAD),      # 1 sign
+    (2, _DEAD, 3, 6, _DEAD),          # 2 integer digits
+    (5, _DEAD, _DEAD, 6, _DEAD),      # 3 point after digits
+    (5, _DEAD, _DEAD, _DEAD, _DEAD),  # 4 point without digits
+    (5, _DEAD, _DEAD, 6, _DEAD),      # 5 fraction digits
+    (8, 7, _DEAD, _DEAD, _DEAD),      # 6 exponent mark
+    (8, _DEAD, _DEAD, _DEAD, _DEAD),  # 7 exponent sign
+    (8, _DEAD, _DEAD, _DEAD, _DEAD),  # 8 exponent digits
+    (_DEAD,) * 5,                     # 9 dead
+]
+_FLOAT_ACCEPT = (2, 3, 5, 8)
+_INT_STATES = [
+    (2, 1, _DEAD, _DEAD, _DEAD),
+    (2, _DEAD, _DEAD, _DEAD, _DEAD),
+    (2, _DEAD, _DEAD, _DEAD, _DEAD),
+] + [(_DEAD,) * 5] * 7
+_INT_ACCEPT = (2,)
+# Digits that always fit an int64
+_MAX_DIGITS = 18
+
+_np = None
+_tables = None
+
+
+def _numpy():
+    global _np, _tables
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('validation.backend numpy needs the numpy package (pip install numpy)') from None
+        classes = numpy.full(_NON_ASCII + 1, _OTHER, dtype=numpy.uint8)
+        classes[ord('0'):ord('9') + 1] = _DIGIT
+        classes[[ord('+'), ord('-')]] = _SIGN
+        classes[ord('.')] = _DOT
+        classes[[ord('e'), ord('E')]] = _EXP
+        spaces = numpy.zeros(_NON_ASCII + 1, dtype=bool)
+        spaces[_SPACES] = True
+        _tables = {'classes': classes, 'spaces': spaces}
+        for col_type, states, accept in ((float, _FLOAT_STATES, _FLOAT_ACCEPT), (int, _INT_STATES, _INT_ACCEPT)):
+            # Flat, indexed by state << 3 | class
+            transitions = numpy.zeros((2 * _FINISHED, 8), dtype=numpy.uint8)
+            transitions[:_FINISHED, :_END] = states
+            transitions[:_FINISHED, _END] = numpy.arange(_FINISHED) + _FINISHED
+            transitions[_FINISHED:] = numpy.arange(_FINISHED, 2 * _FINISHED)[:, None]
+            accepting = numpy.zeros(2 * _FINISHED, dtype=bool)
+            accepting[[state + _FINISHED for state in accept]] = True
+            _tables[col_type] = (transitions.ravel(), accepting)
+        _np = numpy
+    return _np
+
+
+def _cell_checker(column_plan):
+    # The row-at-a-time checks for one column, without its value cache
+    single = (column_plan._replace(cache=None, cache_limit=0),)
+    col = column_plan.column
+
+    def check(value):
+        values, errors = validate_values({col: value}, single)
+        return values[0], errors
+    return check
+
+
+def _vector_capable(column_plan):
+    return not column_plan.raw_checks and not column_plan.value_checks and column_plan.convert in (None, int, float)
+
+
+def _code_points(np, cells):
+    """
+    (flat, starts, lens) of a column batch: the code points of its values
+    joined by NULs, and where each value starts in them and how long it is.
+    """
+    n = len(cells)
+    flat = np.frombuffer('\0'.join(cells).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    ends = np.flatnonzero(flat == 0)
+    if len(ends) == n - 1:
+        starts = np.concatenate(([0], ends + 1))
+        lens = np.append(ends, len(flat)) - starts
+    else:
+        # A value holds a NUL itself: measure each one
+        lens = np.fromiter(map(len, cells), dtype=np.intp, count=n)
+        starts = np.cumsum(lens + 1) - (lens + 1)
+    return flat, starts, lens
+
+
+def _parse_numbers(np, flat, starts, lens, cells, col_type):
+    """
+    Parse the plain int or float literals of a column batch, given its
+    _code_points. Returns (ok, values): ok marks the cells int()/float()
+    reads as the number in values, a list aligned with cells (None where
+    not ok). A DFA walks all cells one character position at a time; the
+    literals it accepts are then converted in bulk.
+    """
+    transitions, accepting = _tables[col_type]
+    width = int(lens[lens <= MAX_VECTOR_WIDTH].max(initial=0)) + 1
+    classes = np.concatenate((_tables['classes'][np.minimum(flat, _NON_ASCII)], np.full(width, _END, dtype=np.uint8)))
+    ends = starts + lens
+    classes[ends] = _END  # a NUL inside a value stays _OTHER
+    state = np.zeros(len(cells), dtype=np.uint8)
+    index = starts.copy()
+    # Longer values never reach their end here, so stay unfinished
+    for _ in range(width):
+        state = transitions[(state << 3) | classes[index]]
+        index += 1
+    ok = accepting[state]
+    if col_type is int:
+        # An accepted int is its digits, after an optional sign
+        ok &= lens - (classes[starts] == _SIGN) <= _MAX_DIGITS
+    accepted = list(compress(cells, ok.tolist()))
+    values = np.empty(len(cells), dtype=object)
+    if accepted:
+        if col_type is int:
+            values[ok] = np.fromstring(','.join(accepted), dtype=np.int64, sep=',')
+        else:
+            # float() itself: numpy's text parser is slower and must give the same values
+            values[ok] = list(map(float, accepted))
+    return ok, values.tolist()
+
+
+def _check_column(np, column_plan, cells, errors):
+    """
+    Validate one column of a batch; returns its values and appends each
+    cell's error messages to errors[i]. Cells the vectorised checks cannot
+    decide exactly (space-padded values, number literals outside the plain
+    grammar) go through validate_values.
+    """
+    check_cell = _cell_checker(column_plan)
+    if not cells or not _vector_capable(column_plan):
+        values = []
+        for i, cell in enumerate(cells):
+            value, cell_errors = check_cell(cell)
+            values.append(value)
+            if cell_errors:
+                errors[i].extend(cell_errors)
+        return values
+
+    flat, starts, lens = _code_points(np, cells)
+    filled = lens > 0
+    convert = column_plan.convert
+    if convert is None:
+        # Values strip() would change; non-ASCII ends may be Unicode spaces
+        spaces = _tables['spaces']
+        ends = np.minimum(flat[np.concatenate((starts, starts + lens - 1))[np.tile(filled, 2)]], _NON_ASCII)
+        padded = spaces[ends] | (ends == _NON_ASCII)
+        fast = ~filled
+        fast[filled] = ~(padded[:padded.size // 2] | padded[padded.size // 2:])
+        values = list(cells)  # the strings themselves
+    else:
+        # Spaces and non-ASCII characters fail the number grammar
+        parsed, values = _parse_numbers(np, flat, starts, lens, cells, convert)
+        fast = ~filled | parsed
+    for i in np.flatnonzero(~filled).tolist():
+        values[i] = None
+
+    if column_plan.required:
+        message = f'Missing required field: {column_plan.column}'
+        for i in np.flatnonzero(~filled).tolist():
+            errors[i].append(message)
+    if column_plan.max_length:
+        message = column_plan.length_error
+        for i in np.flatnonzero(fast & (lens > column_plan.max_length)).tolist():
+            errors[i].append(message)
+    for i in np.flatnonzero(~fast).tolist():
+        values[i], cell_errors = check_cell(cells[i])
+        if cell_errors:
+            errors[i].extend(cell_errors)
+    return values
+
+
+def validate_records(records, fieldnames, plan, keep_raw=True):
+    """
+    Validate a batch of csv.reader records (header excluded, blank records
+    dropped) column by column with NumPy. Returns (raw_rows, values, errors)
+    lists aligned with records: raw_rows holds the dicts csv.DictReader
+    would build (None unless keep_raw), values the typed value tuples in
+    plan column order and errors each record's messages, exactly as
+    validate_values produces them row by row.
+    """
+    np = _numpy()
+    n = len(records)
+    width = len(fieldnames)
+    if n and min(map(len, records)) < width:
+        # Short records: DictReader fills the missing fields with None
+        padded = [record + [''] * (width - len(record)) if len(record) < width else record for record in records]
+    else:
+        padded = records
+    columns = list(zip(*padded)) if width else []
+    # Like DictReader's dicts, a repeated header name takes its last column
+    positions = {name: i for i, name in enumerate(fieldnames)}
+    errors = [[] for _ in range(n)]
+    empty = ('',) * n
+    value_columns = []
+    for column_plan in plan:
+        pos = positions.get(column_plan.column)
+        value_columns.append(_check_column(np, column_plan, columns[pos] if pos is not None else empty, errors))
+    values = list(zip(*value_columns)) if value_columns else [()] * n
+    raw_rows = [None] * n
+    if keep_raw:
+        for i, record in enumerate(records):
+            row = dict(zip(fieldnames, record))
+            if len(record) > width:
+                row[None] = record[width:]
+            elif len(record) < width:
+                for name in fieldnames[len(record):]:
+                    row[name] = None
+            raw_rows[i] = row
+    return raw_rows, values, errors
+
+
+def numpy_results(lines, plan, batch_rows=None, progress=None, metrics=None, keep_raw=True):
+    """
+    Read CSV lines in batches of batch_rows records and validate each batch
+    with validate_records. Returns (fieldnames, results), results yielding
+    the (row_num, raw_row, values, errors) tuples split_valid_errors takes,
+    with the row numbers csv.DictReader would give. If a progress dict is
+    given (fed offsets by the line reader), progress['offset'] is set back
+    to each row's end before the row is yielded. metrics (a RunMetrics)
+    times batch reading as parse and batch checks as validate. Without
+    keep_raw the raw rows are None.
+    """
+    reader = csv.reader(lines)
+    fieldnames = next(reader, None)
+    batch_rows = batch_rows or BATCH_ROWS
+
+    def results():
+        if fieldnames is None:
+            return
+        row_num = 2  # start at 2 for header
+        perf = time.perf_counter
+        while True:
+            start = perf()
+            batch = list(islice(reader, batch_rows)) if progress is None else []
+            if progress is not None:
+                offsets = []
+                for record in islice(reader, batch_rows):
+                    batch.append(record)
+                    offsets.append(progress.get('offset'))
+            if not batch:
+                return
+            # DictReader skips blank records without numbering them
+            if all(batch):
+                records = batch
+            else:
+                keep = [k for k, record in enumerate(batch) if record]
+                records = [batch[k] for k in keep]
+                if progress is not None:
+                    offsets = [offsets[k] for k in keep]
+                if not records:
+                    continue
+            read = perf()
+            raw_rows, values, errors = validate_records(records, fieldnames, plan, keep_raw)
+            if metrics is not None:
+                metrics.add('parse', read - start, rows=len(records))
+                metrics.add('validate', perf() - read, rows=len(records))
+            for k in range(len(records)):
+                if progress is not None:
+                    progress['offset'] = offsets[k]
+                yield row_num, raw_rows[k], values[k], errors[k]
+                row_num += 1
+    return fieldnames, results()
@@ -0,0 +1,229 @@
+import csv
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils.io_utils import detect_compression, open_input
+from src.validator.csv_validator import compile_schema, plan_columns, validate_values, split_valid_errors
+
+# Byte ranges handed to workers are at most RANGE_SIZE and at least MIN_RANGE_SIZE
+RANGE_SIZE = 32 * 1024 * 1024
+MIN_RANGE_SIZE = 1024 * 1024
+_SCAN_BLOCK = 16 * 1024 * 1024
+
+_worker_plan = None
+_worker_backend = None
+_worker_batch_rows = None
+
+
+def find_record_boundaries(file_path, range_size):
+    """
+    Return byte offsets at which CSV records start, roughly range_size apart.
+    The first offset is the end of the header record.
+
+    A newline only ends a record when it is outside a quoted field, which is
+    tracked by the parity of '"' characters seen so far (escaped quotes ""
+    come in pairs and keep the parity). This assumes RFC 4180 quoting.
+    """
+    boundaries = []
+    quotes = 0
+    offset = 0
+    next_target = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(_SCAN_BLOCK)
+            if not block:
+                break
+            pos = 0
+            counted_pos = 0
+            counted = quotes
+            while next_target <= offset + len(block):
+                nl = block.find(b'\n', max(next_target - offset, pos))
+                if nl == -1:
+                    break
+                counted += block.count(b'"', counted_pos, nl)
+                counted_pos = nl
+                pos = nl + 1
+                if counted & 1:
+                    continue  # newline inside a quoted field
+                boundaries.append(offset + pos)
+                next_target = offset + pos + range_size
+            quotes += block.count(b'"')
+            offset += len(block)
+    return boundaries
+
+
+def _record_end(data, start, last=False):
+    """Offset just past the first (or last) newline in data that is outside quotes, or -1."""
+    if last:
+        nl = data.rfind(b'\n')
+        while nl >= start and data.count(b'"', start, nl) & 1:
+            nl = data.rfind(b'\n', start, nl)
+    else:
+        nl = data.find(b'\n', start)
+        while nl != -1 and data.count(b'"', start, nl) & 1:
+            nl = data.find(b'\n', nl + 1)
+    return nl + 1 if nl >= start else -1
+
+
+def read_record_blocks(stream, block_size):
+    """
+    Cut a binary stream (e.g. a decompressing reader) into blocks of whole
+    records. Yields the header record first, then blocks of roughly
+    block_size bytes. Uses the same quote-parity rule as
+    find_record_boundaries, so it suits inputs that cannot be seeked.
+    """
+    pending = b''
+    header_sent = False
+    while True:
+        data = stream.read(block_size)
+        pending += data
+        if not header_sent:
+            end = _record_end(pending, 0)
+            if end == -1 and data:
+                continue
+            header_sent = True
+            yield pending[:end] if end != -1 else pending
+            pending = pending[end:] if end != -1 else b''
+        if not data:
+            if pending:
+                yield pending
+            return
+        end = _record_end(pending, 0, last=True)
+        if end > 0:
+            yield pending[:end]
+            pending = pending[end:]
+
+
+def _parse_header(data):
+    return next(csv.reader(io.StringIO(data.decode('utf-8'), newline='')), [])
+
+
+def _read_header(file_path, header_end):
+    with open(file_path, 'rb') as f:
+        data = f.read(header_end)
+    return _parse_header(data)
+
+
+def _init_worker(schema, backend=None, batch_rows=None):
+    global _worker_plan, _worker_backend, _worker_batch_rows
+    _worker_plan = compile_schema(schema)
+    _worker_backend = backend
+    _worker_batch_rows = batch_rows
+
+
+def _validate_range(file_path, fieldnames, start, end, keep_raw=False):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _validate_block(data, fieldnames, keep_raw)
+
+
+def _validate_block(data, fieldnames, keep_raw=False):
+    if _worker_backend == 'numpy':
+        return _validate_block_numpy(data, fieldnames, keep_raw)
+    reader = csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=fieldnames)
+    results = []
+    for row in reader:
+        validated, errors = validate_values(row, _worker_plan)
+        # Rows that already failed never reach the duplicate check
+        results.append((row if keep_raw else None, None if errors else validated, errors))
+    return results
+
+
+def _validate_block_numpy(data, fieldnames, keep_raw=False):
+    from src.validator.numpy_validator import BATCH_ROWS, validate_records
+    reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+    records = [record for record in reader if record]  # DictReader skips blank records
+    batch_rows = _worker_batch_rows or BATCH_ROWS
+    results = []
+    for start in range(0, len(records), batch_rows):
+        raw_rows, values, errors = validate_records(records[start:start + batch_rows], fieldnames, _worker_plan,
+                                                    keep_raw)
+        results.extend((raw_row, None if row_errors else validated, row_errors)
+                       for raw_row, validated, row_errors in zip(raw_rows, values, errors))
+    return results
+
+
+def validate_csv_parallel_chunks(file_path, schema, unique_fields, chunk_size=None, workers=None, range_size=None,
+                                 sink=None, key_store=None, progress=None, metrics=None, is_loaded=None,
+                                 thresholds=None, backend=None, batch_rows=None, keep_raw=False):
+    """
+    Validate a CSV in a process pool, one byte range per task, and yield
+    (valid_rows, error_rows) chunks exactly as validate_csv_chunks does.
+    Ranges are merged back in file order, so row numbers and duplicate
+    handling match the serial path. Workers read plain files directly;
+    compressed files are decompressed here and sent to them in blocks.
+    backend numpy has the workers check their rows in NumPy batches, and
+    keep_raw has valid rows carry their raw records.
+    """
+    workers = workers or os.cpu_count() or 1
+    file_size = os.path.getsize(file_path)
+    if range_size is None:
+        range_size = min(RANGE_SIZE, max(MIN_RANGE_SIZE, file_size // (workers * 4)))
+    send_raw = sink is not None or keep_raw
+    stream = None
+    if detect_compression(file_path) is None:
+        boundaries = find_record_boundaries(file_path, range_size)
+        if not boundaries:
+            return
+        fieldnames = _read_header(file_path, boundaries[0])
+        tasks = (
+            (_validate_range, file_path, fieldnames, start, end, send_raw)
+            for start, end in zip(boundaries, boundaries[1:] + [file_size]) if end > start
+        )
+    else:
+        stream = open_input(file_path)
+        blocks = read_record_blocks(stream, range_size)
+        header = next(blocks, b'')
+        if not header:
+            stream.close()
+            return
+        fieldnames = _parse_header(header)
+        tasks = ((_validate_block, block, fieldnames, send_raw) for block in blocks)
+    if sink is not None:
+        sink.start(fieldnames)
+
+    def results():
+        row_num = 2  # start at 2 for header
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(schema, backend, batch_rows))
+        finished = False
+        try:
+            # Keep a bounded number of ranges in flight so memory stays flat
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(*task))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                if metrics is not None:
+                    # Parsing and checks run in the workers; time spent waiting on them counts as validate
+                    waited = time.perf_counter()
+                    range_results = pending.popleft().result()
+                    metrics.add('validate', time.perf_counter() - waited, rows=len(range_results), calls=0)
+                else:
+                    range_results = pending.popleft().result()
+                next_task = next(tasks, None)
+                if next_task is not None:
+                    pending.append(pool.submit(*next_task))
+                for raw_row, validated, errors in range_results:
+                    yield row_num, raw_row, validated, errors
+                    row_num += 1
+            finished = True
+        finally:
+            # If stopped early (e.g. by an abort threshold), drop queued ranges and do not wait for running ones
+            pool.shutdown(wait=finished, cancel_futures=True)
+
+    if progress is not None:
+        progress['offset'] = None  # rows are merged across ranges; no exact byte offset
+    merged = results()
+    try:
+        yield from split_valid_errors(merged, plan_columns(schema), unique_fields, chunk_size, sink, key_store,
+                                      progress, metrics, is_loaded, thresholds, keep_raw)
+    finally:
+        merged.close()
+        if stream is not None:
+            stream.close()
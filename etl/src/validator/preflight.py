@@ -0,0 +1,159 @@
+import csv
+import io
+import os
+import random
+import re
+import time
+from collections import Counter
+
+from src.utils.io_utils import detect_compression, open_input
+from src.validator.csv_validator import compile_schema, validate_values
+
+PREFLIGHT_SAMPLES = 100
+ROWS_PER_SAMPLE = 20
+# Files whose sampled error rate is above this are rejected, unless configured otherwise
+PREFLIGHT_MAX_ERROR_RATE = 0.05
+
+# Bytes read at each sampled offset; plenty for ROWS_PER_SAMPLE typical records
+_SAMPLE_READ = 64 * 1024
+# Newlines tried after an offset before giving up on finding a record start there
+_ALIGN_TRIES = 8
+_SURROGATE = re.compile('[\udc80-\udcff]')
+UNDECODABLE_ERROR = 'Row is not valid UTF-8'
+
+
+def sample_offsets(start, end, samples, method='stratified', seed=None):
+    """
+    Pick `samples` byte offsets in [start, end). stratified takes one random
+    offset in each of `samples` equal slices, so the whole file is covered;
+    random draws them uniformly. Offsets are returned in file order.
+    """
+    span = end - start
+    if span <= 0 or samples <= 0:
+        return []
+    rng = random.Random(seed)
+    if method == 'random':
+        return sorted(start + rng.randrange(span) for _ in range(samples))
+    if method != 'stratified':
+        raise ValueError(f"Unknown preflight method '{method}', expected stratified or random")
+    step = span / samples
+    return [start + int(i * step + rng.random() * step) for i in range(samples)]
+
+
+def _records_at(data, fieldnames, rows, at_eof):
+    """
+    Parse up to `rows` whole records from data, which starts at an arbitrary
+    byte offset. Each newline is tried as a record start until the first two
+    records parsed after it have the header's field count; a newline inside a
+    quoted field rarely passes that test. Returns the records and the bytes
+    of data they span, or ([], 0) if no start is found. Undecodable bytes are
+    kept as surrogates (see _undecodable).
+    """
+    width = len(fieldnames)
+    nl = -1
+    for _ in range(_ALIGN_TRIES):
+        nl = data.find(b'\n', nl + 1)
+        if nl == -1:
+            return [], 0
+        text = data[nl + 1:].decode('utf-8', errors='surrogateescape')
+        lines = io.StringIO(text, newline='')
+        chars = 0
+
+        def counted():
+            nonlocal chars
+            for line in lines:
+                chars += len(line)
+                yield line
+
+        records = []
+        ends = []
+        for record in csv.reader(counted()):
+            records.append(record)
+            ends.append(chars)
+            if len(records) > rows:
+                break  # the records before this one are known to be whole
+        else:
+            if not at_eof:
+                records = records[:-1]  # probably cut short by the read
+        records = records[:rows]
+        if records and all(len(r) == width for r in records[:2]):
+            consumed = nl + 1 + len(text[:ends[len(records) - 1]].encode('utf-8', errors='surrogateescape'))
+            return [dict(zip(fieldnames, r)) for r in records if r], consumed
+    return [], 0
+
+
+def _undecodable(row):
+    # surrogateescape decodes each invalid UTF-8 byte to a lone surrogate
+    return any(value and _SURROGATE.search(value) for value in row.values() if isinstance(value, str))
+
+
+def preflight_csv(file_path, schema, samples=PREFLIGHT_SAMPLES, rows_per_sample=ROWS_PER_SAMPLE,
+                  method='stratified', seed=None):
+    """
+    Validate a sample of a CSV's rows without reading the whole file: up to
+    rows_per_sample records at each of `samples` byte offsets (see
+    sample_offsets). Offsets that fall in records already sampled move past
+    them, so small files are covered front to back without repeats.
+    Compressed inputs cannot be seeked, so their first samples *
+    rows_per_sample rows are checked instead (method 'head'). Records that
+    are not valid UTF-8 count as invalid; duplicate keys are not checked.
+    Returns a dict with the rows checked, invalid rows, error_rate, the most
+    common error messages (top_errors) and the bytes read (decompressed, for
+    compressed inputs).
+    """
+    plan = compile_schema(schema)
+    start = time.perf_counter()
+    rows = []
+    bytes_read = 0
+    file_size = os.path.getsize(file_path)
+    if detect_compression(file_path) is not None:
+        method = 'head'
+        limit = samples * rows_per_sample
+        with open_input(file_path) as f:
+            reader = csv.DictReader(line.decode('utf-8', errors='surrogateescape') for line in f)
+            for row in reader:
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+            bytes_read = f.tell()
+    else:
+        with open(file_path, 'rb') as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode('utf-8')]), [])
+            bytes_read = len(header)
+            # End of the records sampled so far; the byte before it is their last newline
+            covered = len(header)
+            offsets = sample_offsets(len(header), file_size, samples, method, seed)
+            if offsets:
+                offsets[0] = covered - 1  # the first sample starts at the first record
+            for offset in offsets:
+                offset = max(offset, covered - 1)
+                if offset >= file_size - 1:
+                    break
+                f.seek(offset)
+                data = f.read(_SAMPLE_READ)
+                bytes_read += len(data)
+                records, consumed = _records_at(data, fieldnames, rows_per_sample, offset + len(data) >= file_size)
+                rows.extend(records)
+                covered = max(covered, offset + consumed)
+    messages = Counter()
+    invalid = 0
+    for row in rows:
+        if _undecodable(row):
+            errors = [UNDECODABLE_ERROR]
+        else:
+            _, errors = validate_values(row, plan)
+        if errors:
+            invalid += 1
+            messages.update(errors)
+    return {
+        'file': file_path,
+        'method': method,
+        'samples': samples if method != 'head' else 1,
+        'rows': len(rows),
+        'errors': invalid,
+        'error_rate': invalid / len(rows) if rows else 0.0,
+        'top_errors': messages.most_common(5),
+        'bytes_read': bytes_read,
+        'seconds': time.perf_counter() - start,
+    }
@@ -0,0 +1,63 @@
+class ValidationAborted(Exception):
+    """Raised when a file's invalid rows exceed its abort thresholds."""
+
+
+class AbortThresholds:
+    """
+    Decide, row by row, when a file is too broken to keep validating.
+
+    fail_fast aborts on the first invalid row, max_errors once more than
+    that many rows are invalid, and max_error_rate once the share of invalid
+    rows among the last `window` rows exceeds it. A file shorter than the
+    window is held to max_error_rate over all its rows by finish(). Each
+    check raises ValidationAborted naming the row that tripped it.
+    """
+
+    def __init__(self, max_errors=None, max_error_rate=None, window=10000, fail_fast=False):
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.fail_fast = fail_fast
+        self.rows = 0
+        self.errors = 0
+        # Ring of 0/1 flags for the last window rows, and how many are 1
+        self._ring = bytearray(window) if max_error_rate is not None else None
+        self._pos = 0
+        self._window_errors = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        """Build thresholds from the `abort` config section, or None if it sets none."""
+        cfg = cfg or {}
+        if not cfg.get('fail_fast') and cfg.get('max_errors') is None and cfg.get('max_error_rate') is None:
+            return None
+        return cls(max_errors=cfg.get('max_errors'), max_error_rate=cfg.get('max_error_rate'),
+                   window=cfg.get('window') or 10000, fail_fast=bool(cfg.get('fail_fast')))
+
+    def record(self, row_num, errors):
+        """Count one validated row (errors is its error list); raise if a threshold is exceeded."""
+        self.rows += 1
+        failed = 1 if errors else 0
+        if failed:
+            self.errors += 1
+            if self.fail_fast:
+                raise ValidationAborted(f"Aborted at row {row_num} (fail_fast): {'; '.join(errors)}")
+            if self.max_errors is not None and self.errors > self.max_errors:
+                raise ValidationAborted(f'Aborted at row {row_num}: more than {self.max_errors} invalid rows')
+        ring = self._ring
+        if ring is not None:
+            pos = self._pos
+            self._window_errors += failed - ring[pos]
+            ring[pos] = failed
+            self._pos = pos + 1 if pos + 1 < self.window else 0
+            if self.rows >= self.window and self._window_errors > self.max_error_rate * self.window:
+                raise ValidationAborted(
+                    f'Aborted at row {row_num}: {self._window_errors} of the last {self.window} rows invalid '
+                    f'(max error rate {self.max_error_rate:.1%})')
+
+    def finish(self):
+        """Apply max_error_rate to a file that ended before filling one window."""
+        if self._ring is not None and 0 < self.rows < self.window \
+                and self.errors > self.max_error_rate * self.rows:
+            raise ValidationAborted(f'Aborted: {self.errors} of {self.rows} rows invalid '
+                                    f'(max error rate {self.max_error_rate:.1%})')
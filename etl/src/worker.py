@@ -0,0 +1,523 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.batch import _run_file, resolve_inputs
+from src.config.schema_config import load_config
+from src.utils.csv_utils import sidecar_path
+from src.utils.io_utils import split_compression_ext
+
+# Jobs run at once, unless configured otherwise
+WORKER_JOBS = 4
+# Seconds between spool scans and config checks
+POLL_SECONDS = 1.0
+# A spooled file is picked up once it has not been modified for this long
+SETTLE_SECONDS = 1.0
+# Seconds a job waits for its error report to be sent before its files are moved
+EMAIL_WAIT_SECONDS = 60.0
+# Jobs whose run metrics are kept in the JSON report and Prometheus textfile
+REPORT_JOBS = 100
+# Latencies kept for the percentiles, and the span of the recent jobs/sec rate
+LATENCY_WINDOW = 1000
+RATE_WINDOW = 60.0
+
+# Subdirectories of the spool directory
+PROCESSING_DIR = 'processing'
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+
+
+def _percentile(values, q):
+    # Nearest-rank percentile of sorted values
+    if not values:
+        return None
+    index = max(0, math.ceil(q / 100 * len(values)) - 1)
+    return round(values[index], 6)
+
+
+class JobStats:
+    """Thread-safe counts, throughput and latency percentiles of completed jobs."""
+
+    def __init__(self, latency_window=LATENCY_WINDOW, rate_window=RATE_WINDOW):
+        self.started = time.time()
+        self.rate_window = rate_window
+        self.statuses = Counter()
+        self.latencies = deque(maxlen=latency_window)
+        self._finished = deque()
+        self._lock = threading.Lock()
+
+    def record(self, status, latency):
+        now = time.perf_counter()
+        with self._lock:
+            self.statuses[status] += 1
+            self.latencies.append(latency)
+            self._finished.append(now)
+            while self._finished and self._finished[0] < now - self.rate_window:
+                self._finished.popleft()
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self._lock:
+            while self._finished and self._finished[0] < now - self.rate_window:
+                self._finished.popleft()
+            statuses = dict(self.statuses)
+            latencies = sorted(self.latencies)
+            recent = len(self._finished)
+        uptime = time.time() - self.started
+        completed = sum(statuses.values())
+        return {
+            'uptime_seconds': round(uptime, 3),
+            'completed': completed,
+            'statuses': statuses,
+            'jobs_per_sec': round(recent / min(self.rate_window, uptime or 1e-9), 3),
+            'jobs_per_sec_overall': round(completed / (uptime or 1e-9), 3),
+            'latency_seconds': {
+                'samples': len(latencies),
+                'p50': _percentile(latencies, 50),
+                'p90': _percentile(latencies, 90),
+                'p99': _percentile(latencies, 99),
+                'max': round(latencies[-1], 6) if latencies else None,
+            },
+        }
+
+
+class _Generation:
+    """One loaded config with the compiled plan, pool and key index built from it."""
+
+    def __init__(self, config, stamp, plan, pool, key_index):
+        self.config = config
+        self.stamp = stamp
+        self.plan = plan
+        self.pool = pool
+        self.key_index = key_index
+        self.active = 0
+        self.retired = False
+
+
+def _config_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_stem(path):
+    base, _ = split_compression_ext(os.path.basename(path))
+    return os.path.splitext(base)[0]
+
+
+def _spool_names(result):
+    # The claimed file and what its run writes next to it: sidecars and sink outputs
+    csv_file = result['file']
+    directory = os.path.dirname(os.path.abspath(csv_file))
+    paths = [csv_file, sidecar_path(csv_file, '_errors'), sidecar_path(csv_file, '_valid', keep_compression=True)]
+    paths += [path for path in result.get('outputs') or ()
+              if os.path.dirname(os.path.abspath(path)) == directory]
+    return {os.path.basename(path) for path in paths}
+
+
+def _unique_names(directory, names, stem):
+    # Target names for a job's files: as they are, or all with -1, -2, ... after the stem if any is taken
+    targets = {name: name for name in names}
+    n = 0
+    while any(os.path.exists(os.path.join(directory, target)) for target in targets.values()):
+        n += 1
+        targets = {name: f'{stem}-{n}{name[len(stem):]}' for name in names}
+    return targets
+
+
+class EtlWorker:
+    """
+    Resident ETL process for streams of small files. The config, compiled
+    validation plan, connection pool and key index are built once and
+    shared by every job, so a job costs only its own validation and load.
+
+    Jobs come from a spool directory (files are claimed into processing/
+    and moved with their outputs to done/ or failed/) and/or a local UNIX
+    socket, and run on at most `jobs` threads; intake waits for a free slot.
+    Spooled files sharing a stem (a.csv, a.csv.gz) write the same outputs,
+    so one is claimed only once the other has finished; files whose names
+    are already in done/ or failed/ get a -N suffix after the stem. Jobs
+    run concurrently, so load_mode: reload is refused, on start and reload.
+    The config file is checked every poll and reloaded when it changes:
+    new jobs use the new config while running jobs finish on the old one,
+    whose pool and key index are closed once they are done. stats() and
+    health() back the HTTP endpoint and the socket's stats/health commands;
+    the run metrics of the last REPORT_JOBS jobs are rewritten to the
+    metrics files after each job.
+    """
+
+    def __init__(self, config_path, spool_dir=None, socket_path=None, jobs=None, http_port=None, options=None,
+                 metrics_json=None, metrics_prometheus=None):
+        self.config_path = config_path
+        self.config_error = None
+        self.reloads = 0
+        self.options = options or {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        stamp = _config_stamp(config_path)
+        config = load_config(config_path)
+        cfg = config.get('worker') or {}
+        self.spool_dir = spool_dir or cfg.get('spool_dir')
+        self.socket_path = socket_path or cfg.get('socket')
+        if not self.spool_dir and not self.socket_path:
+            raise ValueError('Worker mode needs a spool directory or a socket (worker.spool_dir / worker.socket)')
+        self.jobs = max(1, jobs or cfg.get('jobs') or WORKER_JOBS)
+        self.poll_seconds = cfg.get('poll_seconds') or POLL_SECONDS
+        settle = cfg.get('settle_seconds')
+        self.settle_seconds = SETTLE_SECONDS if settle is None else settle
+        email_wait = cfg.get('email_wait_seconds')
+        self.email_wait_seconds = EMAIL_WAIT_SECONDS if email_wait is None else email_wait
+        self.metrics_json = metrics_json
+        self.metrics_prometheus = metrics_prometheus
+        self._reports = deque(maxlen=REPORT_JOBS)
+        self._report_lock = threading.Lock()
+        # Stems of the spooled files being processed
+        self._in_flight = set()
+        self.http_host = cfg.get('http_host') or '127.0.0.1'
+        self.http_port = http_port if http_port is not None else cfg.get('http_port')
+        self.job_stats = JobStats()
+        self.running = 0
+        self._slots = threading.BoundedSemaphore(self.jobs)
+        self._generation = self._build_generation(config, stamp)
+        self.config_loaded_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix='etl-job')
+        self._servers = []
+
+    # Warm state
+
+    def _build_generation(self, config, stamp, previous=None):
+        if config.get('load_mode') == 'reload':
+            # Like run_batch: each job would replace the table the others are loading
+            raise ValueError('load_mode reload replaces the whole table with one file, so worker mode cannot use it')
+        from src.utils.db_utils import get_pool
+        from src.validator.csv_validator import compile_schema
+        from src.validator.key_index import open_key_index
+        plan = compile_schema(config['schema'])
+        connections = self.options.get('connections') or (config.get('parallel_load') or {}).get('connections') or 1
+        # The same db_config keeps its pool (grown if needed) under running jobs
+        pool = get_pool(config['db_config'], self.jobs * connections)
+        key_index = None
+        if previous is not None and _key_index_settings(previous.config) == _key_index_settings(config):
+            key_index = previous.key_index
+        elif (config.get('key_index') or {}).get('enabled'):
+            key_index = open_key_index(config)
+        return _Generation(config, stamp, plan, pool, key_index)
+
+    def _reload(self, stamp):
+        config = load_config(self.config_path)
+        with self._lock:
+            previous = self._generation
+        generation = self._build_generation(config, stamp, previous)
+        with self._lock:
+            self._generation = generation
+            previous.retired = True
+            if not previous.active:
+                self._close_generation(previous)
+        self.config_loaded_at = time.time()
+        self.config_error = None
+
+    def check_config(self):
+        """Reload the config if its file changed; a broken file keeps the current config running."""
+        try:
+            stamp = _config_stamp(self.config_path)
+            if stamp == self._generation.stamp:
+                return False
+            self._reload(stamp)
+        except Exception as e:
+            if self.config_error != str(e):
+                print(f'Config reload failed, keeping the current config: {e}')
+            self.config_error = str(e)
+            return False
+        self.reloads += 1
+        print(f'Config reloaded from {self.config_path}')
+        return True
+
+    def _close_generation(self, generation):
+        # Close what the current generation no longer shares; called under self._lock
+        current = self._generation
+        if generation.pool is not current.pool and not generation.pool.closed:
+            generation.pool.closeall()
+        if generation.key_index is not None and generation.key_index is not current.key_index:
+            generation.key_index.close()
+
+    def _acquire(self):
+        with self._lock:
+            generation = self._generation
+            generation.active += 1
+            self.running += 1
+        return generation
+
+    def _release(self, generation):
+        with self._lock:
+            generation.active -= 1
+            self.running -= 1
+            if generation.retired and not generation.active:
+                self._close_generation(generation)
+
+    # Jobs
+
+    def _wait_slot(self):
+        while not self._stop.is_set():
+            if self._slots.acquire(timeout=self.poll_seconds):
+                return True
+        return False
+
+    def submit(self, csv_file, on_done=None):
+        """Run csv_file as a job once a slot is free; returns its future, or None if stopping."""
+        if not self._wait_slot():
+            return None
+        return self._start(csv_file, on_done)
+
+    def _start(self, csv_file, on_done=None):
+        # The caller holds a slot
+        submitted = time.perf_counter()
+        try:
+            return self._executor.submit(self._run_job, csv_file, submitted, on_done)
+        except RuntimeError:
+            self._slots.release()
+            return None
+
+    def _run_job(self, csv_file, submitted, on_done):
+        generation = self._acquire()
+        config = generation.config
+        try:
+            result = _run_file(csv_file, config, generation.plan, generation.pool,
+                               generation.key_index, self.options)
+            if result['errors'] and (config.get('email') or {}).get('enabled'):
+                # Error reports read the error file when sent; send them before it is moved
+                from src.utils.email_utils import flush_deliveries
+                if not flush_deliveries(self.email_wait_seconds):
+                    print(f'{csv_file}: error report not sent after {self.email_wait_seconds:g}s, moving on')
+        finally:
+            self._release(generation)
+            self._slots.release()
+        self._write_reports(result.pop('metrics', None), config)
+        if on_done is not None:
+            try:
+                on_done(result)
+            except OSError as e:
+                print(f'{csv_file}: could not move the file and its outputs: {e}')
+        result['latency'] = time.perf_counter() - submitted
+        self.job_stats.record(result['status'], result['latency'])
+        line = (f"{csv_file}: {result['status']}, {result['valid']} valid, {result['errors']} errors "
+                f"in {result['seconds']:.2f}s")
+        print(line + (f" - {result['error']}" if result['error'] else ''))
+        return result
+
+    def _write_reports(self, metrics, config):
+        """Rewrite the JSON report and Prometheus textfile, if configured, with the recent jobs."""
+        metrics_cfg = config.get('metrics') or {}
+        json_path = self.metrics_json or metrics_cfg.get('json')
+        prometheus_path = self.metrics_prometheus or metrics_cfg.get('prometheus')
+        if metrics is None or not (json_path or prometheus_path):
+            return
+        from src.utils.metrics import write_json_report, write_prometheus
+        with self._report_lock:
+            self._reports.append(metrics)
+            try:
+                if json_path:
+                    write_json_report(self._reports, json_path)
+                if prometheus_path:
+                    write_prometheus(self._reports, prometheus_path)
+            except OSError as e:
+                print(f'Could not write the run metrics: {e}')
+
+    # Spool directory
+
+    def scan_spool(self):
+        """Claim settled files from the spool directory while slots are free; returns the number started."""
+        processing = os.path.join(self.spool_dir, PROCESSING_DIR)
+        started = 0
+        now = time.time()
+        for path in resolve_inputs([self.spool_dir]):
+            try:
+                if now - os.path.getmtime(path) < self.settle_seconds:
+                    continue  # may still be being written
+            except OSError:
+                continue
+            stem = _file_stem(path)
+            if stem in self._in_flight:
+                continue  # its outputs would collide with those of the running job
+            if not self._slots.acquire(blocking=False):
+                break
+            claimed = os.path.join(processing, os.path.basename(path))
+            try:
+                if os.path.exists(claimed):
+                    raise FileExistsError(claimed)
+                os.replace(path, claimed)
+            except OSError:
+                # Taken by another worker, or a file of that name is still in progress
+                self._slots.release()
+                continue
+            with self._lock:
+                self._in_flight.add(stem)
+            if self._start(claimed, self._finish_spooled) is not None:
+                started += 1
+            else:
+                with self._lock:
+                    self._in_flight.discard(stem)
+        return started
+
+    def _finish_spooled(self, result):
+        """Move a spooled file and its outputs (<name>_errors.csv, sink files, ...) to done/ or failed/."""
+        csv_file = result['file']
+        directory = os.path.dirname(csv_file)
+        target = os.path.join(self.spool_dir, DONE_DIR if result['status'] in ('ok', 'skipped') else FAILED_DIR)
+        stem = _file_stem(csv_file)
+        try:
+            names = [name for name in _spool_names(result) if os.path.isfile(os.path.join(directory, name))]
+            # An earlier job's files of the same name stay; this job's are renamed together
+            targets = _unique_names(target, names, stem)
+            for name in names:
+                os.replace(os.path.join(directory, name), os.path.join(target, targets[name]))
+        finally:
+            with self._lock:
+                self._in_flight.discard(stem)
+        basename = os.path.basename(csv_file)
+        result['file'] = os.path.join(target, targets.get(basename, basename))
+
+    # Endpoints
+
+    def health(self):
+        status = 'stopping' if self._stop.is_set() else ('degraded' if self.config_error else 'ok')
+        return {
+            'status': status,
+            'uptime_seconds': round(time.time() - self.job_stats.started, 3),
+            'running': self.running,
+            'config_error': self.config_error,
+        }
+
+    def stats(self):
+        stats = self.job_stats.snapshot()
+        stats.update({
+            'running': self.running,
+            'slots': self.jobs,
+            'config': self.config_path,
+            'config_loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.config_loaded_at)),
+            'config_reloads': self.reloads,
+            'config_error': self.config_error,
+        })
+        return stats
+
+    def _handle_request(self, request):
+        """Answer one socket request: {"csv": path} runs a job, {"command": "stats" | "health"} reports."""
+        command = request.get('command')
+        if command == 'stats':
+            return self.stats()
+        if command == 'health':
+            return self.health()
+        if command is not None:
+            return {'error': f'Unknown command {command!r}, expected stats or health'}
+        csv_file = request.get('csv')
+        if not csv_file or not os.path.isfile(csv_file):
+            return {'error': f'CSV file not found: {csv_file}'}
+        future = self.submit(csv_file)
+        if future is None:
+            return {'error': 'Worker is stopping'}
+        return future.result()
+
+    def _serve_socket(self):
+        import socket
+        import socketserver
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('UNIX sockets are not available on this platform; use worker.spool_dir')
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        reply = worker._handle_request(json.loads(line))
+                    except ValueError as e:
+                        reply = {'error': f'Invalid request: {e}'}
+                    self.wfile.write(json.dumps(reply, default=str).encode('utf-8') + b'\n')
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # left by a worker that did not shut down cleanly
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        server.daemon_threads = True
+        self._start_server(server, 'etl-socket')
+        print(f'Listening for jobs on {self.socket_path}')
+
+    def _serve_http(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        worker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    body = worker.health()
+                    code = 200 if body['status'] == 'ok' else 503
+                elif self.path == '/stats':
+                    body, code = worker.stats(), 200
+                else:
+                    body, code = {'error': 'Not found; try /health or /stats'}, 404
+                data = json.dumps(body, indent=2).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((self.http_host, self.http_port), Handler)
+        server.daemon_threads = True
+        self._start_server(server, 'etl-http')
+        print(f'Health and stats on http://{self.http_host}:{server.server_address[1]}/health and /stats')
+
+    def _start_server(self, server, name):
+        threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+        self._servers.append(server)
+
+    # Lifecycle
+
+    def run(self):
+        """Serve until stop() (or Ctrl+C); running jobs are finished before returning."""
+        if self.spool_dir:
+            for name in (PROCESSING_DIR, DONE_DIR, FAILED_DIR):
+                os.makedirs(os.path.join(self.spool_dir, name), exist_ok=True)
+            print(f'Watching {self.spool_dir} for CSV files')
+        try:
+            if self.socket_path:
+                self._serve_socket()
+            if self.http_port is not None:
+                self._serve_http()
+            while not self._stop.is_set():
+                self.check_config()
+                if self.spool_dir:
+                    self.scan_spool()
+                self._stop.wait(self.poll_seconds)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self._stop.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            generation = self._generation
+        if generation.key_index is not None:
+            generation.key_index.close()
+        from src.utils.db_utils import close_pools
+        close_pools()
+
+
+def _key_index_settings(config):
+    return config.get('key_index'), config.get('unique_fields'), config.get('table_name') or config.get('table')
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the etl sources as the src package, like etl.py does
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
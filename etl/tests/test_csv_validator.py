@@ -0,0 +1,29 @@
+import os
+import sys
+
+from src.config.schema_config import load_config
+from src.utils.metrics import RunMetrics
+from src.validator.csv_validator import validate_csv_chunks
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from generate_survey_data import generate_csv  # noqa: E402
+
+
+def _run(path, metrics):
+    config = load_config()
+    progress = {}
+    chunks = []
+    for valid_rows, error_rows in validate_csv_chunks(path, config['schema'], config.get('unique_fields'),
+                                                      chunk_size=300, progress=progress, metrics=metrics):
+        chunks.append((list(valid_rows), error_rows, dict(progress)))
+    return chunks
+
+
+def test_timed_run_matches_untimed_run(tmp_path):
+    path = str(tmp_path / 'survey.csv')
+    generate_csv(path, 1000)
+    metrics = RunMetrics()
+    assert _run(path, metrics) == _run(path, None)
+    assert metrics.stages['parse'].rows == 1000
+    assert metrics.stages['validate'].rows == 1000
+    assert metrics.stages['dedupe'].seconds > 0
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from src.utils import db_utils
+
+DB_CONFIG = {'host': 'localhost', 'dbname': 'test'}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.info = type('Info', (), {'transaction_status': TRANSACTION_STATUS_IDLE})()
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    monkeypatch.setattr(psycopg2, 'connect', lambda *args, **kwargs: FakeConnection())
+    yield
+    db_utils.close_pools()
+
+
+def test_larger_pool_grows_in_place(pools):
+    pool = db_utils.get_pool(DB_CONFIG, 1)
+    conn = pool.getconn()
+    larger = db_utils.get_pool(DB_CONFIG, 3)
+    assert larger is pool
+    assert pool.maxconn == 3
+    assert not pool.closed and not conn.closed
+    others = [pool.getconn() for _ in range(2)]
+    for c in [conn] + others:
+        pool.putconn(c)
+
+
+def test_smaller_pool_keeps_its_size(pools):
+    pool = db_utils.get_pool(DB_CONFIG, 4)
+    assert db_utils.get_pool(DB_CONFIG, 2) is pool
+    assert pool.maxconn == 4
+
+
+def test_exhausted_pool_waits_for_a_connection(pools):
+    pool = db_utils.get_pool(DB_CONFIG, 1)
+    held = pool.getconn()
+    taken = []
+    waiter = threading.Thread(target=lambda: taken.append(pool.getconn()), daemon=True)
+    waiter.start()
+    time.sleep(0.2)
+    assert not taken
+    pool.putconn(held)
+    waiter.join(timeout=5)
+    assert len(taken) == 1
+    pool.putconn(taken[0])
+
+
+def test_close_pools_wakes_waiters(pools):
+    pool = db_utils.get_pool(DB_CONFIG, 1)
+    pool.getconn()
+    errors = []
+
+    def take():
+        try:
+            pool.getconn()
+        except psycopg2.pool.PoolError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=take, daemon=True)
+    waiter.start()
+    time.sleep(0.1)
+    db_utils.close_pools()
+    waiter.join(timeout=5)
+    assert errors and 'closed' in str(errors[0])
+    assert db_utils.get_pool(DB_CONFIG, 1) is not pool
+
+
+class IndexCursor:
+    def __init__(self, log, indexes):
+        self.log = log
+        self.indexes = indexes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.log.append(query)
+
+    def fetchall(self):
+        return self.indexes
+
+
+def test_partitioned_table_indexes_are_rebuilt_on_every_partition():
+    log = []
+    indexes = [('etl', 'survey_unique_key',
+                'CREATE UNIQUE INDEX survey_unique_key ON ONLY etl.survey USING btree (year, code) NULLS NOT DISTINCT')]
+    conn = type('Conn', (), {'cursor': lambda self: IndexCursor(log, indexes)})()
+    definitions = db_utils.drop_indexes(conn, 'etl.survey')
+    assert log[1:] == ['DROP INDEX "etl"."survey_unique_key"']
+    assert definitions == [
+        'CREATE UNIQUE INDEX survey_unique_key ON etl.survey USING btree (year, code) NULLS NOT DISTINCT']
@@ -0,0 +1,151 @@
+import csv
+import gzip
+import io
+import socket
+import socketserver
+import threading
+import time
+from email import message_from_bytes, policy
+
+import pytest
+
+from src.utils.email_utils import EmailDelivery, close_deliveries, flush_deliveries, get_delivery
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: one connection per client, messages kept on the server."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data == b'.\r\n':
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.messages.append(message_from_bytes(b''.join(lines), policy=policy.default))
+                self.reply('250 OK')
+                if self.server.drop_after_message:
+                    return  # like a relay closing the connection while it sits idle
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.drop_after_message = False
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def delivery(smtp_server):
+    delivery = EmailDelivery({'host': '127.0.0.1', 'port': smtp_server.server_address[1]}, idle_timeout=0.2)
+    yield delivery
+    delivery.close(timeout=5)
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Year', 'Value'])
+        for i in range(rows):
+            writer.writerow([2020 + i % 5, f'{(i * 7919) % 100003:x}{i}'])
+
+
+def _send(delivery, attachments=(), **kwargs):
+    delivery.submit('etl@example.com', ['ops@example.com'], 'Errors', 'See attached.', list(attachments), **kwargs)
+    assert delivery.flush(timeout=5)
+
+
+def _attachment(message):
+    part = next(message.iter_attachments())
+    return part.get_filename(), part.get_content()
+
+
+def test_attachment_is_sent_gzip_compressed(tmp_path, smtp_server, delivery):
+    path = tmp_path / 'survey_errors.csv'
+    _write_csv(path, 500)
+    _send(delivery, [path])
+    assert delivery.sent == 1
+    filename, data = _attachment(smtp_server.messages[0])
+    assert filename == 'survey_errors.csv.gz'
+    assert gzip.decompress(data) == path.read_bytes()
+
+
+def test_oversized_attachment_is_replaced_by_a_sample(tmp_path, smtp_server, delivery):
+    path = tmp_path / 'survey_errors.csv'
+    _write_csv(path, 50000)
+    _send(delivery, [path], max_bytes=20000, sample_rows=100, row_count=50000)
+    message = smtp_server.messages[0]
+    filename, data = _attachment(message)
+    assert filename == 'survey_errors_sample.csv.gz'
+    assert len(data) <= 20000
+    records = list(csv.reader(io.StringIO(gzip.decompress(data).decode('utf-8'))))
+    assert len(records) == 101
+    assert 'sample of the first 100 rows out of 50000 rows' in message.get_body(('plain',)).get_content()
+
+
+def test_connection_is_reused_then_closed_when_idle(smtp_server, delivery):
+    _send(delivery)
+    _send(delivery)
+    assert delivery.connections == 1
+    time.sleep(0.5)  # past idle_timeout: the delivery quits the connection
+    _send(delivery)
+    assert delivery.sent == 3
+    assert delivery.connections == 2
+    assert smtp_server.connections == 2
+
+
+def test_reconnects_when_the_server_drops_an_idle_connection(smtp_server, delivery):
+    smtp_server.drop_after_message = True
+    _send(delivery)
+    _send(delivery)
+    assert delivery.sent == 2
+    assert delivery.failed == 0
+    assert delivery.connections == 2
+    assert len(smtp_server.messages) == 2
+
+
+def test_flush_gives_up_on_a_stalled_server():
+    listener = socket.create_server(('127.0.0.1', 0))  # accepts connections, never greets
+    try:
+        delivery = get_delivery({'host': '127.0.0.1', 'port': listener.getsockname()[1], 'timeout': 0.5})
+        delivery.submit('etl@example.com', ['ops@example.com'], 'Errors', 'See attached.', [])
+        assert not flush_deliveries(timeout=0.1)
+        assert flush_deliveries(timeout=5)  # the SMTP timeout fails the send instead of stalling the queue
+        assert delivery.failed == 1
+    finally:
+        close_deliveries(timeout=5)
+        listener.close()
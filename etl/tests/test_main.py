@@ -0,0 +1,201 @@
+import csv
+
+from src.config.schema_config import load_config
+from src.main import ETLProcess
+from src.utils.csv_utils import ERROR_COLUMN
+from src.utils.rows import RowBatch, source_row
+from src.validator.csv_validator import plan_columns
+
+
+class FakeKeyIndex:
+    def __init__(self):
+        self.keys = []
+
+    def add(self, keys, source=None):
+        self.keys.extend(keys)
+        return len(keys)
+
+
+def _process(tmp_path, **kwargs):
+    config = load_config()
+    return ETLProcess(str(tmp_path / 'survey.csv'), config, key_index=FakeKeyIndex(), **kwargs)
+
+
+def _rows(process, start, count):
+    columns = plan_columns(process._schema())
+    unique = process.config['unique_fields']
+    rows = RowBatch(columns)
+    for n in range(start, start + count):
+        values = {column: None for column in columns}
+        values.update((field, f'{field}-{n}') for field in unique)
+        rows.append(tuple(values[column] for column in columns))
+    return rows
+
+
+def _key(process, n):
+    return tuple(f'{field}-{n}' for field in process.config['unique_fields'])
+
+
+def test_committed_keys_are_dropped_from_the_buffer(tmp_path):
+    process = _process(tmp_path)
+    process._stage_index_keys(_rows(process, 0, 30))
+    process._update_key_index(10)
+    assert len(process._index_keys) == 20
+    process._stage_index_keys(_rows(process, 30, 30))
+    process._update_key_index(45)
+    assert len(process._index_keys) == 15
+    process._update_key_index()
+    assert process._index_keys == []
+    assert process.key_index.keys == [_key(process, n) for n in range(60)]
+
+
+def test_keys_of_rolled_back_partitions_and_rejected_rows_are_not_indexed(tmp_path):
+    process = _process(tmp_path, connections=2)
+    rows = _rows(process, 0, 40)
+    process._stage_index_keys(rows)
+    parts = list(process._index_parts)
+    process.load_results = [{'partition': 0, 'status': 'committed'}, {'partition': 1, 'status': 'failed'}]
+    committed = [n for n in range(40) if parts[n] == 0]
+    rejected = [n for n in range(40) if parts[n] == 1][0]
+    process.db_rejected = [(rows[committed[0]], 'bad'), (rows[rejected], 'bad')]
+    process._update_key_index()
+    assert process.key_index.keys == [_key(process, n) for n in committed[1:]]
+
+
+def _read_errors(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_rejected_rows_are_written_as_read_at_each_commit(tmp_path):
+    process = _process(tmp_path)
+    columns = plan_columns(process._schema())
+    process._fieldnames = list(columns)
+    raw = {column: ' 2021 ' if column == 'Year' else '1.50' for column in columns}
+    values = tuple(2021 if column == 'Year' else 1.5 for column in columns)
+    process.db_rejected = [(source_row(values, raw), 'value too long')]
+    process._record_checkpoint(1)
+    assert process.db_rejected == []
+    [row] = _read_errors(process.error_file)
+    assert row.pop(ERROR_COLUMN) == 'Rejected by database: value too long'
+    assert row == raw
+
+
+def test_resume_carries_rejected_rows_of_the_earlier_run(tmp_path):
+    process = _process(tmp_path)
+    columns = plan_columns(process._schema())
+    error_file = tmp_path / 'survey_errors.csv'
+    with open(error_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(columns) + [ERROR_COLUMN])
+        writer.writerow(['2021'] + ['x'] * (len(columns) - 2) + ['7', 'Field Year is invalid'])
+        writer.writerow(['2022'] + ['y'] * (len(columns) - 2) + ['8', 'Rejected by database: duplicate key'])
+    process._carry_rejected()
+    [(row, message)] = process.db_rejected
+    assert message == 'duplicate key'
+    assert row.raw['Year'] == '2022'
+    assert row[columns.index('Year')] == 2022
+
+
+class RecordingSink:
+    def __init__(self):
+        self.rows = []
+        self.dropped = None
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def close(self, drop=None):
+        self.dropped = drop
+        return {'sink': 'recording', 'path': 'memory', 'rows': len(self.rows), 'row_groups': 1}
+
+
+def _reject(process, row):
+    process._fieldnames = list(plan_columns(process._schema()))
+    process._on_db_reject(source_row(row, dict(zip(process._fieldnames, row))), 'bad')
+
+
+def test_sinks_receive_each_chunk_after_the_loader_without_rejected_rows(tmp_path):
+    process = _process(tmp_path)
+    sink = RecordingSink()
+    chunks = [_rows(process, 0, 10), _rows(process, 10, 10)]
+    for chunk in process._feed_sinks(chunks, [sink]):
+        # The loader writes the chunk (rejecting one row) before the sink sees any of it
+        assert len(sink.rows) == (9 if chunk is chunks[1] else 0)
+        _reject(process, chunk[4])
+        if chunk is chunks[0]:
+            process._divert_rejected()
+    assert sink.rows == [row for n, row in enumerate(chunks[0] + chunks[1]) if n not in (4, 14)]
+    process._divert_rejected()
+    process._close_sinks([sink])
+    assert sink.dropped is None
+
+
+def test_rows_rejected_after_reaching_the_sinks_are_dropped_on_close(tmp_path):
+    process = _process(tmp_path, connections=2)
+    sink = RecordingSink()
+    chunk = _rows(process, 0, 10)
+    list(process._feed_sinks([chunk], [sink]))
+    _reject(process, chunk[4])
+    process._divert_rejected()
+    process._close_sinks([sink])
+    assert sink.dropped == (process.config['unique_fields'], {_key(process, 4): 1})
+
+
+def _process_without_unique_fields(tmp_path):
+    config = load_config()
+    config['unique_fields'] = []
+    config['load_batches']['on_db_error'] = 'bisect'
+    return ETLProcess(str(tmp_path / 'survey.csv'), config)
+
+
+def _plain_rows(process, start, count):
+    columns = plan_columns(process._schema())
+    return RowBatch(columns, [tuple(f'{column}-{n}' for column in columns) for n in range(start, start + count)])
+
+
+def _load_rejecting(process, rejected, sink):
+    # In-memory load whose database rejects the rows at the given positions
+    def load_chunks(chunks):
+        rows = [row for chunk in chunks for row in chunk]
+        for n in rejected:
+            _reject(process, rows[n])
+        return len(rows) - len(rejected)
+
+    process._load_chunks = load_chunks
+    process._open_sinks = lambda: [sink]
+    process.valid_count = len(process.valid_rows)
+    process.load()
+
+
+def test_bisect_without_unique_fields_leaves_out_one_identical_row_per_rejection(tmp_path):
+    process = _process_without_unique_fields(tmp_path)
+    row, other = _plain_rows(process, 0, 2)
+    process.valid_rows = RowBatch(plan_columns(process._schema()), [row, row, other])
+    sink = RecordingSink()
+    _load_rejecting(process, [1], sink)
+    assert sink.rows == [row, other]
+    assert sink.dropped is None
+    assert process.valid_count == 2
+    assert [r[ERROR_COLUMN] for r in _read_errors(process.error_file)] == ['Rejected by database: bad']
+
+
+def test_bisect_without_unique_fields_on_the_chunked_path(tmp_path):
+    process = _process_without_unique_fields(tmp_path)
+    sink = RecordingSink()
+    chunks = [_plain_rows(process, 0, 5), _plain_rows(process, 5, 5)]
+    for chunk in process._feed_sinks(chunks, [sink]):
+        _reject(process, chunk[0])
+    process._divert_rejected()
+    assert sink.rows == chunks[0][1:] + chunks[1][1:]
+
+
+def test_rejected_rows_replace_an_error_file_left_by_an_earlier_run(tmp_path):
+    process = _process_without_unique_fields(tmp_path)
+    (tmp_path / 'survey_errors.csv').write_text('old,etl_errors\nstale,Invalid\n', encoding='utf-8')
+    process.valid_rows = _plain_rows(process, 0, 3)
+    _load_rejecting(process, [2], RecordingSink())
+    errors = _read_errors(process.error_file)
+    assert process.error_file == str(tmp_path / 'survey_errors.csv')
+    assert [r[ERROR_COLUMN] for r in errors] == ['Rejected by database: bad']
+    assert errors[0]['Year'] == 'Year-2'
@@ -0,0 +1,96 @@
+import csv
+import random
+import shutil
+from datetime import date
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.utils.csv_utils import CsvSplitWriter
+from src.validator.csv_validator import validate_csv
+from src.validator.thresholds import AbortThresholds, ValidationAborted
+
+SCHEMA = {
+    'a': {'type': int, 'required': True, 'max_length': 5},
+    'b': {'type': float},
+    'c': {'type': str, 'max_length': 4, 'required': True, 'cardinality': 'low'},
+    'd': {'type': date},
+    'e': {'type': int, 'min': 0, 'max': 50},
+    'f': {'type': str, 'pattern': '[A-Z]+'},
+    'g': {'type': float, 'required': True, 'cardinality': 'high'},
+    'missing': {'type': str},
+}
+# The header repeats a, so the later column wins; c2 is not in the schema
+HEADER = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'c2', 'a']
+# Literals the vectorised parsers must treat exactly as int(), float() and the str rules do
+ODD_CELLS = [
+    '', ' ', '1', '+1', '-0', '007', '12', ' 12', '12 ', '1_0', '١٢', '1.5', '.5', '5.', '1e5', '1e', 'e5', '-.5e-3',
+    'nan', 'inf', '-Infinity', '1e400', '123456789012345678', '1234567890123456789', '99999999999999999999', 'abc',
+    'ABC', 'Ab', 'héé', 'x\x00', '\x1c5', '5\x1f', 'tab\t', 'a\nb', '2024-01-31', '2024-02-30', ' 2024-01-01',
+    'AAAAA', '+', '-', '.', '1.2.3', '1e+5', '1E-5', '0x10', '12345', '123456', ' 1 2 ', ' 5', '5 ',
+]
+
+
+def _write_fuzzed_csv(path, rows, rnd):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for _ in range(rows):
+            if rnd.random() < 0.01:
+                f.write('\n')
+                continue
+            row = [str(rnd.randint(0, 99999)), repr(rnd.uniform(-1e3, 1e3)), rnd.choice(['X', 'Y', 'Z', 'WXYZ']),
+                   '2024-01-31', str(rnd.randint(0, 50)), rnd.choice(['ABC', 'Q']), repr(rnd.uniform(-1e9, 1e9)),
+                   'c2', str(rnd.randint(0, 99999))]
+            row = [rnd.choice(ODD_CELLS) if rnd.random() < 0.03 else cell for cell in row]
+            if rnd.random() < 0.02:
+                row = row[:rnd.randint(0, len(row))]
+            if rnd.random() < 0.02:
+                row.append('extra')
+            writer.writerow(row)
+
+
+def _validate(tmp_path, source, backend, workers=1, batch_rows=None):
+    path = tmp_path / f'{backend}_{workers}_{batch_rows}.csv'
+    shutil.copy(source, path)
+    sink = CsvSplitWriter(str(path), sidecars=True)
+    valid, errors = validate_csv(str(path), SCHEMA, ['a', 'c'], workers=workers, sink=sink,
+                                 backend=backend, batch_rows=batch_rows)
+    sink.close()
+    outputs = []
+    for output in (sink.valid_file, sink.error_file):
+        try:
+            with open(output, 'rb') as f:
+                outputs.append(f.read())
+        except FileNotFoundError:
+            outputs.append(None)
+    # repr tells 1 from 1.0 and keeps NaN comparable
+    return [tuple(map(repr, row)) for row in valid], errors, outputs
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_numpy_backend_matches_python_backend(tmp_path, seed):
+    rnd = random.Random(seed)
+    source = tmp_path / 'fuzzed.csv'
+    _write_fuzzed_csv(source, rnd.randint(0, 3000), rnd)
+    expected = _validate(tmp_path, source, 'python')
+    assert _validate(tmp_path, source, 'numpy') == expected
+    assert _validate(tmp_path, source, 'numpy', batch_rows=700) == expected
+
+
+def test_numpy_backend_matches_python_backend_with_workers(tmp_path):
+    source = tmp_path / 'fuzzed.csv'
+    _write_fuzzed_csv(source, 2000, random.Random(5))
+    assert _validate(tmp_path, source, 'numpy', workers=2, batch_rows=300) == _validate(tmp_path, source, 'python')
+
+
+def test_thresholds_abort_at_the_same_row(tmp_path):
+    source = tmp_path / 'fuzzed.csv'
+    _write_fuzzed_csv(source, 3000, random.Random(6))
+    messages = []
+    for backend in ('python', 'numpy'):
+        with pytest.raises(ValidationAborted) as aborted:
+            validate_csv(str(source), SCHEMA, ['a'], backend=backend, thresholds=AbortThresholds(max_errors=50))
+        messages.append(str(aborted.value))
+    assert messages[0] == messages[1]
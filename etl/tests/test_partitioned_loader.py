@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from src.loader import partitioned_loader
+from src.utils.rows import RowBatch
+
+COLUMNS = ('Year', 'Value')
+
+
+def _load(monkeypatch, load_fn, chunks, connections=2, **kwargs):
+    """Run load_partitioned with load_fn as every partition's loader; fail instead of hanging."""
+    monkeypatch.setattr(partitioned_loader, 'get_pool', lambda db_config, size: None)
+    monkeypatch.setattr(partitioned_loader, 'load_chunks_to_postgres',
+                        lambda partition_chunks, *args, **kw: load_fn(partition_chunks))
+    outcome = {}
+
+    def run():
+        try:
+            outcome['results'] = partitioned_loader.load_partitioned(
+                chunks, {}, 'etl.t', connections, unique_fields=['Year'], **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), 'load_partitioned did not return'
+    return outcome
+
+
+def _chunks(count=3, rows=50):
+    for c in range(count):
+        yield RowBatch(COLUMNS, [(c * rows + i, 1.0) for i in range(rows)])
+
+
+def test_all_partitions_commit(monkeypatch):
+    outcome = _load(monkeypatch, lambda chunks: sum(len(rows) for rows in chunks), _chunks())
+    results = outcome['results']
+    assert [r['status'] for r in results] == ['committed', 'committed']
+    assert sum(r['rows'] for r in results) == 150
+
+
+def test_failure_after_draining_does_not_hang(monkeypatch):
+    def load_fn(chunks):
+        for _ in chunks:
+            pass
+        raise RuntimeError('commit failed')
+
+    outcome = _load(monkeypatch, load_fn, _chunks())
+    results = outcome['results']
+    assert [r['status'] for r in results] == ['failed', 'failed']
+    assert all(r['error'] == 'commit failed' for r in results)
+
+
+def test_failure_mid_stream_keeps_draining(monkeypatch):
+    def load_fn(chunks):
+        next(chunks)
+        raise RuntimeError('rejected')
+
+    outcome = _load(monkeypatch, load_fn, _chunks(count=20), queue_size=1)
+    assert [r['status'] for r in outcome['results']] == ['failed', 'failed']
+
+
+def test_stream_error_aborts_every_partition(monkeypatch):
+    def chunks():
+        yield from _chunks(count=2)
+        raise ValueError('bad input')
+
+    outcome = _load(monkeypatch, lambda partition_chunks: sum(len(rows) for rows in partition_chunks), chunks())
+    assert isinstance(outcome['error'], ValueError)
+
+
+@pytest.mark.parametrize('connections', [1, 3])
+def test_rows_keep_their_partition(monkeypatch, connections):
+    seen = []
+    lock = threading.Lock()
+
+    def load_fn(chunks):
+        years = {row[0] for rows in chunks for row in rows}
+        with lock:
+            seen.append(years)
+
+    _load(monkeypatch, load_fn, _chunks(), connections=connections)
+    assert sum(len(years) for years in seen) == 150
+    assert len(set().union(*seen)) == 150
@@ -0,0 +1,134 @@
+import pytest
+
+from src.loader import postgres_loader
+from src.utils.db_utils import write_checkpoint
+from src.utils.rows import RowBatch
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.log.append(query.split(' (')[0] if query.startswith('CREATE') else query)
+
+    def fetchone(self):
+        return (None,)
+
+
+class FakeConn:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        self.log.append('COMMIT')
+
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConn()
+
+    def write_rows(conn, table, rows, commit=True):
+        conn.log.append(('write', len(rows)))
+
+    monkeypatch.setattr(postgres_loader, 'open_connection', lambda db_config, pool=None: conn)
+    monkeypatch.setattr(postgres_loader, 'release_connection', lambda conn, pool=None, broken=False: None)
+    monkeypatch.setitem(postgres_loader.LOADERS, 'insert', write_rows)
+    return conn
+
+
+def _chunks(sizes):
+    for size in sizes:
+        yield [(i,) for i in range(size)]
+
+
+def test_checkpoint_is_written_before_each_commit(conn):
+    before = lambda conn, total: conn.log.append(('checkpoint', total))
+    after = lambda total: conn.log.append(('recorded', total))
+    written = postgres_loader.load_chunks_checkpointed(
+        _chunks([4, 4, 3]), {}, 'etl.t', commit_every=8, before_commit=before, on_commit=after)
+    assert written == 11
+    assert conn.log == [
+        ('write', 4), ('write', 4), ('checkpoint', 8), 'COMMIT', ('recorded', 8),
+        ('write', 3), ('checkpoint', 11), 'COMMIT', ('recorded', 11),
+    ]
+
+
+def test_resume_counts_skipped_rows_in_checkpoint(conn):
+    before = lambda conn, total: conn.log.append(('checkpoint', total))
+    written = postgres_loader.load_chunks_checkpointed(
+        _chunks([4, 4, 3]), {}, 'etl.t', commit_every=8, skip_rows=6, before_commit=before)
+    assert written == 5
+    assert conn.log == [('write', 2), ('write', 3), ('checkpoint', 11), 'COMMIT']
+
+
+def test_failed_load_does_not_commit_checkpoint(conn):
+    def before(conn, total):
+        raise RuntimeError('control table unavailable')
+
+    with pytest.raises(RuntimeError):
+        postgres_loader.load_chunks_checkpointed(_chunks([4]), {}, 'etl.t', before_commit=before)
+    assert conn.log == [('write', 4), 'ROLLBACK']
+
+
+def test_write_checkpoint_upserts_in_open_transaction():
+    conn = FakeConn()
+    write_checkpoint(conn, 'etl.etl_load_checkpoints', 'survey.csv', 'abc', 10)
+    assert conn.log[0] == 'CREATE TABLE IF NOT EXISTS etl.etl_load_checkpoints'
+    assert conn.log[1].startswith('INSERT INTO etl.etl_load_checkpoints')
+    assert 'COMMIT' not in conn.log
+
+
+def test_bisect_releases_each_rolled_back_savepoint():
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = FakeConn()
+    written = []
+    rejected = []
+
+    def write_rows(conn, table, rows, commit=True):
+        if any(row[0] < 0 for row in rows):
+            raise psycopg2.DataError('numeric field overflow')
+        written.extend(rows)
+
+    write = postgres_loader.bisecting_writer(write_rows, lambda row, message: rejected.append(row), batch_size=8)
+    rows = [(-i if i in (3, 11, 12) else i,) for i in range(16)]
+    write(conn, 'etl.t', rows)
+    assert sorted(rejected) == [(-12,), (-11,), (-3,)]
+    assert len(written) == 13
+    depth = deepest = 0
+    for statement in conn.log:
+        if statement.startswith('SAVEPOINT'):
+            depth += 1
+        elif statement.startswith('RELEASE'):
+            depth -= 1
+        deepest = max(deepest, depth)
+    assert depth == 0
+    assert deepest == 1
+
+
+def test_upsert_truncates_and_loads_the_staging_table(conn, monkeypatch):
+    merged = []
+
+    def merge(conn, staging, table, columns, unique_fields):
+        merged.append(staging)
+        return 5, 1
+
+    monkeypatch.setattr(postgres_loader, 'merge_staging', merge)
+    chunks = (RowBatch(('id',), chunk) for chunk in _chunks([4, 3]))
+    counts = postgres_loader.upsert_chunks_to_postgres(chunks, {}, 'etl.t', ['id'], staging_table='etl.t_staging')
+    assert conn.log[0] == 'CREATE UNLOGGED TABLE IF NOT EXISTS etl.t_staging'
+    assert conn.log[1:] == [('write', 4), ('write', 3), 'COMMIT']
+    assert merged == ['etl.t_staging']
+    assert counts == {'staged': 7, 'inserted': 5, 'updated': 1, 'unchanged': 1}
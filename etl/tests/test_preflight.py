@@ -0,0 +1,43 @@
+import os
+import sys
+
+from src.config.schema_config import load_config
+from src.validator.preflight import UNDECODABLE_ERROR, preflight_csv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from generate_survey_data import generate_csv  # noqa: E402
+
+
+def _survey(tmp_path, rows, bad_from=None, bad_bytes=None):
+    path = tmp_path / 'survey.csv'
+    generate_csv(str(path), rows)
+    lines = path.read_bytes().splitlines(keepends=True)
+    if bad_from is not None:
+        lines[bad_from + 1:] = [b'year' + line[4:] for line in lines[bad_from + 1:]]
+    if bad_bytes is not None:
+        lines[bad_bytes + 1] = lines[bad_bytes + 1].replace(b'Level', b'Lev\xffel', 1)
+    path.write_bytes(b''.join(lines))
+    return str(path)
+
+
+def _preflight(path, **kwargs):
+    return preflight_csv(path, load_config()['schema'], seed=1, **kwargs)
+
+
+def test_small_file_is_covered_once(tmp_path):
+    report = _preflight(_survey(tmp_path, 300))
+    assert report['method'] == 'stratified'
+    assert report['rows'] == 300
+    assert report['errors'] == 0
+
+
+def test_bad_tail_of_small_file_is_sampled(tmp_path):
+    report = _preflight(_survey(tmp_path, 20000, bad_from=18000))
+    assert report['rows'] < 20000
+    assert report['error_rate'] > 0.05
+
+
+def test_undecodable_record_counts_as_invalid(tmp_path):
+    report = _preflight(_survey(tmp_path, 300, bad_bytes=150))
+    assert report['errors'] == 1
+    assert report['top_errors'] == [(UNDECODABLE_ERROR, 1)]
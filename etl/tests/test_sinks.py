@@ -0,0 +1,51 @@
+from collections import Counter
+from datetime import date
+
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from src.loader.sinks import ParquetSink
+from src.utils.rows import RowBatch
+
+SCHEMA = {
+    'id': {'type': int, 'required': True},
+    'region': {'type': str, 'cardinality': 'low'},
+    'day': {'type': date},
+}
+
+
+def _rows(start, count):
+    return RowBatch(('id', 'region', 'day'),
+                    [(n, f'region-{n % 3}', date(2024, 1, 1 + n % 28)) for n in range(start, start + count)])
+
+
+def test_rows_are_written_in_row_groups(tmp_path):
+    path = str(tmp_path / 'survey.parquet')
+    sink = ParquetSink(path, SCHEMA, row_group_size=40)
+    for start in range(0, 100, 25):
+        sink.write(_rows(start, 25))
+    result = sink.close()
+    assert (result['rows'], result['row_groups']) == (100, 3)
+    assert pq.ParquetFile(path).metadata.num_row_groups == 3
+    table = pq.read_table(path)
+    assert [tuple(row.values()) for row in table.to_pylist()] == list(_rows(0, 100))
+    assert str(table.schema.field('region').type) == 'dictionary<values=string, indices=int32, ordered=0>'
+
+
+def test_close_drops_rows_written_before_they_were_rejected(tmp_path):
+    path = str(tmp_path / 'survey.parquet')
+    sink = ParquetSink(path, SCHEMA, row_group_size=40)
+    sink.write(_rows(0, 100))
+    result = sink.close((['id'], Counter([(3,), (41,), (99,)])))
+    assert result['rows'] == 97
+    assert not (tmp_path / 'survey.parquet.part').exists()
+    ids = pq.read_table(path).column('id').to_pylist()
+    assert ids == [n for n in range(100) if n not in (3, 41, 99)]
+
+
+def test_abort_leaves_no_output(tmp_path):
+    sink = ParquetSink(str(tmp_path / 'survey.parquet'), SCHEMA)
+    sink.write(_rows(0, 10))
+    sink.abort()
+    assert list(tmp_path.iterdir()) == []
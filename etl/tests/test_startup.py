@@ -0,0 +1,18 @@
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from bench_startup import HEAVY_MODULES, IMPORT_ONLY, PROBE, run_probe  # noqa: E402
+
+# Generous, so slow CI machines pass while an eager heavy import still shows up
+STARTUP_BUDGET_MS = 1000
+
+
+def test_importing_main_leaves_heavy_modules_unimported():
+    assert run_probe(IMPORT_ONLY % (HEAVY_MODULES,)) == []
+
+
+def test_import_time_is_within_budget():
+    import_ms = statistics.median(run_probe(PROBE)['import_ms'] for _ in range(3))
+    assert import_ms < STARTUP_BUDGET_MS
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+
+import pytest
+import yaml
+
+from src import worker as worker_module
+from src.config.schema_config import DEFAULT_CONFIG_PATH
+from src.utils import db_utils, email_utils
+from src.utils.metrics import RunMetrics
+
+
+class FakePool:
+    closed = False
+
+    def closeall(self):
+        self.closed = True
+
+
+def _fake_run(csv_file, config, plan, pool, key_index, options):
+    return {'file': csv_file, 'status': 'ok', 'valid': 10, 'errors': 1, 'seconds': 0.01, 'error': None,
+            'outputs': [], 'metrics': RunMetrics(source=csv_file)}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = tmp_path / 'spool'
+    for name in ('processing', 'done', 'failed'):
+        (spool / name).mkdir(parents=True)
+    return spool
+
+
+@pytest.fixture
+def make_worker(tmp_path, spool, monkeypatch):
+    monkeypatch.setattr(db_utils, 'get_pool', lambda db_config, size: FakePool())
+    monkeypatch.setattr(worker_module, '_run_file', _fake_run)
+    with open(DEFAULT_CONFIG_PATH, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    workers = []
+
+    def make_worker(**kwargs):
+        config['load_mode'] = kwargs.pop('load_mode', 'append')
+        config['worker'].update(settle_seconds=0, **kwargs.pop('worker', {}))
+        config['email'].update(kwargs.pop('email', {}))
+        path = tmp_path / 'config.yml'
+        path.write_text(yaml.safe_dump(config), encoding='utf-8')
+        worker = worker_module.EtlWorker(str(path), spool_dir=str(spool), **kwargs)
+        workers.append(worker)
+        return worker
+
+    yield make_worker
+    for worker in workers:
+        worker.close()
+
+
+def test_finished_job_moves_only_its_own_file_and_outputs(spool, make_worker):
+    worker = make_worker()
+    processing = spool / 'processing'
+    for name in ('a.csv', 'a_errors.csv', 'a.parquet', 'a.csv.gz', 'a_valid.csv.gz', 'ab.csv'):
+        (processing / name).write_text('x')
+    worker._finish_spooled({'file': str(processing / 'a.csv'), 'status': 'ok',
+                            'outputs': [str(processing / 'a.parquet')]})
+    assert sorted(os.listdir(spool / 'done')) == ['a.csv', 'a.parquet', 'a_errors.csv']
+    assert sorted(os.listdir(processing)) == ['a.csv.gz', 'a_valid.csv.gz', 'ab.csv']
+
+
+def test_file_sharing_a_stem_waits_for_the_running_job(spool, make_worker, monkeypatch):
+    worker = make_worker()
+    started = []
+    monkeypatch.setattr(worker, '_start', lambda csv_file, on_done: started.append(csv_file) or csv_file)
+    (spool / 'a.csv').write_text('x')
+    (spool / 'a.csv.gz').write_text('x')
+    assert worker.scan_spool() == 1
+    assert worker.scan_spool() == 0
+    worker._slots.release()
+    worker._finish_spooled({'file': started[0], 'status': 'ok'})
+    assert worker.scan_spool() == 1
+    assert {os.path.basename(path) for path in started} == {'a.csv', 'a.csv.gz'}
+
+
+def test_error_report_wait_is_bounded(tmp_path, make_worker, monkeypatch):
+    waits = []
+    monkeypatch.setattr(email_utils, 'flush_deliveries', lambda timeout=None: waits.append(timeout) or False)
+    worker = make_worker(worker={'email_wait_seconds': 5}, email={'enabled': True})
+    worker._slots.acquire()  # held by the caller, as submit() does
+    result = worker._run_job(str(tmp_path / 'a.csv'), time.perf_counter(), None)
+    assert waits == [5]
+    assert result['status'] == 'ok'
+
+
+def test_job_metrics_are_written_to_the_reports(tmp_path, make_worker):
+    json_path = tmp_path / 'metrics.json'
+    prometheus_path = tmp_path / 'metrics.prom'
+    worker = make_worker(metrics_json=str(json_path), metrics_prometheus=str(prometheus_path))
+    for name in ('a.csv', 'b.csv'):
+        worker._slots.acquire()
+        result = worker._run_job(str(tmp_path / name), time.perf_counter(), None)
+        assert 'metrics' not in result
+    runs = json.loads(json_path.read_text())['runs']
+    assert [os.path.basename(run['source']) for run in runs] == ['a.csv', 'b.csv']
+    assert 'file="b.csv"' in prometheus_path.read_text()
+
+
+def test_job_files_get_a_suffix_instead_of_replacing_earlier_ones(spool, make_worker):
+    worker = make_worker()
+    processing = spool / 'processing'
+    (spool / 'done' / 'a.csv').write_text('earlier')
+    (spool / 'done' / 'a-1_errors.csv').write_text('earlier')
+    for name in ('a.csv', 'a_errors.csv'):
+        (processing / name).write_text('latest')
+    result = {'file': str(processing / 'a.csv'), 'status': 'ok'}
+    worker._finish_spooled(result)
+    assert result['file'] == str(spool / 'done' / 'a-2.csv')
+    assert sorted(os.listdir(spool / 'done')) == ['a-1_errors.csv', 'a-2.csv', 'a-2_errors.csv', 'a.csv']
+    assert (spool / 'done' / 'a.csv').read_text() == 'earlier'
+
+
+def test_reload_mode_is_refused_at_start_and_on_config_reload(tmp_path, make_worker):
+    with pytest.raises(ValueError, match='reload'):
+        make_worker(load_mode='reload')
+    worker = make_worker(load_mode='append')
+    generation = worker._generation
+    config_path = tmp_path / 'config.yml'
+    config = yaml.safe_load(config_path.read_text(encoding='utf-8'))
+    config['load_mode'] = 'reload'
+    config_path.write_text(yaml.safe_dump(config), encoding='utf-8')
+    os.utime(config_path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert not worker.check_config()
+    assert 'reload' in worker.config_error
+    assert worker._generation is generation
@@ -0,0 +1,77 @@
+"""Benchmark: validate_csv throughput of the python and numpy validation backends.
+
+Runs both backends over the synthetic survey file and over a wide numeric
+file (--columns int/float columns), checks that they return the same valid
+and error rows, and prints rows/sec for each. Needs numpy.
+
+Run from the etl directory:
+    python tools/bench_backends.py --rows 200000 --columns 40
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from src.config.schema_config import load_config
+from src.validator.csv_validator import validate_csv
+from generate_survey_data import generate_csv
+
+
+def generate_wide_csv(path, rows, columns, seed=0):
+    """A CSV of alternating int and float columns, with a unique id first; returns its schema."""
+    rng = random.Random(seed)
+    schema = {'id': {'type': int, 'required': True}}
+    for i in range(columns):
+        schema[f'n{i}'] = {'type': int if i % 2 else float, 'required': i % 3 == 0, 'max_length': 20}
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(schema))
+        for row in range(rows):
+            writer.writerow([row] + [rng.randint(-10 ** 6, 10 ** 6) if i % 2 else round(rng.uniform(-1e4, 1e4), 3)
+                                     for i in range(columns)])
+    return schema
+
+
+def time_backend(path, schema, unique_fields, backend):
+    start = time.perf_counter()
+    valid_rows, error_rows = validate_csv(path, schema, unique_fields, backend=backend)
+    return time.perf_counter() - start, valid_rows, error_rows
+
+
+def compare(name, path, schema, unique_fields, rows):
+    seconds, valid_rows, error_rows = time_backend(path, schema, unique_fields, 'python')
+    numpy_seconds, numpy_valid, numpy_errors = time_backend(path, schema, unique_fields, 'numpy')
+    same = list(valid_rows) == list(numpy_valid) and error_rows == numpy_errors
+    print(f'{name}:')
+    print(f'  python rows/sec: {rows / seconds:,.0f}')
+    print(f'  numpy rows/sec:  {rows / numpy_seconds:,.0f}')
+    print(f'  speedup:         {seconds / numpy_seconds:.2f}x')
+    print(f'  identical:       {same}')
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the python and numpy validation backends')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--columns', type=int, default=40, help='Numeric columns in the wide file (default: 40)')
+    args = parser.parse_args()
+
+    config = load_config()
+    with tempfile.TemporaryDirectory() as tmp:
+        survey = os.path.join(tmp, 'survey.csv')
+        generate_csv(survey, args.rows, config)
+        ok = compare('survey', survey, config['schema'], config['unique_fields'], args.rows)
+        wide = os.path.join(tmp, 'wide.csv')
+        schema = generate_wide_csv(wide, args.rows, args.columns)
+        ok = compare(f'wide numeric ({args.columns} columns)', wide, schema, ['id'], args.rows) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""ETL benchmark suite: throughput and peak memory per stage on synthetic data.
+
+Generates schema-shaped CSVs (see generate_survey_data.py) and times each
+stage in a fresh interpreter so peak RSS is per stage:
+
+    validate      validate_csv on the whole file
+    split         ETLProcess.validate(), i.e. validation plus the valid/error split
+    write_errors  ETLProcess.write_errors() over the error rows (report/email
+                  step with email disabled; the split itself is in `split`)
+    load          load_chunks_to_postgres against a fake connection that drains
+                  every COPY buffer, so only client-side load cost is measured
+
+Results go to JSON; pass --compare to diff against an earlier run and fail
+on throughput regressions. Run from the etl directory:
+
+    python tools/bench_etl.py --sizes 10k,1m --output bench.json
+    python tools/bench_etl.py --sizes 10k --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ETL_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ['validate', 'split', 'write_errors', 'load']
+SIZES = {'10k': 10000, '100k': 100000, '1m': 1000000, '10m': 10000000}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, query, buf, size=8192):
+        self.conn.round_trips += 1
+        for block in iter(lambda: buf.read(1024 * 1024), ''):
+            self.conn.bytes_sent += len(block)
+
+    def execute(self, query, params=None):
+        self.conn.round_trips += 1
+
+
+class FakeConnection:
+    def __init__(self):
+        self.round_trips = 0
+        self.bytes_sent = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.round_trips += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _run_stage(stage, csv_path, chunk_size):
+    from src.config.schema_config import load_config
+    config = load_config()
+    config['email'] = {'enabled': False}
+    rows = 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    extra = {}
+    if stage == 'validate':
+        from src.validator.csv_validator import validate_csv
+        valid, errors = validate_csv(csv_path, config['schema'], config['unique_fields'])
+        rows = len(valid) + len(errors)
+    elif stage in ('split', 'write_errors'):
+        from src.main import ETLProcess
+        etl = ETLProcess(csv_path, config, sidecars=True)
+        etl.validate()
+        rows = etl.valid_count + len(etl.error_rows)
+        if stage == 'write_errors':
+            rows = len(etl.error_rows)
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            etl.write_errors()
+    elif stage == 'load':
+        from src.validator.csv_validator import validate_csv_chunks
+        from src.loader import postgres_loader
+        conn = FakeConnection()
+        postgres_loader.open_connection = lambda db_config, pool=None: conn
+        postgres_loader.release_connection = lambda c, pool=None, broken=False: None
+        chunks = list(validate_csv_chunks(csv_path, config['schema'], config['unique_fields'], chunk_size))
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        rows = postgres_loader.load_chunks_to_postgres(
+            (valid for valid, _ in chunks), config['db_config'], config['table_name'], loader='copy')
+        extra = {'round_trips': conn.round_trips, 'bytes_sent': conn.bytes_sent}
+    seconds = time.perf_counter() - start
+    result = {
+        'stage': stage,
+        'rows': rows,
+        'seconds': seconds,
+        'cpu_seconds': time.process_time() - cpu_start,
+        'rows_per_sec': rows / seconds if seconds else None,
+        'bytes_per_sec': os.path.getsize(csv_path) / seconds if seconds and stage != 'load' else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    result.update(extra)
+    return result
+
+
+def run_stage_subprocess(stage, csv_path, chunk_size):
+    cmd = [sys.executable, os.path.abspath(__file__), '--stage', stage, '--csv', csv_path,
+           '--chunk-size', str(chunk_size)]
+    out = subprocess.run(cmd, cwd=ETL_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ETL_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r['size'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')})")
+    for r in results:
+        before = old.get((r['size'], r['stage']))
+        if not before or not before.get('rows_per_sec') or not r.get('rows_per_sec'):
+            continue
+        change = r['rows_per_sec'] / before['rows_per_sec'] - 1
+        print(f"  {r['size']:>5} {r['stage']:<13} {change:+.1%} rows/sec")
+        if change < -tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ETL stages on synthetic data')
+    parser.add_argument('--sizes', default='10k', help=f"Comma-separated sizes: {', '.join(SIZES)} or row counts")
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--dup-rate', type=float, default=0.005)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    parser.add_argument('--compare', default=None, help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed rows/sec drop before failing')
+    parser.add_argument('--stage', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--csv', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        # Child process: run one stage and print its result
+        print(json.dumps(_run_stage(args.stage, args.csv, args.chunk_size)))
+        return
+
+    from generate_survey_data import generate_csv
+    stages = [s for s in args.stages.split(',') if s]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_name in args.sizes.split(','):
+            rows = SIZES.get(size_name.lower()) or int(size_name)
+            source = os.path.join(tmp, f'survey_{size_name}.csv')
+            planted = generate_csv(source, rows, error_rate=args.error_rate, dup_rate=args.dup_rate)
+            for stage in stages:
+                # Stages may write sidecars, so each one gets a fresh copy
+                csv_path = os.path.join(tmp, f'{stage}_{size_name}.csv')
+                shutil.copyfile(source, csv_path)
+                result = run_stage_subprocess(stage, csv_path, args.chunk_size)
+                result.update(size=size_name, planted=planted)
+                results.append(result)
+                rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else 'n/a'
+                rate = f"{result['rows_per_sec']:,.0f}" if result['rows_per_sec'] else 'n/a'
+                print(f"{size_name:>5} {stage:<13} {result['seconds']:8.2f}s  {rate:>12} rows/sec  peak RSS {rss}")
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'Results written to {args.output}')
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f'FAIL: {len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Memory comparison: validated rows as dicts (old) vs a RowBatch of tuples.
+
+For each representation, in a fresh interpreter, validates a synthetic file
+into memory and then builds what the INSERT loader sends to execute_values.
+Reports the Python heap held by the rows and the peak while loading, as
+measured by tracemalloc. Run from the etl directory:
+
+    python tools/bench_row_memory.py --rows 1000000
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ETL_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ['dicts', 'tuples']
+
+
+def _measure(mode, csv_path):
+    from src.config.schema_config import load_config
+    from src.utils.rows import RowBatch, row_columns, row_values
+    from src.validator.csv_validator import compile_schema, plan_columns, validate_row, validate_values
+    plan = compile_schema(load_config()['schema'])
+    tracemalloc.start()
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        if mode == 'dicts':
+            rows = []
+            for raw in csv.DictReader(f):
+                validated, errors = validate_row(raw, plan)
+                if not errors:
+                    rows.append(validated)
+        else:
+            rows = RowBatch(plan_columns(plan))
+            for raw in csv.DictReader(f):
+                values, errors = validate_values(raw, plan)
+                if not errors:
+                    rows.append(values)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    # What insert_rows hands to execute_values: dict rows are copied into lists first
+    if mode == 'dicts':
+        columns = list(rows[0].keys())
+        values = [[row[col] for col in columns] for row in rows]
+    else:
+        values = row_values(rows, row_columns(rows))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'mode': mode, 'rows': len(values), 'held_mb': held / 2 ** 20, 'load_peak_mb': peak / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory of dict rows and tuple row batches')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--mode', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--csv', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: measure one representation
+        print(json.dumps(_measure(args.mode, args.csv)))
+        return
+
+    from generate_survey_data import generate_csv
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'survey.csv')
+        generate_csv(path, args.rows)
+        results = []
+        for mode in MODES:
+            cmd = [sys.executable, os.path.abspath(__file__), '--mode', mode, '--csv', path]
+            out = subprocess.run(cmd, cwd=ETL_DIR, capture_output=True, text=True, check=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'Mode':<8} {'Held MB':>10} {'Load peak MB':>13}  ({results[0]['rows']} valid rows)")
+    for r in results:
+        print(f"{r['mode']:<8} {r['held_mb']:>10.1f} {r['load_peak_mb']:>13.1f}")
+    before, after = results
+    print(f"tuples hold {1 - after['held_mb'] / before['held_mb']:.0%} less; "
+          f"load peak {1 - after['load_peak_mb'] / before['load_peak_mb']:.0%} lower")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Startup-time check: import the ETL entry point in fresh interpreters.
+
+Fails (exit 1) if the median import time exceeds --max-ms or if a heavy
+dependency is imported before any work starts. Run from the etl directory:
+    python tools/bench_startup.py --runs 10 --max-ms 150
+tests/test_startup.py runs the same probes with a looser budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ETL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Must not be imported just by importing src.main
+HEAVY_MODULES = ['yaml', 'psycopg2', 'smtplib', 'multiprocessing', 'sqlite3']
+
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+from src.config.schema_config import load_config
+load_config()
+configured = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'config_ms': (configured - imported) * 1000,
+}))
+'''
+
+IMPORT_ONLY = '''
+import json, sys
+import src.main
+print(json.dumps([m for m in %r if m in sys.modules]))
+'''
+
+
+def run_probe(code):
+    out = subprocess.run([sys.executable, '-c', code], cwd=ETL_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure ETL startup time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail if median import time exceeds this')
+    args = parser.parse_args()
+
+    heavy = run_probe(IMPORT_ONLY % (HEAVY_MODULES,))
+    samples = [run_probe(PROBE) for _ in range(args.runs)]
+    import_ms = statistics.median(s['import_ms'] for s in samples)
+    config_ms = statistics.median(s['config_ms'] for s in samples)
+    print(f'import src.main: {import_ms:.1f} ms (median of {args.runs})')
+    print(f'load_config:     {config_ms:.1f} ms')
+    print(f'heavy modules imported at startup: {heavy or "none"}')
+
+    failed = False
+    if heavy:
+        print('FAIL: heavy modules must be imported lazily')
+        failed = True
+    if args.max_ms is not None and import_ms > args.max_ms:
+        print(f'FAIL: startup {import_ms:.1f} ms exceeds budget {args.max_ms} ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Micro-benchmark: per-row validation throughput, legacy dict rules vs compiled plan.
+
+The compiled path is validate_values, which returns tuples in column order.
+
+Run from the etl directory:
+    python tools/bench_validator.py --rows 200000
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from src.config.schema_config import load_config
+from src.validator.csv_validator import compile_schema, validate_values
+from generate_survey_data import generate_csv
+
+
+def legacy_validate_row(row, schema):
+    # Baseline: the pre-compilation validate_row, kept verbatim for comparison
+    errors = []
+    validated = {}
+    for col, rules in schema.items():
+        col_type = rules['type']
+        required = rules['required']
+        max_length = rules.get('max_length')
+        value = row.get(col, '').strip()
+        if required and not value:
+            errors.append(f"Missing required field: {col}")
+            continue
+        if value:
+            if max_length and isinstance(value, str) and len(value) > max_length:
+                errors.append(f"Field {col} exceeds max length {max_length}")
+            try:
+                validated[col] = col_type(value)
+            except Exception:
+                errors.append(f"Invalid type for {col}: expected {col_type.__name__}")
+        else:
+            validated[col] = None
+    return validated, errors
+
+
+def time_rows(rows, fn, schema):
+    start = time.perf_counter()
+    for row in rows:
+        fn(row, schema)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark validate_row throughput')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    config = load_config()
+    schema = config['schema']
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'survey.csv')
+        generate_csv(path, args.rows, config)
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+    plan = compile_schema(schema)
+    before = time_rows(rows, legacy_validate_row, schema)
+    after = time_rows(rows, validate_values, plan)
+    print(f'rows:            {len(rows)}')
+    print(f'legacy rows/sec: {before:,.0f}')
+    print(f'plan rows/sec:   {after:,.0f}')
+    print(f'speedup:         {after / before:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
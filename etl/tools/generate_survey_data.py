@@ -0,0 +1,142 @@
+"""Generate synthetic enterprise-survey CSVs shaped by schema_config.yml.
+
+Values follow each column's rules (type, max_length, enum, min/max, date
+format). unique_fields are unique by construction, then duplicate and
+invalid rows are mixed in at the requested rates.
+
+    python tools/generate_survey_data.py --rows 1000000 --error-rate 0.01 --dup-rate 0.005 out.csv
+"""
+import argparse
+import csv
+import os
+import random
+import string
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.config.schema_config import load_config
+from src.utils.io_utils import COMPRESSION_EXTENSIONS, open_output, split_compression_ext
+
+# Text columns draw from this many distinct values, like the real survey
+TEXT_CARDINALITY = 40
+
+_SAMPLE_TEXT = {
+    'Industry_aggregation_NZSIOC': ['Level 1', 'Level 2', 'Level 3', 'Level 4'],
+    'Units': ['Dollars (millions)', 'Dollars', 'Percentage', 'Count'],
+    'Variable_category': ['Financial performance', 'Financial position', 'Financial ratios'],
+    'Industry_code_ANZSIC06': [
+        'ANZSIC06 divisions A-S (excluding classes K6330, L6711, O7552, O760, O771, O772, S9540, S9601, S9602, and S9603)',
+        'ANZSIC06 division A', 'ANZSIC06 division B', 'ANZSIC06 groups C111, C112 and C113',
+    ],
+}
+
+
+def _base36(n):
+    digits = string.digits + string.ascii_uppercase
+    out = ''
+    while True:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+        if not n:
+            return out
+
+
+def _text_pool(col, rules, rnd):
+    if col in _SAMPLE_TEXT:
+        return _SAMPLE_TEXT[col]
+    max_length = rules.get('max_length') or 30
+    words = ['income', 'expenditure', 'sales', 'assets', 'equity', 'total', 'industry', 'services', 'trade']
+    pool = []
+    for i in range(TEXT_CARDINALITY):
+        text = ' '.join(rnd.choice(words) for _ in range(4)).capitalize()
+        pool.append(f'{text} {i}'[:max_length])
+    return pool
+
+
+def _column_generator(col, rules, rnd):
+    col_type = rules['type']
+    if rules.get('enum'):
+        values = [str(v) for v in rules['enum']]
+        return lambda: rnd.choice(values)
+    if col_type is int:
+        low = rules.get('min') if rules.get('min') is not None else 2000
+        high = rules.get('max') if rules.get('max') is not None else 2030
+        return lambda: str(rnd.randint(low, high))
+    if col_type is float:
+        low = rules.get('min') if rules.get('min') is not None else 0
+        high = rules.get('max') if rules.get('max') is not None else 1000000
+        return lambda: str(round(rnd.uniform(low, high), 2))
+    if col_type is date:
+        fmt = rules.get('format') or '%Y-%m-%d'
+        start = date(2000, 1, 1)
+        return lambda: (start + timedelta(days=rnd.randint(0, 9000))).strftime(fmt)
+    pool = _text_pool(col, rules, rnd)
+    return lambda: rnd.choice(pool)
+
+
+def _corrupt(row, columns, schema, rnd):
+    col = rnd.choice(columns)
+    rules = schema[col]
+    if rules.get('required') and rnd.random() < 0.5:
+        row[col] = ''
+    elif rules['type'] in (int, float, date):
+        row[col] = 'n/a'
+    else:
+        row[col] = 'X' * ((rules.get('max_length') or 10) + 5)
+
+
+def generate_csv(path, rows, config=None, error_rate=0.0, dup_rate=0.0, seed=0):
+    """Write `rows` data rows to path (compressed if it ends in .gz, .bz2, .xz or .zst).
+
+    Returns counts of planted errors and duplicates.
+    """
+    config = config or load_config()
+    schema = config['schema']
+    unique_fields = config.get('unique_fields') or []
+    columns = list(schema)
+    rnd = random.Random(seed)
+    generators = {col: _column_generator(col, rules, rnd) for col, rules in schema.items()}
+    # The last unique column carries the row index so keys never collide by chance
+    index_col = next((c for c in reversed(unique_fields) if schema[c]['type'] in (str, int)), None)
+    recent_keys = []
+    planted = {'errors': 0, 'duplicates': 0}
+    compression = COMPRESSION_EXTENSIONS.get(split_compression_ext(path)[1].lower())
+    with open_output(path, compression) as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(rows):
+            row = {col: gen() for col, gen in generators.items()}
+            if index_col is not None:
+                row[index_col] = _base36(i) if schema[index_col]['type'] is str else str(i)
+            roll = rnd.random()
+            if roll < dup_rate and recent_keys:
+                row.update(rnd.choice(recent_keys))
+                planted['duplicates'] += 1
+            elif roll < dup_rate + error_rate:
+                _corrupt(row, columns, schema, rnd)
+                planted['errors'] += 1
+            elif unique_fields:
+                if len(recent_keys) < 1000:
+                    recent_keys.append({c: row[c] for c in unique_fields})
+                else:
+                    recent_keys[rnd.randrange(1000)] = {c: row[c] for c in unique_fields}
+            writer.writerow([row[col] for col in columns])
+    return planted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic enterprise-survey CSV')
+    parser.add_argument('output')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--dup-rate', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config', default=None, help='Path to YAML config file')
+    args = parser.parse_args()
+    planted = generate_csv(args.output, args.rows, load_config(args.config), args.error_rate, args.dup_rate, args.seed)
+    print(f"Wrote {args.rows} rows to {args.output} ({planted['errors']} invalid, {planted['duplicates']} duplicates)")
+
+
+if __name__ == '__main__':
+    main()